@@ -0,0 +1,108 @@
+"""Check that an exported detector backend finds the same boxes as the PyTorch model.
+
+Usage:
+    python -m benchmarks.check_parity --weights models/best.pt --backend onnx --video input_video.mp4
+    python -m benchmarks.check_parity --weights yolov8n.pt --backend openvino --frames 60
+
+Both backends run on the same frames (--video, or a synthetic court video). Every frame's
+detections are matched by IoU and class; the check fails when a box is missing on one
+side or a matched box moved or changed confidence beyond the tolerances. Per-image
+inference time of both backends is reported too.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import VideoReader
+from trackers.detector_backends import DEFAULT_IMGSZ, EXPORT_DIR, compare_detections, create_detector
+from trackers.model_registry import LazyModel
+from benchmarks.synthetic_video import generate_court_video
+
+
+def check_parity(video_path, weights, backend, conf=0.25, imgsz=DEFAULT_IMGSZ, max_frames=None,
+                 min_iou=0.9, max_conf_diff=0.05, export_dir=EXPORT_DIR):
+    """Compare backend against PyTorch frame by frame; returns a summary dict"""
+    reference = LazyModel(weights)
+    candidate = create_detector(weights, backend, imgsz, export=True, export_dir=export_dir)
+    if candidate.backend == 'pytorch':
+        raise RuntimeError(f"No {backend} backend available for {weights}")
+
+    frames, failed = 0, []
+    matched = unmatched = 0
+    min_matched_iou, worst_conf_diff = 1.0, 0.0
+    times = {'pytorch': [], candidate.backend: []}
+    for index, frame in enumerate(VideoReader(video_path, end_frame=max_frames)):
+        start = time.perf_counter()
+        expected = reference.predict(frame, conf=conf, imgsz=imgsz, verbose=False)[0]
+        times['pytorch'].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        actual = candidate.predict(frame, conf=conf, imgsz=imgsz)[0]
+        times[candidate.backend].append(time.perf_counter() - start)
+
+        comparison = compare_detections(expected, actual, min_iou, max_conf_diff, conf)
+        frames += 1
+        matched += comparison['matched']
+        unmatched += comparison['unmatched_reference'] + comparison['unmatched_candidate']
+        min_matched_iou = min(min_matched_iou, comparison['min_iou'])
+        worst_conf_diff = max(worst_conf_diff, comparison['max_conf_diff'])
+        if not comparison['passed']:
+            failed.append(index)
+
+    # The first call of each backend includes loading and warm-up
+    mean_ms = {name: round(1000 * float(np.mean(values[1:] or values)), 2) for name, values in times.items()}
+    return {
+        'backend': candidate.backend,
+        'frames': frames,
+        'failed_frames': failed,
+        'matched': matched,
+        'unmatched': unmatched,
+        'min_iou': round(min_matched_iou, 4),
+        'max_conf_diff': round(worst_conf_diff, 4),
+        'mean_ms': mean_ms,
+        'passed': frames > 0 and not failed,
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Compare an exported detector backend against PyTorch")
+    parser.add_argument('--weights', default='yolov8n.pt')
+    parser.add_argument('--backend', choices=('onnx', 'openvino', 'auto'), default='onnx')
+    parser.add_argument('--video', help="check on this video instead of a synthetic one")
+    parser.add_argument('--frames', type=int, default=30, help="frames to compare")
+    parser.add_argument('--conf', type=float, default=0.25)
+    parser.add_argument('--imgsz', type=int, default=DEFAULT_IMGSZ)
+    parser.add_argument('--min-iou', type=float, default=0.9, help="IoU needed for two boxes to match")
+    parser.add_argument('--max-conf-diff', type=float, default=0.05, help="allowed confidence difference")
+    parser.add_argument('--export-dir', default=EXPORT_DIR)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix='tennis-parity-') as work_dir:
+        video_path = args.video
+        if video_path is None:
+            video_path = os.path.join(work_dir, 'synthetic.avi')
+            generate_court_video(video_path, n_frames=args.frames)
+
+        print(f"🔍 Comparing {args.backend} against PyTorch for {args.weights}...")
+        result = check_parity(video_path, args.weights, args.backend, args.conf, args.imgsz, args.frames,
+                              args.min_iou, args.max_conf_diff, args.export_dir)
+
+    print(f"   Frames: {result['frames']}, matched boxes: {result['matched']}, unmatched: {result['unmatched']}")
+    print(f"   Worst matched IoU: {result['min_iou']}, worst confidence difference: {result['max_conf_diff']}")
+    print("   Mean inference: " + ", ".join(f"{name} {ms} ms" for name, ms in result['mean_ms'].items()))
+    if not result['passed']:
+        print(f"❌ {result['backend']} differs from PyTorch on frames {result['failed_frames']}")
+        return 1
+    print(f"✅ {result['backend']} matches PyTorch")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Quantize a detector to INT8 and run its recall gate on the bundled ball dataset.
+
+Usage:
+    python -m benchmarks.check_quantization --weights models/best.pt
+    python -m benchmarks.check_quantization --weights yolov8n.pt --max-recall-drop 0.01
+
+Calibration uses the dataset's train images; recall is measured on its valid images,
+against the labels for the ball model and against full-precision detections for models
+trained on other classes. Exits with 1 when the gate refuses the quantized model, in
+which case the trackers keep using full precision.
+"""
+import argparse
+import os
+import sys
+import time
+import cv2
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trackers.detector_backends import DEFAULT_IMGSZ, EXPORT_DIR, OnnxBackend, export_model
+from trackers.quantization import (CALIBRATION_IMAGES, DATASET, GATE_CONF, GATE_IOU, MAX_RECALL_DROP,
+                                   QuantizedOnnxBackend, dataset_split, quantize_model, recall_gate)
+
+
+def mean_inference_ms(detector, images, repeats=3):
+    """Mean time of one predict() over images, after a warm-up call"""
+    detector.predict(images[0], conf=GATE_CONF)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for image in images:
+            detector.predict(image, conf=GATE_CONF)
+    return 1000 * (time.perf_counter() - start) / (repeats * len(images))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Quantize a detector to INT8 and check its recall")
+    parser.add_argument('--weights', default='models/best.pt')
+    parser.add_argument('--data', default=DATASET, help="YOLO data.yaml with train and val splits")
+    parser.add_argument('--imgsz', type=int, default=DEFAULT_IMGSZ)
+    parser.add_argument('--calibration-images', type=int, default=CALIBRATION_IMAGES)
+    parser.add_argument('--max-recall-drop', type=float, default=MAX_RECALL_DROP)
+    parser.add_argument('--conf', type=float, default=GATE_CONF)
+    parser.add_argument('--iou', type=float, default=GATE_IOU, help="IoU for a detection to find a target")
+    parser.add_argument('--export-dir', default=EXPORT_DIR)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"🔄 Quantizing {args.weights} with {args.calibration_images} calibration images...")
+    quantized = quantize_model(args.weights, args.data, args.imgsz, args.export_dir, args.calibration_images)
+    print("🔍 Measuring recall on the validation images...")
+    report = recall_gate(args.weights, quantized, args.data, args.max_recall_drop, args.conf, args.iou,
+                         args.imgsz, args.export_dir)
+
+    images, _, _ = dataset_split(args.data, 'val')
+    images = [cv2.imread(path) for path in images[:10]]
+    float_ms = mean_inference_ms(OnnxBackend(export_model(args.weights, 'onnx', args.imgsz, args.export_dir),
+                                             args.imgsz), images)
+    int8_ms = mean_inference_ms(QuantizedOnnxBackend(quantized, args.imgsz), images)
+
+    print(f"   Targets: {report['boxes']} boxes on {report['images']} images ({report['targets']})")
+    print(f"   Recall: float {report['reference_recall']:.3f}, int8 {report['quantized_recall']:.3f} "
+          f"(drop {report['recall_drop']:+.3f}, allowed {args.max_recall_drop:.3f})")
+    print(f"   Mean inference: float {float_ms:.1f} ms, int8 {int8_ms:.1f} ms ({float_ms / int8_ms:.2f}x)")
+    if not report['passed']:
+        print(f"❌ INT8 model refused: {quantized}")
+        return 1
+    print(f"✅ INT8 model enabled: {quantized}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+"""Offline throughput benchmark of the tracking pipeline.
+
+Usage:
+    python -m benchmarks.run_benchmarks --width 1280 --height 720 --frames 300
+    python -m benchmarks.run_benchmarks --baseline benchmarks/results/baseline.json
+    python -m benchmarks.run_benchmarks --detector yolo --backend onnx
+
+Every stage runs on its own over a synthetic court video (or --video) and reports
+fps, per-frame latency percentiles and how much the process' RSS grew over the stage.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import VideoReader, VideoWriter
+from trackers.tennis_tracker import TennisTracker
+from trackers.track_store import TrackStoreBuilder
+from benchmarks.stub_detector import StubDetector
+from benchmarks.synthetic_video import generate_court_video
+
+STAGES = ('decode', 'player_detection', 'ball_detection', 'interpolation', 'analysis', 'rendering', 'encoding')
+
+
+class TimedSource:
+    """Wraps an iterable and adds up the time its consumer spends waiting on it"""
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self.wait = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            return next(self._iterator)
+        finally:
+            self.wait += time.perf_counter() - start
+
+
+def rss_mb():
+    """Current resident set size of this process, None where /proc is not available"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except OSError:
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def stage_result(frames, total_s, latencies=None, rss_start_mb=None):
+    """Timings of one stage; rss_start_mb is rss_mb() sampled when the stage started.
+
+    The peak RSS (ru_maxrss) is a process-wide high-water mark that every later stage
+    would inherit, so the stage's own memory is reported as the change in current RSS.
+    """
+    rss_end_mb = rss_mb()
+    result = {
+        'frames': frames,
+        'total_s': round(total_s, 6),
+        'fps': round(frames / total_s, 3) if total_s > 0 else None,
+        'mean_ms': round(1000 * total_s / frames, 4) if frames else None,
+        'latency_ms': None,
+        'rss_delta_mb': (round(rss_end_mb - rss_start_mb, 1)
+                         if rss_start_mb is not None and rss_end_mb is not None else None),
+    }
+    if latencies:
+        latencies = 1000 * np.asarray(latencies)
+        result['latency_ms'] = {
+            'p50': round(float(np.percentile(latencies, 50)), 4),
+            'p90': round(float(np.percentile(latencies, 90)), 4),
+            'p99': round(float(np.percentile(latencies, 99)), 4),
+            'max': round(float(latencies.max()), 4),
+        }
+    return result
+
+
+def time_stream(outputs, source):
+    """Consume a stage's output generator, timing every item without its input's time.
+
+    Returns (items, total_s, per-item latencies).
+    """
+    items = []
+    latencies = []
+    start = time.perf_counter()
+    last, last_wait = start, source.wait
+    for item in outputs:
+        now = time.perf_counter()
+        latencies.append((now - last) - (source.wait - last_wait))
+        last, last_wait = now, source.wait
+        items.append(item)
+    total = (time.perf_counter() - start) - source.wait
+    return items, total, latencies
+
+
+def build_trackers(args):
+    if args.detector == 'stub':
+        player_options = {'model': StubDetector('player', delay_s=args.stub_delay_ms / 1000)}
+        ball_options = {'model': StubDetector('ball', delay_s=args.stub_delay_ms / 1000)}
+    else:
+        player_options = {'backend': args.backend}
+        ball_options = {'backend': args.backend}
+    player_options['imgsz'] = args.player_imgsz
+    ball_options['tile_size'] = args.ball_tile_size
+    ball_options['motion_gate'] = args.ball_motion_gate
+    return TennisTracker(player_model_path=args.player_model, ball_model_path=args.ball_model,
+                         batch_size=args.batch_size, max_interpolation_gap=args.max_interpolation_gap,
+                         player_options=player_options, ball_options=ball_options)
+
+
+def run_benchmarks(video_path, args):
+    stages = {}
+    reader = VideoReader(video_path)
+    tennis_tracker = build_trackers(args)
+    tennis_tracker.fps = reader.fps
+
+    # Decode
+    rss_start = rss_mb()
+    latencies = []
+    frames = 0
+    start = time.perf_counter()
+    last = start
+    for _ in reader:
+        now = time.perf_counter()
+        latencies.append(now - last)
+        last = now
+        frames += 1
+    stages['decode'] = stage_result(frames, time.perf_counter() - start, latencies, rss_start)
+
+    # Player and ball detection, each on its own pass over the video
+    for name, tracker, class_name in (('player_detection', tennis_tracker.player_tracker, 'person'),
+                                      ('ball_detection', tennis_tracker.ball_tracker, None)):
+        rss_start = rss_mb()
+        tracker.reset()
+        source = TimedSource(reader)
+        detections, total, latencies = time_stream(tracker.iter_detections(source), source)
+        builder = TrackStoreBuilder(class_name)
+        for detection in detections:
+            builder.append(detection)
+        stages[name] = stage_result(len(detections), total, latencies, rss_start)
+        if name == 'player_detection':
+            player_store = tennis_tracker.player_tracker.classify_players(builder.build())
+        else:
+            raw_ball_store = builder.build()
+
+    # Interpolation
+    rss_start = rss_mb()
+    start = time.perf_counter()
+    ball_store = tennis_tracker.ball_tracker.interpolate_ball_positions(
+        raw_ball_store, max_gap=args.max_interpolation_gap, method=args.interpolation_method)
+    stages['interpolation'] = stage_result(len(ball_store), time.perf_counter() - start, rss_start_mb=rss_start)
+
+    # Match analysis
+    rss_start = rss_mb()
+    start = time.perf_counter()
+    tennis_tracker.analyze_match(player_store, ball_store)
+    stages['analysis'] = stage_result(len(player_store), time.perf_counter() - start, rss_start_mb=rss_start)
+
+    # Rendering
+    rss_start = rss_mb()
+    source = TimedSource(reader)
+    rendered = tennis_tracker.draw_complete_analysis(source, player_store, ball_store)
+    _, total, latencies = time_stream((None for _ in rendered), source)
+    stages['rendering'] = stage_result(len(latencies), total, latencies, rss_start)
+
+    # Encoding
+    rss_start = rss_mb()
+    output_path = os.path.join(args.work_dir, 'encoded.' + args.output_extension.lstrip('.'))
+    source = TimedSource(reader)
+    with VideoWriter(output_path, reader.fps, args.codec) as writer:
+        _, total, latencies = time_stream((writer.write(frame) for frame in source), source)
+    stages['encoding'] = stage_result(len(latencies), total, latencies, rss_start)
+
+    summary = tennis_tracker.get_match_summary()
+    return stages, {'total_ball_hits': summary['total_ball_hits'], 'rally_count': summary['rally_count']}
+
+
+def median_stages(runs):
+    """Per stage, the result of the run with the median fps, to damp timing noise"""
+    stages = {}
+    for stage in STAGES:
+        results = sorted((run[stage] for run in runs), key=lambda r: r['fps'] or 0)
+        stages[stage] = results[len(results) // 2]
+    return stages
+
+
+def compare_to_baseline(current, baseline, tolerance):
+    """Per-stage fps change against a baseline run; returns (rows, regressed stage names)"""
+    rows = []
+    regressions = []
+    for stage in STAGES:
+        now = current['stages'].get(stage, {}).get('fps')
+        before = baseline.get('stages', {}).get(stage, {}).get('fps')
+        if not now or not before:
+            continue
+        change = now / before - 1
+        rows.append((stage, before, now, change))
+        if change < -tolerance:
+            regressions.append(stage)
+    return rows, regressions
+
+
+def _format_mb(value):
+    return '-' if value is None else f"{value:+.1f}"
+
+
+def format_results(results, comparison=None):
+    lines = [f"{'stage':>17} {'fps':>10} {'p50 ms':>9} {'p99 ms':>9} {'rss +MB':>8}"]
+    for stage in STAGES:
+        s = results['stages'][stage]
+        latency = s['latency_ms'] or {}
+        lines.append(f"{stage:>17} {s['fps'] or 0:10.1f} {latency.get('p50', s['mean_ms']):9.3f} "
+                     f"{latency.get('p99', s['mean_ms']):9.3f} "
+                     f"{_format_mb(s.get('rss_delta_mb')):>8}")
+    if comparison:
+        lines.append("")
+        lines.append(f"{'stage':>17} {'baseline':>10} {'current':>10} {'change':>8}")
+        for stage, before, now, change in comparison:
+            lines.append(f"{stage:>17} {before:10.1f} {now:10.1f} {change:+8.1%}")
+    return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the tennis tracking pipeline stage by stage")
+    parser.add_argument('--video', help="benchmark this video instead of a synthetic one")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=3, help="runs per stage, the median run is reported")
+    parser.add_argument('--detector', choices=('stub', 'yolo'), default='stub',
+                        help="deterministic color-blob stub or the real YOLO weights")
+    parser.add_argument('--backend', choices=('pytorch', 'onnx', 'openvino', 'auto', 'int8'), default='pytorch',
+                        help="inference backend of the yolo detector, exported on first use")
+    parser.add_argument('--stub-delay-ms', type=float, default=0.0, help="emulated inference time per image")
+    parser.add_argument('--player-model', default='yolov8n.pt')
+    parser.add_argument('--ball-model', default='models/best.pt')
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--player-imgsz', type=int, default=None, help="person model input size")
+    parser.add_argument('--ball-tile-size', type=int, default=None, help="search the ball in tiles of this size")
+    parser.add_argument('--ball-motion-gate', action='store_true', help="search the ball only around moving blobs")
+    parser.add_argument('--max-interpolation-gap', type=int, default=45)
+    parser.add_argument('--interpolation-method', choices=('linear', 'cubic'), default='linear')
+    parser.add_argument('--codec', default=None, help="FourCC for the encoding stage")
+    parser.add_argument('--output-extension', default='.avi', help="container for the encoding stage")
+    parser.add_argument('--output', default=os.path.join('benchmarks', 'results', 'latest.json'))
+    parser.add_argument('--baseline', help="earlier results JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="allowed fps drop before a stage counts as regressed")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix='tennis-bench-') as work_dir:
+        args.work_dir = work_dir
+        video_path = args.video
+        if video_path is None:
+            video_path = os.path.join(work_dir, 'synthetic.avi')
+            print(f"🎬 Generating {args.frames} synthetic frames at {args.width}x{args.height}...")
+            generate_court_video(video_path, args.width, args.height, args.frames, args.fps, args.seed)
+
+        print(f"⏱️ Running benchmarks with the {args.detector} detector ({args.repeats} runs)...")
+        runs = [run_benchmarks(video_path, args) for _ in range(args.repeats)]
+        stages = median_stages([stages for stages, _ in runs])
+        match = runs[-1][1]
+
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {
+            'video': args.video or 'synthetic',
+            'width': args.width, 'height': args.height, 'frames': args.frames, 'fps': args.fps,
+            'seed': args.seed, 'repeats': args.repeats, 'detector': args.detector,
+            'backend': args.backend if args.detector == 'yolo' else None, 'stub_delay_ms': args.stub_delay_ms,
+            'batch_size': args.batch_size, 'player_imgsz': args.player_imgsz,
+            'ball_tile_size': args.ball_tile_size, 'ball_motion_gate': args.ball_motion_gate,
+            'interpolation_method': args.interpolation_method,
+            'codec': args.codec, 'output_extension': args.output_extension,
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+        },
+        'stages': stages,
+        'match': match,
+    }
+
+    comparison, regressions = None, []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        comparison, regressions = compare_to_baseline(results, baseline, args.tolerance)
+        differing = sorted(key for key, value in results['config'].items()
+                           if key != 'repeats' and baseline.get('config', {}).get(key) != value)
+        if differing:
+            print(f"⚠️ Baseline was run with different settings: {', '.join(differing)}")
+
+    print(format_results(results, comparison))
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results saved: {args.output}")
+
+    if regressions:
+        print(f"❌ Slower than baseline: {', '.join(regressions)}")
+        if args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
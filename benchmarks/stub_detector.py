@@ -0,0 +1,72 @@
+import time
+import cv2
+import numpy as np
+from .synthetic_video import BALL_COLOR, PLAYER_COLORS
+
+
+class StubBoxes:
+    """The parts of ultralytics' Boxes the trackers read: xyxy, conf and cls arrays"""
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    def __len__(self):
+        return len(self.conf)
+
+
+class StubResult:
+    def __init__(self, boxes, names):
+        self.boxes = boxes
+        self.names = names
+
+
+class StubDetector:
+    """Deterministic stand-in for a YOLO model on synthetic court videos.
+
+    predict() finds blobs of the synthetic player or ball colors with a color threshold
+    and connected components, so trackers get stable, realistic boxes without any model
+    weights. delay_s adds a fixed cost per image to emulate a real network.
+    """
+
+    def __init__(self, kind='player', tolerance=40, min_area=None, delay_s=0.0):
+        if kind not in ('player', 'ball'):
+            raise ValueError("kind must be 'player' or 'ball'")
+        self.kind = kind
+        self.names = {0: 'person'} if kind == 'player' else {0: 'tennis ball'}
+        self.colors = PLAYER_COLORS if kind == 'player' else (BALL_COLOR,)
+        self.tolerance = tolerance
+        self.min_area = min_area if min_area is not None else (200 if kind == 'player' else 6)
+        self.delay_s = delay_s
+        self.images_seen = 0
+
+    def _detect(self, image):
+        boxes = []
+        for color in self.colors:
+            lower = np.clip(np.array(color) - self.tolerance, 0, 255).astype(np.uint8)
+            upper = np.clip(np.array(color) + self.tolerance, 0, 255).astype(np.uint8)
+            mask = cv2.inRange(image, lower, upper)
+            count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+            for x, y, w, h, area in stats[1:count].tolist():
+                if area >= self.min_area:
+                    boxes.append((x, y, x + w, y + h))
+
+        xyxy = np.array(boxes, dtype=np.float32).reshape(-1, 4)
+        conf = np.full(len(xyxy), 0.9, dtype=np.float32)
+        cls = np.zeros(len(xyxy), dtype=np.float32)
+        return StubResult(StubBoxes(xyxy, conf, cls), self.names)
+
+    def predict(self, source, conf=0.25, **kwargs):
+        """Detect in one image or a list of images, like YOLO.predict()"""
+        images = source if isinstance(source, (list, tuple)) else [source]
+        results = []
+        for image in images:
+            if self.delay_s:
+                time.sleep(self.delay_s)
+            result = self._detect(image)
+            keep = result.boxes.conf >= conf
+            result.boxes = StubBoxes(result.boxes.xyxy[keep], result.boxes.conf[keep], result.boxes.cls[keep])
+            results.append(result)
+            self.images_seen += 1
+        return results
@@ -0,0 +1,102 @@
+import cv2
+import numpy as np
+from utils import VideoWriter
+
+# Solid colors the stub detectors look for (BGR)
+COURT_COLOR = (60, 140, 60)
+LINE_COLOR = (255, 255, 255)
+PLAYER_COLORS = ((40, 40, 220), (220, 60, 40))  # far player red, near player blue
+BALL_COLOR = (0, 255, 255)
+
+
+def court_layout(width, height):
+    """Court rectangle (x1, y1, x2, y2) inside a frame of the given size"""
+    return (int(width * 0.15), int(height * 0.12), int(width * 0.85), int(height * 0.92))
+
+
+def draw_court(width, height):
+    """Static background: surround, court surface and lines"""
+    frame = np.full((height, width, 3), (90, 90, 90), dtype=np.uint8)
+    x1, y1, x2, y2 = court_layout(width, height)
+    cv2.rectangle(frame, (x1, y1), (x2, y2), COURT_COLOR, -1)
+    thickness = max(2, height // 180)
+    cv2.rectangle(frame, (x1, y1), (x2, y2), LINE_COLOR, thickness)
+    mid_y = (y1 + y2) // 2
+    cv2.line(frame, (x1, mid_y), (x2, mid_y), LINE_COLOR, thickness)
+    for y in ((y1 + mid_y) // 2, (mid_y + y2) // 2):
+        cv2.line(frame, (x1 + (x2 - x1) // 8, y), (x2 - (x2 - x1) // 8, y), LINE_COLOR, thickness)
+    cv2.line(frame, ((x1 + x2) // 2, (y1 + mid_y) // 2), ((x1 + x2) // 2, (mid_y + y2) // 2), LINE_COLOR, thickness)
+    return frame
+
+
+def simulate_match(width, height, n_frames, fps=30, seed=0):
+    """Ground truth positions of both players and the ball for every frame.
+
+    Returns (players, ball): players is (n_frames, 2, 4) player boxes and ball is
+    (n_frames, 2) ball centers, NaN while the ball is out of sight between points.
+    """
+    rng = np.random.default_rng(seed)
+    x1, y1, x2, y2 = court_layout(width, height)
+    player_h = height * 0.16
+    player_w = player_h * 0.4
+    t = np.arange(n_frames) / fps
+
+    # Players drift along their baselines
+    baselines = (y1 + player_h * 0.2, y2 - player_h * 0.2)
+    players = np.zeros((n_frames, 2, 4))
+    for p, baseline in enumerate(baselines):
+        phase = rng.uniform(0, 2 * np.pi)
+        cx = (x1 + x2) / 2 + (x2 - x1) * 0.3 * np.sin(t * rng.uniform(0.3, 0.6) + phase)
+        foot = baseline + height * 0.02 * np.sin(t * 1.3 + phase)
+        players[:, p] = np.column_stack([cx - player_w / 2, foot - player_h, cx + player_w / 2, foot])
+
+    # Ball flies between the players' rackets with an arc, pausing between points
+    ball = np.full((n_frames, 2), np.nan)
+    shot_frames = int(fps * 1.1)
+    frame = int(fps * 0.5)
+    while frame < n_frames:
+        shots = rng.integers(3, 9)
+        hitter = int(rng.integers(0, 2))
+        for _ in range(shots):
+            end = min(frame + shot_frames, n_frames)
+            u = np.arange(end - frame) / shot_frames
+            start_box, end_box = players[frame, hitter], players[min(end, n_frames - 1), 1 - hitter]
+            start = np.array([(start_box[0] + start_box[2]) / 2, start_box[1] + player_h * 0.3])
+            target = np.array([(end_box[0] + end_box[2]) / 2, end_box[1] + player_h * 0.3])
+            ball[frame:end] = start + (target - start) * u[:, None]
+            ball[frame:end, 1] -= height * 0.12 * np.sin(np.pi * u)
+            frame, hitter = end, 1 - hitter
+            if frame >= n_frames:
+                break
+        frame += int(fps * rng.uniform(1.5, 3.0))
+    return players, ball
+
+
+def render_frame(background, players, ball_center, ball_radius):
+    frame = background.copy()
+    for box, color in zip(players, PLAYER_COLORS):
+        cv2.rectangle(frame, (int(box[0]), int(box[1])), (int(box[2]), int(box[3])), color, -1)
+    if not np.isnan(ball_center[0]):
+        cv2.circle(frame, (int(ball_center[0]), int(ball_center[1])), ball_radius, BALL_COLOR, -1)
+    return frame
+
+
+def generate_court_video(path, width=1280, height=720, n_frames=300, fps=30, seed=0, noise=4):
+    """Write a synthetic match video and return its ground truth (players, ball).
+
+    Frames show a court with two player blobs and a ball, plus a little per-frame
+    noise so codecs and detectors do not see identical frames.
+    """
+    background = draw_court(width, height)
+    players, ball = simulate_match(width, height, n_frames, fps, seed)
+    ball_radius = max(3, height // 120)
+    rng = np.random.default_rng(seed + 1)
+    noise_frames = [rng.integers(-noise, noise + 1, (height, width, 3), dtype=np.int16) for _ in range(4)]
+
+    with VideoWriter(path, fps) as writer:
+        for i in range(n_frames):
+            frame = render_frame(background, players[i], ball[i], ball_radius)
+            if noise:
+                frame = np.clip(frame + noise_frames[i % len(noise_frames)], 0, 255).astype(np.uint8)
+            writer.write(frame)
+    return players, ball
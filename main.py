@@ -1,13 +1,193 @@
-from ultralytics import YOLO
-from utils import (read_video, save_video)
+from utils import (VideoReader, ProgressReader, ReplaySource, LiveSource, save_video, MetricsExporter,
+                   enable_metrics, silence_yolo_logging)
 from trackers.tennis_tracker import TennisTracker
-from trackers.player_tracker import PlayerTracker
-from trackers.ball_tracker import BallTracker
+from trackers.model_registry import model_metadata
+from trackers.pipeline import format_pipeline_stats
+from trackers.detection_cache import DetectionCache
+from trackers.checkpoint import RunCheckpoint
+import argparse
 import os
 
-def main():
+DEFAULT_CHECKPOINT_DIR = 'Output_videos/checkpoints'
+
+def save_separate_videos(tennis_tracker, video_frames, output_dir='Output_videos', output_codec=None,
+                         encode_workers=1):
+    """Player-only and ball-only videos, reusing the tracker's models (and cached detections)"""
+    outputs = {}
+    
+    # Player-only tracking
+    player_tracker = tennis_tracker.player_tracker
+    player_tracker.reset()
+    player_detections_only = player_tracker.detect_frames(video_frames)
+    player_detections_only = player_tracker.classify_players(player_detections_only)
+    player_output_frames = player_tracker.draw_player_tracking(video_frames, player_detections_only)
+    outputs['players'] = os.path.join(output_dir, 'tennis_players_only.avi')
+    save_video(player_output_frames, outputs['players'], fps=video_frames.fps, codec=output_codec,
+               workers=encode_workers)
+    print(f"✅ Player tracking saved: {outputs['players']}")
+    
+    # Ball-only tracking
+    ball_tracker = tennis_tracker.ball_tracker
+    ball_tracker.reset()
+    ball_detections_only = ball_tracker.detect_frames(video_frames)
+    ball_detections_interpolated = ball_tracker.interpolate_ball_positions(
+        ball_detections_only, max_gap=tennis_tracker.max_interpolation_gap,
+        method=tennis_tracker.interpolation_method)
+    ball_output_frames = ball_tracker.draw_ball_tracking(video_frames, ball_detections_interpolated)
+    outputs['ball'] = os.path.join(output_dir, 'tennis_ball_only.avi')
+    save_video(ball_output_frames, outputs['ball'], fps=video_frames.fps, codec=output_codec,
+               workers=encode_workers)
+    print(f"✅ Ball tracking saved: {outputs['ball']}")
+    return outputs
+
+def run_analysis(tennis_tracker, input_video_path, output_dir='Output_videos', pipelined=False, workers=1,
+                 output_codec=None, encode_workers=1, live_mode=False, live_source=None,
+                 live_latency_budget_s=None, separate_videos=False, progress=None, checkpoint_dir=None,
+                 checkpoint_interval=900, resume=False):
+    """Analyze one video with an already built TennisTracker, without any prompts.
+
+    The tracker is reset first, so one tracker (and its loaded models) can serve many
+    videos in a row. progress, if given, is called with the fraction of work done (0-1)
+    as frames are read. Returns a JSON-serializable dict of output paths and statistics.
+    With checkpoint_dir set (off by default), the sequential analysis saves its progress there
+    every checkpoint_interval frames; resume=True continues from the checkpoint of an identical
+    earlier run, and its output is the same as that of an uninterrupted run.
+    """
+    tennis_tracker.reset()
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # Pipelined mode reads the video once; otherwise detection, rendering and the optional
+    # separate videos each read it again
+    passes = 1 if pipelined or live_mode else 3 + (4 if separate_videos else 0)
+    if tennis_tracker.play_segmenter is not None and passes > 1 and workers <= 1:
+        passes += 1  # The in-play segments are found in a pass of their own
+    # Frames are decoded lazily on every pass, so memory stays flat for long matches
+    if progress is not None:
+        video_frames = ProgressReader(input_video_path, progress, passes=passes)
+    else:
+        video_frames = VideoReader(input_video_path)
+    print(f"✅ Found {video_frames.frame_count} frames at {video_frames.fps:.1f} fps")
+    
+    # COMBINED TENNIS ANALYSIS - ALL IN ONE VIDEO
+    print("\n🔄 Starting COMPLETE tennis match analysis...")
+    print("🎾 Tracking players and ball simultaneously...")
+    
+    ultimate_output_path = os.path.join(output_dir, 'ULTIMATE_tennis_analysis.avi')
+    result = {'video': input_video_path, 'outputs': {'analysis': ultimate_output_path}}
+    
+    checkpoint = None
+    if checkpoint_dir and not (pipelined or live_mode) and workers <= 1:
+        params = dict(tennis_tracker.run_settings(), output=ultimate_output_path, codec=output_codec)
+        checkpoint = RunCheckpoint.for_run(checkpoint_dir, input_video_path, params, checkpoint_interval)
+        if resume and checkpoint.exists():
+            print(f"⏯️ Resuming from checkpoint: {checkpoint.directory}")
+        else:
+            checkpoint.clear()
+    
+    if live_mode:
+        source = LiveSource(live_source) if live_source is not None else ReplaySource(input_video_path)
+        print(f"🔴 Running live analysis at {source.fps:.1f} fps...")
+        tennis_tracker.run_live(source, ultimate_output_path, latency_budget_s=live_latency_budget_s,
+                                codec=output_codec)
+        live_stats = tennis_tracker.live_stats
+        print(f"⏱️ Live latency: p50 {live_stats['p50_ms']:.1f} ms, p95 {live_stats['p95_ms']:.1f} ms "
+              f"(budget {live_stats['latency_budget_ms']:.1f} ms), {live_stats['frames_dropped']} frames dropped")
+        print(f"   Frames per degrade level: {live_stats['frames_per_level']}")
+        result['live_stats'] = live_stats
+    elif pipelined:
+        # Decode, inference, overlay and encoding all run at the same time
+        print("⚡ Running pipelined analysis (overlay shows running statistics)...")
+        tennis_tracker.run_pipelined(video_frames, ultimate_output_path, codec=output_codec,
+                                     encode_workers=encode_workers)
+        print("\n⏱️ Pipeline stage timings:")
+        print(format_pipeline_stats(tennis_tracker.pipeline_stats))
+        result['pipeline_stats'] = tennis_tracker.pipeline_stats
+    else:
+        # Track both players and ball together
+        if workers > 1:
+            player_detections, ball_detections = tennis_tracker.track_tennis_match_parallel(
+                input_video_path, workers=workers)
+        else:
+            player_detections, ball_detections = tennis_tracker.track_tennis_match(video_frames, checkpoint)
+        
+        # Create ONE comprehensive analysis video with EVERYTHING
+        print("🎨 Creating ULTIMATE tennis analysis video...")
+        print("   📍 2 Player tracking with trails")
+        print("   🎾 Ball tracking with trajectory")
+        print("   📊 Live match statistics")
+        print("   🏆 Complete analysis overlay")
+        
+        # Save the ultimate combined video
+        if checkpoint is not None:
+            # Rendered in segments, so a resumed run only renders what was not finished
+            tennis_tracker.save_analysis_video(video_frames, player_detections, ball_detections,
+                                               ultimate_output_path, checkpoint, codec=output_codec,
+                                               workers=encode_workers)
+        else:
+            output_video_frames = tennis_tracker.draw_complete_analysis(video_frames, player_detections,
+                                                                        ball_detections)
+            save_video(output_video_frames, ultimate_output_path, fps=video_frames.fps, codec=output_codec,
+                       workers=encode_workers)
+    print(f"✅ ULTIMATE analysis saved: {ultimate_output_path}")
+    
+    # Statistics are taken before the separate videos reset the trackers
+    result['summary'] = tennis_tracker.get_match_summary()
+    if tennis_tracker.play_segments is not None:
+        result['play_segments'] = tennis_tracker.play_segments
+    if checkpoint is not None:
+        checkpoint.remove()
+    if tennis_tracker.player_tracker.keyframe_interval:
+        result['keyframe_stats'] = dict(tennis_tracker.player_tracker.keyframe_stats)
+    if tennis_tracker.ball_tracker.roi_mode:
+        result['roi_stats'] = dict(tennis_tracker.ball_tracker.roi_stats)
+    if tennis_tracker.ball_tracker.tile_size:
+        result['tile_stats'] = dict(tennis_tracker.ball_tracker.tile_stats)
+    if tennis_tracker.ball_tracker.motion_gate is not None:
+        result['motion_stats'] = dict(tennis_tracker.ball_tracker.motion_stats)
+    
+    if separate_videos:
+        print("\n🔄 Creating additional separate analysis videos...")
+        result['outputs'].update(save_separate_videos(tennis_tracker, video_frames, output_dir, output_codec,
+                                                      encode_workers))
+    if progress is not None:
+        progress(1.0)
+    return result
+
+def print_summary(result):
+    print("\n📊 MATCH ANALYSIS SUMMARY")
+    print("=" * 50)
+    for key, value in result['summary'].items():
+        print(f"{key.replace('_', ' ').title()}: {value}")
+    
+    if 'keyframe_stats' in result:
+        keyframe_stats = result['keyframe_stats']
+        print(f"Player Keyframes: {keyframe_stats['keyframes']} detected, {keyframe_stats['propagated']} propagated, "
+              f"{keyframe_stats['drift_failures']} drift failures")
+    
+    if 'roi_stats' in result:
+        roi_stats = result['roi_stats']
+        print(f"Ball ROI Searches: {roi_stats['roi_hits']} hits, {roi_stats['roi_misses']} misses, "
+              f"{roi_stats['fallbacks']} fallbacks, {roi_stats['full_frame_searches']} full-frame")
+    
+    if 'tile_stats' in result:
+        tile_stats = result['tile_stats']
+        print(f"Ball Tiles: {tile_stats['tiles_run']} searched, {tile_stats['tiles_skipped']} skipped off court")
+    
+    if 'motion_stats' in result:
+        motion_stats = result['motion_stats']
+        print(f"Ball Motion Gate: {motion_stats['candidate_frames']} frames with {motion_stats['candidates']} candidates, "
+              f"{motion_stats['skipped_frames']} skipped, {motion_stats['full_frames']} full-frame")
+    
+    if 'play_segments' in result:
+        print("In-Play Segments:")
+        for segment in result['play_segments']:
+            print(f"   {segment['start_s']:.1f}s - {segment['end_s']:.1f}s "
+                  f"(frames {segment['start_frame']}-{segment['end_frame']})")
+
+def main(resume=False, checkpoint_dir=None):
     print("🎾 Tennis Match Analysis System")
     print("=" * 50)
+    silence_yolo_logging()
     
     # Input video path
     input_video_path = 'input_video.mp4'
@@ -20,72 +200,91 @@ def main():
     # Check if models exist
     player_model = "yolov8n.pt" 
     ball_model = "models/best.pt"
+    batch_size = 8  # Frames per YOLO call, amortizes per-call overhead on CPU
+    max_interpolation_gap = 45  # Don't bridge ball gaps longer than ~1.5 s (dead time between points)
+    # Inference backend: 'pytorch', 'onnx' or 'openvino' (CPU, exported once into .model_exports),
+    # or 'auto' for the fastest one installed; falls back to PyTorch when unavailable.
+    # 'int8' quantizes the ONNX export, calibrated on the bundled ball dataset, and only uses
+    # it if recall on the dataset's validation images drops by at most max_recall_drop
+    detector_backend = 'pytorch'
+    quantization = {'max_recall_drop': 0.02}
+    # Keyframe mode runs person detection every few frames and propagates boxes in between;
+    # imgsz sets the person model's input size (None: 640), players survive e.g. 416 or 320
+    player_options = {'keyframe_interval': None, 'max_keyframe_motion': 0.15, 'imgsz': None,
+                      'backend': detector_backend, 'quantization': quantization}
+    # Ball ROI mode searches a crop around the predicted ball position instead of the full frame.
+    # For 4K footage, tile_size (e.g. 640) searches overlapping native-resolution tiles near
+    # the court instead of the downscaled frame, where the ball would be lost. The motion gate
+    # only searches crops around small moving blobs and skips frames where nothing small moves
+    ball_options = {'roi_mode': False, 'roi_size': 320, 'max_roi_misses': 5, 'tile_size': None, 'tile_overlap': 0.2,
+                    'motion_gate': False, 'backend': detector_backend, 'quantization': quantization}
+    # Play segmentation finds the in-play segments (main camera on the court) in a cheap first
+    # pass and runs the detectors on those only, skipping changeovers, replays and crowd shots
+    play_segmentation = False
+    segment_options = {'min_play_s': 2.0, 'min_break_s': 1.0, 'pad_s': 0.5}
+    pipelined = False  # Run decode/inference/render/encode as concurrent stages
+    workers = 1  # >1 splits the video into overlapping chunks detected on a process pool
+    # Output codec follows the container (.avi -> MJPG, .mp4 -> mp4v) unless set here
+    output_codec = None
+    encode_workers = 1  # >1 encodes the output video in segments on a process pool
+    # With --checkpoint-dir (or --resume), sequential runs save their progress every
+    # checkpoint_interval frames, so a crashed or preempted run started again with --resume
+    # continues from there
+    checkpoint_interval = 900
+    # Live mode analyzes frames as they arrive from live_source (camera index or stream URL;
+    # None replays the input video at real-time speed), shedding work to stay within the budget
+    live_mode = False
+    live_source = None
+    live_latency_budget_s = None  # None allows one frame interval per frame
+    # Per-stage timers, frame counts and queue depths, exported as JSON and Prometheus text
+    # every metrics_interval_s seconds and at the end of the run; None turns them off
+    metrics_dir = 'Output_videos/metrics'
+    metrics_interval_s = 30
+    output_dir = 'Output_videos'
+    
+    # Detections are cached on disk, so re-runs and the separate videos skip inference
+    detection_cache = DetectionCache('.detection_cache', max_size_mb=2048)
     
     if not os.path.exists(ball_model):
         print(f"❌ Error: Ball detection model '{ball_model}' not found!")
         return
     
-    print(f"📹 Loading video: {input_video_path}")
-    video_frames = read_video(input_video_path)
-    print(f"✅ Loaded {len(video_frames)} frames")
-    
-    # COMBINED TENNIS ANALYSIS - ALL IN ONE VIDEO
-    print("\n🔄 Starting COMPLETE tennis match analysis...")
-    print("🎾 Tracking players and ball simultaneously...")
-    
-    tennis_tracker = TennisTracker(player_model_path=player_model, ball_model_path=ball_model)
-    
-    # Track both players and ball together
-    player_detections, ball_detections = tennis_tracker.track_tennis_match(video_frames)
+    print(f"📹 Opening video: {input_video_path}")
+    tennis_tracker = TennisTracker(player_model_path=player_model, ball_model_path=ball_model, batch_size=batch_size,
+                                   cache=detection_cache, max_interpolation_gap=max_interpolation_gap,
+                                   player_options=player_options, ball_options=ball_options,
+                                   play_segmentation=play_segmentation, segment_options=segment_options)
     
-    # Create ONE comprehensive analysis video with EVERYTHING
-    print("🎨 Creating ULTIMATE tennis analysis video...")
-    print("   📍 2 Player tracking with trails")
-    print("   🎾 Ball tracking with trajectory")
-    print("   📊 Live match statistics")
-    print("   🏆 Complete analysis overlay")
+    metrics_exporter = None
+    if metrics_dir:
+        metrics_exporter = MetricsExporter(enable_metrics(), os.path.join(metrics_dir, 'metrics.json'),
+                                           os.path.join(metrics_dir, 'metrics.prom'), metrics_interval_s)
+        metrics_exporter.start()
+        print(f"📈 Exporting run metrics to {metrics_dir} every {metrics_interval_s}s")
     
-    output_video_frames = tennis_tracker.draw_complete_analysis(video_frames, player_detections, ball_detections)
-    
-    # Save the ultimate combined video
-    ultimate_output_path = 'Output_videos/ULTIMATE_tennis_analysis.avi'
-    os.makedirs('Output_videos', exist_ok=True)
-    save_video(output_video_frames, ultimate_output_path)
-    print(f"✅ ULTIMATE analysis saved: {ultimate_output_path}")
+    result = run_analysis(tennis_tracker, input_video_path, output_dir, pipelined=pipelined, workers=workers,
+                          output_codec=output_codec, encode_workers=encode_workers, live_mode=live_mode,
+                          live_source=live_source, live_latency_budget_s=live_latency_budget_s,
+                          checkpoint_dir=checkpoint_dir, checkpoint_interval=checkpoint_interval, resume=resume)
     
     # Optional: 
     create_separate = input("\n🔄 Do you want separate player/ball videos too? (y/n): ").lower().strip()
     
     if create_separate == 'y':
         print("\n🔄 Creating additional separate analysis videos...")
-        
-        # Player-only tracking
-        player_tracker = PlayerTracker(player_model)
-        player_detections_only = player_tracker.detect_frames(video_frames)
-        player_detections_only = player_tracker.classify_players(player_detections_only)
-        player_output_frames = player_tracker.draw_player_tracking(video_frames, player_detections_only)
-        save_video(player_output_frames, 'Output_videos/tennis_players_only.avi')
-        print("✅ Player tracking saved: Output_videos/tennis_players_only.avi")
-        
-        # Ball-only tracking
-        ball_tracker = BallTracker(ball_model)
-        ball_detections_only = ball_tracker.detect_frames(video_frames)
-        ball_detections_interpolated = ball_tracker.interpolate_ball_positions(ball_detections_only)
-        ball_output_frames = ball_tracker.draw_ball_tracking(video_frames, ball_detections_interpolated)
-        save_video(ball_output_frames, 'Output_videos/tennis_ball_only.avi')
-        print("✅ Ball tracking saved: Output_videos/tennis_ball_only.avi")
+        save_separate_videos(tennis_tracker, VideoReader(input_video_path), output_dir, output_codec, encode_workers)
     
     # Print match summary
-    print("\n📊 MATCH ANALYSIS SUMMARY")
-    print("=" * 50)
-    summary = tennis_tracker.get_match_summary()
-    for key, value in summary.items():
-        print(f"{key.replace('_', ' ').title()}: {value}")
+    print_summary(result)
+    
+    if metrics_exporter is not None:
+        metrics_exporter.stop()
+        print(f"📈 Run metrics saved: {metrics_dir}")
     
-    print("\n🎉 Analysis complete! Check the Output_videos folder for results.")
+    print(f"\n🎉 Analysis complete! Check the {output_dir} folder for results.")
 
 def analyze_models():
-    """Test and compare model performance"""
+    """List the available models and their classes (from cached metadata, without loading them)"""
     print("\n🔍 MODEL ANALYSIS")
     print("=" * 30)
     
@@ -98,17 +297,26 @@ def analyze_models():
     for name, path in models_to_test.items():
         if os.path.exists(path):
             try:
-                model = YOLO(path)
+                metadata = model_metadata(path)
                 print(f"✅ {name}: {path}")
-                print(f"   Classes: {list(model.names.values())}")
+                print(f"   Classes: {list(metadata['names'].values())}")
             except Exception as e:
                 print(f"❌ {name}: Error loading - {e}")
         else:
             print(f"❌ {name}: File not found - {path}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tennis match analysis")
+    parser.add_argument('--checkpoint-dir', nargs='?', const=DEFAULT_CHECKPOINT_DIR,
+                        help=f"save progress here (default {DEFAULT_CHECKPOINT_DIR}) so an interrupted run can be resumed")
+    parser.add_argument('--resume', action='store_true', help="continue an interrupted run from its last checkpoint")
+    args = parser.parse_args()
+    
     # Analyze available models
     analyze_models()
     
     # Run main analysis
-    main()
\ No newline at end of file
+    checkpoint_dir = args.checkpoint_dir
+    if args.resume and not checkpoint_dir:
+        checkpoint_dir = DEFAULT_CHECKPOINT_DIR
+    main(resume=args.resume, checkpoint_dir=checkpoint_dir)
\ No newline at end of file
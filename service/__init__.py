@@ -0,0 +1,2 @@
+from .job_queue import JobQueue
+from .worker_pool import WorkerPool
@@ -0,0 +1,118 @@
+import json
+import sqlite3
+import threading
+import time
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video_path TEXT NOT NULL,
+    options TEXT NOT NULL,
+    state TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+)
+"""
+
+
+class JobQueue:
+    """Persistent FIFO of analysis jobs in a SQLite file.
+
+    Jobs survive restarts: anything still marked running when the queue is opened was
+    interrupted and goes back to queued. Safe to share between threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(_SCHEMA)
+            self._db.execute("UPDATE jobs SET state = ?, progress = 0, started_at = NULL WHERE state = ?",
+                             (QUEUED, RUNNING))
+
+    def submit(self, video_path, options=None):
+        """Queue a job and return it"""
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO jobs (video_path, options, state, created_at) VALUES (?, ?, ?, ?)",
+                (video_path, json.dumps(options or {}), QUEUED, time.time()))
+        return self.get(cursor.lastrowid)
+
+    def claim(self):
+        """Mark the oldest queued job as running and return it, or None when the queue is empty"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute("SELECT id FROM jobs WHERE state = ? ORDER BY id LIMIT 1",
+                                       (QUEUED,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE jobs SET state = ?, started_at = ? WHERE id = ?",
+                                     (RUNNING, time.time(), row['id']))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return self.get(row['id']) if row is not None else None
+
+    def set_progress(self, job_id, progress):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET progress = ? WHERE id = ? AND state = ?",
+                             (progress, job_id, RUNNING))
+
+    def finish(self, job_id, result):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET state = ?, progress = 1, result = ?, finished_at = ? WHERE id = ?",
+                             (DONE, json.dumps(result), time.time(), job_id))
+
+    def fail(self, job_id, error):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET state = ?, error = ?, finished_at = ? WHERE id = ?",
+                             (FAILED, error, time.time(), job_id))
+
+    def get(self, job_id):
+        """The job as a dict, or None if there is no such job"""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _job_dict(row) if row is not None else None
+
+    def list(self, state=None, limit=100):
+        """Most recent jobs first, optionally only those in one state"""
+        query = "SELECT * FROM jobs"
+        params = ()
+        if state is not None:
+            query += " WHERE state = ?"
+            params = (state,)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY id DESC LIMIT ?", params + (limit,)).fetchall()
+        return [_job_dict(row) for row in rows]
+
+    def counts(self):
+        """Number of jobs per state"""
+        with self._lock:
+            rows = self._db.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        counts.update({row['state']: row['n'] for row in rows})
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def _job_dict(row):
+    job = dict(row)
+    job['options'] = json.loads(job['options'])
+    job['result'] = json.loads(job['result']) if job['result'] is not None else None
+    return job
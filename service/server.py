@@ -0,0 +1,196 @@
+"""Local analysis service: a JSON HTTP API in front of a persistent job queue and warm workers.
+
+Usage:
+    python -m service.server --workers 2 --port 8765
+
+    curl -X POST localhost:8765/jobs -d '{"video_path": "input_video.mp4", "options": {"pipelined": true}}'
+    curl localhost:8765/jobs/1
+    curl localhost:8765/jobs?state=queued
+    curl localhost:8765/health
+"""
+import argparse
+import json
+import os
+import re
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from service.job_queue import JobQueue
+from service.worker_pool import WorkerPool
+
+# Per-job settings accepted by run_analysis; models and batch size are fixed per worker
+JOB_OPTIONS = {
+    'pipelined': bool,
+    'workers': int,
+    'output_codec': str,
+    'encode_workers': int,
+    'live_mode': bool,
+    'live_latency_budget_s': float,
+    'separate_videos': bool,
+}
+# Jobs run in daemonic pool workers, which can't start process pools of their own
+SINGLE_PROCESS_OPTIONS = ('workers', 'encode_workers')
+
+
+def validate_job(payload):
+    """(video_path, options) of a job request; raises ValueError when it is not acceptable"""
+    if not isinstance(payload, dict):
+        raise ValueError("body must be a JSON object")
+    video_path = payload.get('video_path')
+    if not isinstance(video_path, str) or not os.path.isfile(video_path):
+        raise ValueError(f"video_path does not exist: {video_path!r}")
+
+    options = payload.get('options') or {}
+    if not isinstance(options, dict):
+        raise ValueError("options must be a JSON object")
+    unknown = sorted(set(options) - set(JOB_OPTIONS))
+    if unknown:
+        raise ValueError(f"unknown options: {', '.join(unknown)}")
+    # null means "use the default", which run_analysis applies when the key is left out
+    options = {key: value for key, value in options.items() if value is not None}
+    for key, value in options.items():
+        kind = JOB_OPTIONS[key]
+        # bool is an int subclass, so true/false would pass as a count
+        if isinstance(value, bool) is not (kind is bool) or (
+                not isinstance(value, kind) and not (kind is float and isinstance(value, int))):
+            raise ValueError(f"option {key} must be {kind.__name__}")
+        if key in SINGLE_PROCESS_OPTIONS and value > 1:
+            raise ValueError(f"option {key} can be at most 1 in the service; start the server with more --workers instead")
+    return os.path.abspath(video_path), options
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """POST /jobs, GET /jobs, GET /jobs/<id> and GET /health"""
+
+    server_version = 'TennisAnalysis/1.0'
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        job_queue = self.server.job_queue
+        match = re.fullmatch(r'/jobs/(\d+)', url.path)
+        if match:
+            job = job_queue.get(int(match.group(1)))
+            if job is None:
+                self._send_json(404, {'error': 'no such job'})
+            else:
+                self._send_json(200, job)
+        elif url.path == '/jobs':
+            query = parse_qs(url.query)
+            state = query.get('state', [None])[0]
+            try:
+                limit = int(query.get('limit', ['100'])[0])
+                if limit < 1:
+                    raise ValueError
+            except ValueError:
+                self._send_json(400, {'error': 'limit must be a positive integer'})
+                return
+            self._send_json(200, {'jobs': job_queue.list(state, limit)})
+        elif url.path == '/health':
+            self._send_json(200, {'workers': self.server.worker_pool.workers,
+                                  'active_jobs': self.server.worker_pool.active_jobs,
+                                  'jobs': job_queue.counts()})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/jobs':
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'null')
+            video_path, options = validate_job(payload)
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        self._send_json(201, self.server.job_queue.submit(video_path, options))
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(job_queue, worker_pool, host='127.0.0.1', port=8765, verbose=False):
+    server = ThreadingHTTPServer((host, port), JobRequestHandler)
+    server.job_queue = job_queue
+    server.worker_pool = worker_pool
+    server.verbose = verbose
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve tennis video analysis jobs from warm worker processes")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--db', default='jobs.db', help="SQLite file holding the job queue")
+    parser.add_argument('--workers', type=int, default=2, help="jobs processed at the same time")
+    parser.add_argument('--output-root', default=os.path.join('Output_videos', 'jobs'))
+    parser.add_argument('--player-model', default='yolov8n.pt')
+    parser.add_argument('--ball-model', default='models/best.pt')
+    parser.add_argument('--backend', choices=('pytorch', 'onnx', 'openvino', 'auto', 'int8'), default='pytorch',
+                        help="inference backend, exported before the workers start")
+    parser.add_argument('--max-recall-drop', type=float, default=0.02,
+                        help="with --backend int8, largest allowed recall drop on the ball dataset")
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--max-interpolation-gap', type=int, default=45)
+    parser.add_argument('--play-segmentation', action='store_true',
+                        help="only detect and analyze the in-play segments of each video")
+    parser.add_argument('--cache-dir', default='.detection_cache', help="detection cache, '' disables it")
+    parser.add_argument('--verbose', action='store_true', help="log every HTTP request")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    cache = None
+    if args.cache_dir:
+        from trackers.detection_cache import DetectionCache
+        cache = DetectionCache(args.cache_dir, max_size_mb=2048)
+    quantization = {'max_recall_drop': args.max_recall_drop}
+    tracker_kwargs = {
+        'player_model_path': args.player_model,
+        'ball_model_path': args.ball_model,
+        'batch_size': args.batch_size,
+        'max_interpolation_gap': args.max_interpolation_gap,
+        'cache': cache,
+        'player_options': {'backend': args.backend, 'quantization': quantization},
+        'ball_options': {'backend': args.backend, 'quantization': quantization},
+        'play_segmentation': args.play_segmentation,
+    }
+
+    if args.backend != 'pytorch':
+        from trackers.detector_backends import create_detector
+        # Export here once, so the workers only load the cached exports
+        for weights in (args.player_model, args.ball_model):
+            create_detector(weights, args.backend, export=True, quantization=quantization)
+
+    job_queue = JobQueue(args.db)
+    worker_pool = WorkerPool(job_queue, args.workers, tracker_kwargs, args.output_root)
+    print(f"🔄 Loading models in {args.workers} workers...")
+    worker_pool.start()
+    server = make_server(job_queue, worker_pool, args.host, args.port, args.verbose)
+    print(f"✅ Serving analysis jobs on http://{args.host}:{args.port} (queue: {args.db})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Shutting down, unfinished jobs stay queued")
+    finally:
+        server.server_close()
+        worker_pool.stop()
+        job_queue.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
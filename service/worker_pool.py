@@ -0,0 +1,140 @@
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+
+# Per-process state of a pool worker, set up once by _init_worker
+_tracker = None
+_progress_queue = None
+
+
+def _init_worker(tracker_kwargs, progress_queue):
+    """Load the models once per worker process; every job then reuses them"""
+    global _tracker, _progress_queue
+    _progress_queue = progress_queue
+    try:
+        from utils import silence_yolo_logging
+        from trackers.tennis_tracker import TennisTracker
+
+        silence_yolo_logging()
+        _tracker = TennisTracker(**tracker_kwargs)
+        _tracker.load_models()
+    except Exception:
+        # Reported to start(); raising here would make the pool restart the worker forever
+        progress_queue.put((None, traceback.format_exc()))
+        return
+    progress_queue.put((None, None))
+
+
+def _run_job(job_id, video_path, output_dir, options):
+    from main import run_analysis
+
+    def report(fraction):
+        _progress_queue.put((job_id, fraction))
+
+    return run_analysis(_tracker, video_path, output_dir, progress=report, **options)
+
+
+class WorkerPool:
+    """Warm worker processes that take jobs from a JobQueue.
+
+    Every worker builds a TennisTracker once at startup, so jobs don't pay for importing
+    YOLO and loading weights. Up to `workers` jobs run at the same time; a dispatcher
+    thread claims queued jobs as workers free up, and progress reported by the workers
+    is written back to the queue. Outputs of job N go to output_root/job_N.
+    """
+
+    def __init__(self, job_queue, workers=2, tracker_kwargs=None, output_root='Output_videos/jobs',
+                 poll_interval_s=0.5):
+        self.job_queue = job_queue
+        self.workers = workers
+        self.tracker_kwargs = tracker_kwargs or {}
+        self.output_root = output_root
+        self.poll_interval_s = poll_interval_s
+        self._context = multiprocessing.get_context('spawn')
+        self._progress_queue = self._context.Queue()
+        self._pool = None
+        self._active = set()
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    @property
+    def active_jobs(self):
+        with self._lock:
+            return sorted(self._active)
+
+    def start(self):
+        """Start the worker processes and wait until their models are loaded"""
+        # 'spawn' keeps OpenCV's and torch's thread pools from being forked into a broken state
+        self._pool = self._context.Pool(self.workers, initializer=_init_worker,
+                                        initargs=(self.tracker_kwargs, self._progress_queue))
+        # Every worker reports (None, error or None) once its initializer is done
+        for _ in range(self.workers):
+            _, error = self._progress_queue.get()
+            if error is not None:
+                self._pool.terminate()
+                self._pool = None
+                raise RuntimeError(f"Worker failed to load the models:\n{error}")
+        for target in (self._dispatch, self._collect_progress):
+            thread = threading.Thread(target=target, name=f"worker-pool-{target.__name__.strip('_')}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _dispatch(self):
+        while not self._stop_event.is_set():
+            with self._lock:
+                free = len(self._active) < self.workers
+            job = self.job_queue.claim() if free else None
+            if job is None:
+                self._stop_event.wait(self.poll_interval_s)
+                continue
+
+            job_id = job['id']
+            with self._lock:
+                self._active.add(job_id)
+            output_dir = os.path.join(self.output_root, f"job_{job_id}")
+            self._pool.apply_async(_run_job, (job_id, job['video_path'], output_dir, job['options']),
+                                   callback=lambda result, job_id=job_id: self._finished(job_id, result),
+                                   error_callback=lambda error, job_id=job_id: self._failed(job_id, error))
+
+    def _collect_progress(self):
+        while not self._stop_event.is_set():
+            try:
+                job_id, fraction = self._progress_queue.get(timeout=self.poll_interval_s)
+            except Exception:
+                continue
+            self.job_queue.set_progress(job_id, fraction)
+
+    def _finished(self, job_id, result):
+        self.job_queue.finish(job_id, result)
+        with self._lock:
+            self._active.discard(job_id)
+
+    def _failed(self, job_id, error):
+        message = ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+        self.job_queue.fail(job_id, message.strip())
+        with self._lock:
+            self._active.discard(job_id)
+
+    def wait_idle(self, timeout=None):
+        """Block until no job is queued or running (or timeout seconds passed); returns True if idle"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            counts = self.job_queue.counts()
+            if not counts['queued'] and not counts['running'] and not self.active_jobs:
+                return True
+            time.sleep(self.poll_interval_s)
+        return False
+
+    def stop(self):
+        """Stop taking jobs and shut the workers down; unfinished jobs are re-queued on next start"""
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
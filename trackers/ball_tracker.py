@@ -1,115 +1,400 @@
-from ultralytics import YOLO
 import cv2
 import numpy as np
+from utils.instrumentation import get_metrics
+from .detector_backends import create_detector, non_max_suppression
+from .motion_gate import MotionGate
+from .overlay_renderer import TrailBuffer, draw_trail
+from .track_store import TrackStore, TrackStoreBuilder
+from .tracking import ByteTrackStep, TRACKER_CONF, crop_around, iter_batches, result_to_arrays, tile_grid
 
 class BallTracker:
-    def __init__(self, model_path):
-        self.model = YOLO(model_path)
+    # Per-video state set up by reset(), saved in checkpoints along with the tracks; the
+    # motion gate's background and the court detector's geometry are state too
+    STATE_ATTRS = ('ball_positions', 'roi_stats', '_frame_counter', '_last_ball_centers', '_roi_misses',
+                   'tile_stats', 'motion_stats', '_motion_candidates', 'motion_gate', 'court_detector')
+    
+    def __init__(self, model_path, batch_size=1, conf_threshold=0.5, cache=None,
+                 roi_mode=False, roi_size=320, max_roi_misses=5, tile_size=None, tile_overlap=0.2,
+                 skip_off_court=True, court_margin=0.25, tile_nms_iou=0.5, motion_gate=False, motion_options=None,
+                 model=None,
+                 backend='pytorch', export_model=True, quantization=None, threads=None):
+        self.model_path = model_path
+        self.cache = cache
+        # Any already loaded detector with YOLO's predict() interface can be passed as model;
+        # otherwise one is built for backend ('pytorch', 'onnx', 'openvino', 'auto' or 'int8'),
+        # exporting the weights first if needed and falling back to PyTorch
+        self.model = model if model is not None else create_detector(model_path, backend, export=export_model,
+                                                                     quantization=quantization, threads=threads)
+        self.batch_size = batch_size
+        self.conf_threshold = conf_threshold
+        self.tracker = ByteTrackStep()
+        
+        # ROI mode: search a native-resolution crop around the predicted ball position
+        self.roi_mode = roi_mode
+        self.roi_size = roi_size
+        self.max_roi_misses = max_roi_misses
+
+        # Tiled mode: search overlapping native-resolution tiles instead of the downscaled
+        # frame, so a ball of a few pixels in 4K footage stays visible to the model. Tiles
+        # farther than court_margin (a fraction of the court's size) from the court are skipped
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.court_margin = court_margin
+        self.tile_nms_iou = tile_nms_iou
+        self.court_detector = None
+        if tile_size and skip_off_court:
+            # court_analyzer imports this module through ball_trajectory
+            from .court_analyzer import CourtDetector
+            self.court_detector = CourtDetector()
+
+        # Motion gate: only search roi_size crops around small moving blobs, skip frames
+        # where nothing small moves, and search the whole frame when the camera moves.
+        # motion_options are MotionGate settings, e.g. {'width': 480, 'max_area': 80}
+        self.motion_gate = MotionGate(**(motion_options or {})) if motion_gate else None
+        self.reset()
+    
+    def reset(self):
+        """Forget all per-video state (tracks, ROI history) before another video"""
+        self.tracker.reset()
         self.ball_positions = []
+        self.roi_stats = {'roi_hits': 0, 'roi_misses': 0, 'full_frame_searches': 0, 'fallbacks': 0}
+        self._frame_counter = 0
+        self._last_ball_centers = []  # (frame_idx, x, y) of the last two detections
+        self._roi_misses = 0
+        self.tile_stats = {'tiles_run': 0, 'tiles_skipped': 0}
+        self.motion_stats = {'candidate_frames': 0, 'candidates': 0, 'skipped_frames': 0, 'full_frames': 0}
+        self._motion_candidates = None
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+        if self.court_detector is not None:
+            self.court_detector.reset()
+    
+    def get_state(self):
+        """Everything reset() clears, e.g. for a checkpoint (see set_state)"""
+        state = {name: getattr(self, name) for name in self.STATE_ATTRS}
+        state['tracker'] = self.tracker.get_state()
+        return state
     
-    def detect_frames(self, frames):
-        """Detect tennis ball in all frames"""
-        ball_detections = []
-        for frame in frames:
-            ball_dict = self.detect_frame(frame)
-            ball_detections.append(ball_dict)
-        return ball_detections
+    def set_state(self, state):
+        state = dict(state)
+        self.tracker.set_state(state.pop('tracker'))
+        for name, value in state.items():
+            setattr(self, name, value)
+    
+    def detect_frames(self, frames, batch_size=None, as_store=False, checkpoint=None):
+        """Detect tennis ball in all frames (any iterable of frames, e.g. a VideoReader).
+
+        Returns a list of per-frame dicts, or a columnar TrackStore when as_store is set.
+        When a DetectionCache is set and frames come from a file (e.g. a VideoReader),
+        detections are loaded from / saved to the cache instead of re-running inference.
+        With a RunCheckpoint (and a VideoReader), progress is saved as detection goes and
+        an interrupted call continues where it stopped.
+        """
+        cache_key = self._cache_key(frames)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached if as_store else cached.to_detections()
+
+        if checkpoint is not None:
+            store = checkpoint.detect(self, frames, 'ball', TrackStoreBuilder(), batch_size)
+            if cache_key is not None:
+                self.cache.put(cache_key, store)
+            return store if as_store else store.to_detections()
+
+        builder = TrackStoreBuilder()
+        detections = []
+        for detection in self.iter_detections(frames, batch_size):
+            builder.append(detection)
+            if not as_store:
+                detections.append(detection)
+        
+        if cache_key is None and not as_store:
+            return detections
+        store = builder.build()
+        if cache_key is not None:
+            self.cache.put(cache_key, store)
+        return store if as_store else detections
+
+    def _cache_key(self, frames):
+        video_path = getattr(frames, 'path', None)
+        if self.cache is None or video_path is None:
+            return None
+        params = dict(self._cache_params(), frame_range=getattr(frames, 'frame_range', None))
+        return self.cache.make_key(video_path, self.model_path, params)
+
+    def _cache_params(self):
+        """Everything besides video and weights that changes the detections"""
+        return {
+            'tracker': 'ball',
+            'conf_threshold': self.conf_threshold,
+            'detector_conf': TRACKER_CONF,
+            'tracker_cfg': self.tracker.tracker_cfg,
+            'format': 'track_store',
+            'roi': [self.roi_size, self.max_roi_misses] if self.roi_mode else None,
+            # Exported backends round slightly differently; PyTorch keeps the existing cache keys
+            **({'backend': self.model.backend} if getattr(self.model, 'backend', 'pytorch') != 'pytorch' else {}),
+            **({'tiles': [self.tile_size, self.tile_overlap, self.court_detector is not None, self.court_margin,
+                          self.tile_nms_iou]} if self.tile_size else {}),
+            **({'motion_gate': self.motion_gate.settings()} if self.motion_gate is not None else {}),
+        }
+
+    def iter_detections(self, frames, batch_size=None):
+        """Yield one ball dict per frame, running the detector on batches of frames"""
+        if self.roi_mode or self.tile_size or self.motion_gate is not None:
+            # Each ROI depends on the previous detection, a frame's tiles or motion crops
+            # already make a batch, and the background model needs frames in order,
+            # so frames go one at a time
+            for frame in frames:
+                yield self.detect_frame(frame)
+            return
+        
+        batch_size = batch_size or self.batch_size
+        for batch in iter_batches(frames, batch_size):
+            results = self._predict(batch)
+            # Tracking still runs frame by frame, in order, so IDs match the per-frame path
+            for frame, result in zip(batch, results):
+                yield self._record_frame(self._track_result(frame, result))
     
     def detect_frame(self, frame):
         """Detect tennis ball in a single frame"""
-        results = self.model.track(frame, persist=True)
+        if self.motion_gate is not None:
+            # The background model sees every frame, also those an ROI search settles
+            self._motion_candidates = self.motion_gate.propose(frame)
+        if self.roi_mode:
+            return self._record_frame(self._detect_frame_roi(frame))
+        if self.tile_size or self.motion_gate is not None:
+            return self._record_frame(self._remember_ball(self._track_arrays(frame, *self._search_frame(frame))))
+        results = self._predict(frame)
+        return self._record_frame(self._track_result(frame, results[0]))
+
+    def _predict(self, source, **kwargs):
+        """Run the detector without YOLO's per-image console log, timing the call"""
+        metrics = get_metrics()
+        with metrics.timer('stage_seconds', stage='ball_inference'):
+            results = self.model.predict(source, conf=TRACKER_CONF, verbose=False, **kwargs)
+        metrics.count('inference_images', len(results), tracker='ball')
+        return results
+
+    def _record_frame(self, ball_dict):
+        metrics = get_metrics()
+        metrics.count('frames', stage='ball')
+        metrics.observe('detections_per_frame', len(ball_dict), tracker='ball')
+        return ball_dict
+
+    def _search_frame(self, frame):
+        """Search the whole frame, through motion candidates or tiles if enabled; returns xyxy, conf, cls"""
+        if self.motion_gate is not None:
+            metrics = get_metrics()
+            candidates = self._motion_candidates
+            recent = (self._last_ball_centers
+                      and self._frame_counter - self._last_ball_centers[-1][0] <= self.max_roi_misses)
+            if candidates is not None and recent and not self.roi_mode:
+                # A ball passing a player merges into the player's blob; keep following its track
+                candidates = candidates + [self._predict_ball_center()]
+            if candidates is not None and not candidates:
+                self.motion_stats['skipped_frames'] += 1
+                metrics.count('motion_frames', outcome='skipped')
+                return np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64)
+            if candidates:
+                self.motion_stats['candidate_frames'] += 1
+                self.motion_stats['candidates'] += len(candidates)
+                metrics.count('motion_frames', outcome='candidates')
+                return self._detect_candidates(frame, candidates)
+            self.motion_stats['full_frames'] += 1
+            metrics.count('motion_frames', outcome='full')
+        if self.tile_size:
+            return self._detect_tiled(frame)
+        return result_to_arrays(self._predict(frame)[0])
+
+    def _detect_candidates(self, frame, candidates):
+        """Detect on roi_size crops around motion candidates in one batch"""
+        crops = [crop_around(frame, center, self.roi_size) for center in candidates]
+        results = self._predict([crop for crop, _, _ in crops], imgsz=self.roi_size)
+        boxes = []
+        for (_, x0, y0), result in zip(crops, results):
+            xyxy, conf, cls = result_to_arrays(result)
+            boxes.append((xyxy + np.array([x0, y0, x0, y0], dtype=np.float32), conf, cls))
+        return self._merge_boxes(boxes)
+
+    def _merge_boxes(self, boxes):
+        """Merge (xyxy, conf, cls) of overlapping crops, already in frame pixels, with NMS"""
+        if not boxes:
+            return np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64)
+        xyxy, conf, cls = (np.concatenate(parts) for parts in zip(*boxes))
+        keep = non_max_suppression(xyxy, conf, self.tile_nms_iou, cls)
+        return xyxy[keep], conf[keep], cls[keep]
+
+    def _tiles(self, frame):
+        """Top-left corners of the tiles of frame to search, skipping those away from the court.
+
+        Returns (tiles, number of tiles skipped).
+        """
+        height, width = frame.shape[:2]
+        tiles = tile_grid(width, height, self.tile_size, self.tile_overlap)
+        if self.court_detector is None:
+            return tiles, 0
+        geometry = self.court_detector.analyze_frame(frame)
+        # Court lines can split the colored surface, so the area alone may be one section of it
+        points = [np.asarray(line, dtype=np.int32).reshape(2, 2) for line in geometry.lines]
+        if geometry.area is not None:
+            points.append(geometry.area.reshape(-1, 2).astype(np.int32))
+        if not points:
+            return tiles, 0
+        x, y, w, h = cv2.boundingRect(np.concatenate(points))
+        x0, y0 = x - w * self.court_margin, y - h * self.court_margin
+        x1, y1 = x + w * (1 + self.court_margin), y + h * (1 + self.court_margin)
+        tile_w, tile_h = min(self.tile_size, width), min(self.tile_size, height)
+        near_court = [(tx, ty) for tx, ty in tiles if tx < x1 and tx + tile_w > x0 and ty < y1 and ty + tile_h > y0]
+        return near_court, len(tiles) - len(near_court)
+
+    def _detect_tiled(self, frame):
+        """Detect on all tiles of frame in one batch; returns merged full-frame xyxy, conf, cls"""
+        height, width = frame.shape[:2]
+        tile_w, tile_h = min(self.tile_size, width), min(self.tile_size, height)
+        tiles, skipped = self._tiles(frame)
+        self.tile_stats['tiles_run'] += len(tiles)
+        self.tile_stats['tiles_skipped'] += skipped
+        metrics = get_metrics()
+        metrics.count('tiles', len(tiles), state='run')
+        metrics.count('tiles', skipped, state='skipped')
+
+        results = self._predict([frame[y:y + tile_h, x:x + tile_w] for x, y in tiles], imgsz=self.tile_size)
+        boxes = []
+        for (x, y), result in zip(tiles, results):
+            xyxy, conf, cls = result_to_arrays(result)
+            # A box cut by a tile edge inside the frame lies whole in the overlapping neighbor
+            cut = (((xyxy[:, 0] <= 1) & (x > 0)) | ((xyxy[:, 1] <= 1) & (y > 0))
+                   | ((xyxy[:, 2] >= tile_w - 1) & (x + tile_w < width))
+                   | ((xyxy[:, 3] >= tile_h - 1) & (y + tile_h < height)))
+            boxes.append((xyxy[~cut] + np.array([x, y, x, y], dtype=np.float32), conf[~cut], cls[~cut]))
+        # The same ball seen by two overlapping tiles is merged into the more confident box
+        return self._merge_boxes(boxes)
+
+    def _predict_ball_center(self):
+        """Constant-velocity prediction of the ball center in the current frame"""
+        if not self._last_ball_centers:
+            return None
+        last_idx, last_x, last_y = self._last_ball_centers[-1]
+        if len(self._last_ball_centers) < 2:
+            return last_x, last_y
+        prev_idx, prev_x, prev_y = self._last_ball_centers[-2]
+        steps = (self._frame_counter - last_idx) / max(1, last_idx - prev_idx)
+        return last_x + (last_x - prev_x) * steps, last_y + (last_y - prev_y) * steps
+
+    def _detect_frame_roi(self, frame):
+        """Detect the ball in a crop around its predicted position, full frame as fallback"""
+        center = self._predict_ball_center()
+        if center is not None and self._roi_misses < self.max_roi_misses:
+            crop, x0, y0 = crop_around(frame, center, self.roi_size)
+            result = self._predict(crop, imgsz=self.roi_size)[0]
+            xyxy, conf, cls = result_to_arrays(result)
+            xyxy = xyxy + np.array([x0, y0, x0, y0], dtype=np.float32)
+            if (conf > self.conf_threshold).any():
+                self.roi_stats['roi_hits'] += 1
+                self._roi_misses = 0
+            else:
+                self.roi_stats['roi_misses'] += 1
+                self._roi_misses += 1
+        else:
+            if center is not None:
+                self.roi_stats['fallbacks'] += 1
+            self.roi_stats['full_frame_searches'] += 1
+            xyxy, conf, cls = self._search_frame(frame)
+            if (conf > self.conf_threshold).any():
+                self._roi_misses = 0
+        
+        return self._remember_ball(self._track_arrays(frame, xyxy, conf, cls))
+
+    def _remember_ball(self, ball_dict):
+        """Keep the last two ball centers for _predict_ball_center and advance the frame counter"""
+        if ball_dict:
+            best = max(ball_dict.values(), key=lambda ball_data: ball_data['confidence'])['bbox']
+            self._last_ball_centers = self._last_ball_centers[-1:] + [
+                (self._frame_counter, (best[0] + best[2]) / 2, (best[1] + best[3]) / 2)]
+        self._frame_counter += 1
+        return ball_dict
+
+    def _track_result(self, frame, result):
+        """Run ByteTrack on one frame of raw detections and build the ball dict"""
+        xyxy, conf, cls = result_to_arrays(result)
+        return self._track_arrays(frame, xyxy, conf, cls)
+
+    def _track_arrays(self, frame, xyxy, conf, cls):
+        """Run ByteTrack on full-frame detection arrays and build the ball dict"""
+        xyxy, conf, cls, track_ids = self.tracker.update(xyxy, conf, cls, frame)
+        
+        # Only consider high confidence detections
+        keep = conf > self.conf_threshold
+        if track_ids is None:
+            # Untracked detections all share id 0
+            track_ids = np.zeros(len(conf), dtype=np.int64)
         
         ball_dict = {}
-        if results and len(results) > 0:
-            result = results[0]
-            if result.boxes is not None:
-                for box in result.boxes:
-                    bbox = box.xyxy.tolist()[0]
-                    confidence = float(box.conf.tolist()[0])
-                    
-                    # Only consider high confidence detections
-                    if confidence > 0.5:
-                        if box.id is not None:
-                            track_id = int(box.id.tolist()[0])
-                            ball_dict[track_id] = {
-                                'bbox': bbox,
-                                'confidence': confidence
-                            }
-                        else:
-                            
-                            ball_dict[0] = {
-                                'bbox': bbox,
-                                'confidence': confidence
-                            }
+        for track_id, bbox, confidence in zip(track_ids[keep].tolist(), xyxy[keep].tolist(), conf[keep].tolist()):
+            ball_dict[track_id] = {
+                'bbox': bbox,
+                'confidence': confidence
+            }
         
         return ball_dict
     
-    def interpolate_ball_positions(self, ball_detections):
-        """Interpolate missing ball positions for smoother tracking"""
-        interpolated_detections = ball_detections.copy()
+    def interpolate_ball_positions(self, ball_detections, max_gap=None, method='linear'):
+        """Interpolate missing ball positions for smoother tracking.
+
+        Gaps are filled in one vectorized pass over per-frame position arrays, using the
+        most confident detection of each frame. max_gap limits how many consecutive missing
+        frames are bridged (None bridges any gap) and method is 'linear' or 'cubic'.
+        Accepts a list of per-frame dicts or a TrackStore and returns the same type.
+        """
+        if isinstance(ball_detections, TrackStore):
+            detected_frames, bboxes = best_detection_per_frame(ball_detections)
+        else:
+            detected_frames = []
+            detected_bboxes = []
+            for i, detection in enumerate(ball_detections):
+                if detection:
+                    best = max(detection.values(), key=lambda ball_data: ball_data['confidence'])
+                    detected_frames.append(i)
+                    detected_bboxes.append(best['bbox'])
+            detected_frames = np.asarray(detected_frames, dtype=np.int64)
+            bboxes = np.asarray(detected_bboxes, dtype=np.float64).reshape(-1, 4)
         
+        if len(detected_frames) < 2:
+            return ball_detections if isinstance(ball_detections, TrackStore) else list(ball_detections)
         
-        detected_positions = []
-        for i, detection in enumerate(ball_detections):
-            if detection:
-                for track_id, ball_data in detection.items():
-                    bbox = ball_data['bbox']
-                    center_x = (bbox[0] + bbox[2]) / 2
-                    center_y = (bbox[1] + bbox[3]) / 2
-                    detected_positions.append((i, center_x, center_y, bbox))
+        # Interpolate center and size, so the bbox grows/shrinks between detections
+        values = np.column_stack([(bboxes[:, :2] + bboxes[:, 2:]) / 2, bboxes[:, 2:] - bboxes[:, :2]])
+        metrics = get_metrics()
+        with metrics.timer('stage_seconds', stage='interpolation'):
+            missing, filled = interpolate_gaps(detected_frames, values, max_gap, method)
+        metrics.count('interpolated_frames', len(missing))
+        half_size = filled[:, 2:] / 2
+        interp_bboxes = np.column_stack([filled[:, :2] - half_size, filled[:, :2] + half_size])
         
-        if len(detected_positions) >= 2:
-            for i in range(len(ball_detections)):
-                if not ball_detections[i]:  # Missing detection
-                    # Find nearest detected positions
-                    prev_pos = None
-                    next_pos = None
-                    
-                    for pos in detected_positions:
-                        if pos[0] < i:
-                            prev_pos = pos
-                        elif pos[0] > i and next_pos is None:
-                            next_pos = pos
-                            break
-                    
-                    # Interpolate if we have both previous and next positions
-                    if prev_pos and next_pos:
-                        frame_diff = next_pos[0] - prev_pos[0]
-                        current_diff = i - prev_pos[0]
-                        ratio = current_diff / frame_diff
-                        
-                        # Interpolate position
-                        interp_x = prev_pos[1] + (next_pos[1] - prev_pos[1]) * ratio
-                        interp_y = prev_pos[2] + (next_pos[2] - prev_pos[2]) * ratio
-                        
-                        # Create interpolated bbox
-                        bbox_width = prev_pos[3][2] - prev_pos[3][0]
-                        bbox_height = prev_pos[3][3] - prev_pos[3][1]
-                        
-                        interp_bbox = [
-                            interp_x - bbox_width/2,
-                            interp_y - bbox_height/2,
-                            interp_x + bbox_width/2,
-                            interp_y + bbox_height/2
-                        ]
-                        
-                        interpolated_detections[i] = {
-                            0: {
-                                'bbox': interp_bbox,
-                                'confidence': 0.3,  # Lower confidence for interpolated
-                                'interpolated': True
-                            }
-                        }
+        if isinstance(ball_detections, TrackStore):
+            n = len(missing)
+            return ball_detections.with_rows(missing, np.zeros(n), interp_bboxes,
+                                             np.full(n, 0.3), np.zeros(n), np.ones(n, dtype=bool))
+        
+        interpolated_detections = list(ball_detections)
+        for frame_idx, interp_bbox in zip(missing.tolist(), interp_bboxes.tolist()):
+            interpolated_detections[frame_idx] = {
+                0: {
+                    'bbox': interp_bbox,
+                    'confidence': 0.3,  # Lower confidence for interpolated
+                    'interpolated': True
+                }
+            }
         
         return interpolated_detections
     
-    def draw_ball_tracking(self, video_frames, ball_detections):
-        """Draw ball tracking on video frames"""
-        output_frames = []
-        ball_trail = []  # Store ball positions for trail effect
+    def draw_ball_tracking(self, video_frames, ball_detections, in_place=True):
+        """Draw ball tracking on video frames (yields frames lazily, annotated in place by default)"""
+        ball_trail = TrailBuffer(30)  # Last 30 ball positions for the trail effect
         
         for frame, detection in zip(video_frames, ball_detections):
-            frame_copy = frame.copy()
+            frame_copy = frame if in_place else frame.copy()
             
             if detection:
                 for track_id, ball_data in detection.items():
@@ -123,8 +408,6 @@ class BallTracker:
                     
                     # Add to trail
                     ball_trail.append((center_x, center_y))
-                    if len(ball_trail) > 30:  # Keep last 30 positions
-                        ball_trail.pop(0)
                     
                     # Draw ball detection
                     if is_interpolated:
@@ -141,14 +424,145 @@ class BallTracker:
                     # Draw center point
                     cv2.circle(frame_copy, (center_x, center_y), 3, color, -1)
             
-            # Draw ball trail
-            if len(ball_trail) > 1:
-                for i in range(1, len(ball_trail)):
-                    alpha = i / len(ball_trail)  # Fade effect
-                    thickness = max(1, int(3 * alpha))
-                    cv2.line(frame_copy, ball_trail[i-1], ball_trail[i], 
-                           (0, 150, 255), thickness)
+            # Draw ball trail, thinning out towards older positions
+            draw_trail(frame_copy, ball_trail.points(), (0, 150, 255), 3)
             
-            output_frames.append(frame_copy)
-        
-        return output_frames
\ No newline at end of file
+            yield frame_copy
+
+
+def best_detection_per_frame(store):
+    """Frame indices and bboxes of the most confident detection in each frame of a TrackStore"""
+    order = np.lexsort((-store.confidence, store.frame))
+    sorted_frames = store.frame[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = sorted_frames[1:] != sorted_frames[:-1]
+    best = order[first]
+    return store.frame[best], store.bbox[best].astype(np.float64)
+
+
+def interpolate_gaps(known_frames, values, max_gap=None, method='linear'):
+    """Fill the frames missing between known_frames, all at once.
+
+    known_frames is a sorted (K,) array of frame indices and values a (K, D) array of
+    per-frame values (e.g. center x/y and bbox size). Returns (missing_frames, filled)
+    for every interior gap of at most max_gap frames. 'cubic' uses a cubic Hermite
+    spline through the known points, which follows the ball's arc more closely;
+    columns after the first two (sizes) are always linear so they can't overshoot.
+    """
+    known_frames = np.asarray(known_frames)
+    values = np.asarray(values, dtype=np.float64)
+    if len(known_frames) < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, values.shape[1]))
+    
+    all_frames = np.arange(known_frames[0], known_frames[-1] + 1)
+    missing = all_frames[~np.isin(all_frames, known_frames)]
+    
+    right = np.searchsorted(known_frames, missing)
+    left = right - 1
+    span = known_frames[right] - known_frames[left]
+    if max_gap is not None:
+        keep = span - 1 <= max_gap
+        missing, left, right, span = missing[keep], left[keep], right[keep], span[keep]
+    
+    t = ((missing - known_frames[left]) / span)[:, None]
+    filled = values[left] + (values[right] - values[left]) * t
+    
+    if method == 'cubic':
+        tangents = np.gradient(values[:, :2], known_frames.astype(np.float64), axis=0)
+        h = span[:, None].astype(np.float64)
+        t2, t3 = t * t, t * t * t
+        filled[:, :2] = ((2 * t3 - 3 * t2 + 1) * values[left, :2]
+                         + (t3 - 2 * t2 + t) * h * tangents[left]
+                         + (-2 * t3 + 3 * t2) * values[right, :2]
+                         + (t3 - t2) * h * tangents[right])
+    elif method != 'linear':
+        raise ValueError(f"Unknown interpolation method: {method}")
+    
+    return missing, filled
+
+
+class StreamingBallInterpolator:
+    """Fills ball gaps online for streaming runs, with the same results as interpolate_gaps.
+
+    push() takes frames in order and returns the (payload, ball_dict) pairs that are
+    ready, in order. Frames without a ball are held until the next detection arrives;
+    gaps longer than max_gap are released without interpolation. 'cubic' also needs the
+    detection after a gap for the end tangent, so it holds frames until that one arrives
+    too, up to max_gap frames later; when it comes later than that, the end tangent is
+    taken from the gap's own endpoints.
+    """
+
+    def __init__(self, max_gap=30, method='linear'):
+        if method not in ('linear', 'cubic'):
+            raise ValueError(f"Unknown interpolation method: {method}")
+        self.max_gap = max_gap
+        self.method = method
+        self.held = []  # [frame_idx, payload, ball_dict] in order, ball_dict None while missing
+        self.points = []  # (frame_idx, [center x, center y, width, height]) of recent detections
+        self.frame_idx = -1
+
+    def push(self, frame_idx, ball_dict, payload):
+        self.frame_idx = frame_idx
+        if ball_dict:
+            # Same choice as best_detection_per_frame: the most confident detection of the frame
+            bbox = max(ball_dict.values(), key=lambda ball_data: ball_data['confidence'])['bbox']
+            self.points.append((frame_idx, [(bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2,
+                                            bbox[2] - bbox[0], bbox[3] - bbox[1]]))
+        self.held.append([frame_idx, payload, ball_dict or None])
+        return self._release()
+
+    def flush(self):
+        """Release all held frames (end of stream), filling gaps that have both endpoints"""
+        return self._release(final=True)
+
+    def _release(self, final=False):
+        ready = []
+        while self.held and (self.held[0][2] is not None or self._fill_gap(final)):
+            _, payload, ball_dict = self.held.pop(0)
+            ready.append((payload, ball_dict))
+
+        # The two detections before the first held frame give its gap's start tangent
+        first = self.held[0][0] if self.held else self.frame_idx + 1
+        before = sum(1 for point_frame, _ in self.points if point_frame < first)
+        del self.points[:max(0, before - 2)]
+        return ready
+
+    def _fill_gap(self, final):
+        """Fill the gap of the first held frame; False while it has to wait for detections"""
+        missing_frame = self.held[0][0]
+        frames = [point_frame for point_frame, _ in self.points]
+        right = next((i for i, point_frame in enumerate(frames) if point_frame > missing_frame), len(frames))
+        left = right - 1
+        if left < 0:
+            gap_end = None  # nothing to interpolate from
+        elif right == len(frames):
+            if not final and self.frame_idx - frames[left] <= self.max_gap:
+                return False
+            gap_end = None
+        elif frames[right] - frames[left] - 1 > self.max_gap:
+            gap_end = None
+        elif (self.method == 'cubic' and right + 1 == len(frames) and not final
+              and self.frame_idx - frames[right] <= self.max_gap):
+            return False
+        else:
+            gap_end = frames[right]
+
+        if gap_end is None:
+            self.held[0][2] = {}
+            return True
+
+        # The neighbouring detections give interpolate_gaps the same tangents as on the whole track
+        window = self.points[max(0, left - 1):right + 2]
+        missing, filled = interpolate_gaps(np.array([point_frame for point_frame, _ in window]),
+                                           np.array([values for _, values in window]), None, self.method)
+        half_size = filled[:, 2:] / 2
+        bboxes = np.column_stack([filled[:, :2] - half_size, filled[:, :2] + half_size]).tolist()
+        fills = dict(zip(missing.tolist(), bboxes))
+        count = 0
+        for entry in self.held:
+            if entry[0] >= gap_end:
+                break
+            entry[2] = {0: {'bbox': fills[entry[0]], 'confidence': 0.3, 'interpolated': True}}
+            count += 1
+        get_metrics().count('interpolated_frames', count)
+        return True
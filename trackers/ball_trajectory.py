@@ -0,0 +1,273 @@
+import math
+from collections import deque
+import numpy as np
+from .ball_tracker import best_detection_per_frame
+from .track_store import TrackStore
+
+
+def savgol_coefficients(window, polyorder, deriv=0, delta=1.0):
+    """Savitzky-Golay filter taps for the deriv-th derivative at the window center"""
+    half = window // 2
+    offsets = np.arange(-half, half + 1, dtype=np.float64)
+    vander = np.vander(offsets, polyorder + 1, increasing=True)
+    return np.linalg.pinv(vander)[deriv] * math.factorial(deriv) / delta ** deriv
+
+
+def savgol_filter(values, window, polyorder, deriv=0, delta=1.0):
+    """Savitzky-Golay filter along axis 0 of values (N,) or (N, D).
+
+    Ends are padded by odd reflection, which continues the local slope, so
+    velocities do not flip sign at the ends of a track.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    flat = values.reshape(len(values), -1)
+    half = window // 2
+    if len(flat) <= half:
+        raise ValueError("track is shorter than half the filter window")
+
+    left = 2 * flat[0] - flat[half:0:-1]
+    right = 2 * flat[-1] - flat[-2:-half - 2:-1]
+    padded = np.concatenate([left, flat, right])
+    taps = savgol_coefficients(window, polyorder, deriv, delta)[::-1]
+    filtered = np.stack([np.convolve(padded[:, d], taps, mode='valid') for d in range(flat.shape[1])], axis=1)
+    return filtered.reshape(values.shape)
+
+
+def _local_suppression(frames, min_gap):
+    """Drop events closer than min_gap frames to the previous kept event"""
+    if len(frames) == 0:
+        return frames
+    keep = np.zeros(len(frames), dtype=bool)
+    last_kept = None
+    for i, frame in enumerate(frames.tolist()):
+        if last_kept is None or frame - last_kept >= min_gap:
+            keep[i] = True
+            last_kept = frame
+    return frames[keep]
+
+
+class BallTrajectory:
+    """Smoothed ball track of a whole video and the events found on it.
+
+    frames, positions, velocity and acceleration cover every frame of every track
+    segment (short gaps inside a segment are filled linearly); segment holds the index
+    of the segment each sample belongs to. Velocity is in pixels per second and
+    acceleration in pixels per second squared.
+    """
+
+    def __init__(self, frames, positions, velocity, acceleration, segment, observed_frames,
+                 hit_frames, bounce_frames, rallies):
+        self.frames = frames
+        self.positions = positions
+        self.velocity = velocity
+        self.acceleration = acceleration
+        self.segment = segment
+        self.observed_frames = observed_frames
+        self.hit_frames = hit_frames
+        self.bounce_frames = bounce_frames
+        self.rallies = rallies
+
+    def __len__(self):
+        """Number of frames the ball was actually seen in"""
+        return len(self.observed_frames)
+
+    @property
+    def rally_count(self):
+        return len(self.rallies)
+
+    def hits_per_rally(self):
+        """Number of hits inside every rally, in rally order"""
+        if not self.rallies:
+            return np.zeros(0, dtype=np.int64)
+        starts = np.array([start for start, _ in self.rallies])
+        ends = np.array([end for _, end in self.rallies])
+        return np.searchsorted(self.hit_frames, ends, side='right') - np.searchsorted(self.hit_frames, starts)
+
+    def summary(self):
+        return {
+            'hits': len(self.hit_frames),
+            'bounces': len(self.bounce_frames),
+            'rallies': self.rally_count,
+            'ball_frames': len(self),
+        }
+
+
+class BallTrajectoryAnalyzer:
+    """Finds hits, bounces and rallies on a whole-video ball track with array operations.
+
+    The most confident ball of every frame is taken, so several ball IDs never get mixed
+    into one track. Detections further than rally_gap_s apart split the track into
+    segments; every segment is resampled to one position per frame and smoothed with a
+    Savitzky-Golay filter that also yields velocity and acceleration.
+
+    - hits: the vertical direction of travel reverses, with the ball averaging more than
+      min_hit_speed over hit_window_s on both sides; placed at the acceleration peak
+    - bounces: local peaks of acceleration above min_bounce_accel away from hits
+    - rallies: segments of at least min_rally_s that contain a hit
+
+    Thresholds are in pixels and seconds, so they follow the source frame rate.
+    """
+
+    def __init__(self, fps=30.0, window=7, polyorder=2, rally_gap_s=1.5, min_rally_s=1.0,
+                 min_hit_speed=50.0, hit_window_s=0.3, min_bounce_accel=4000.0, min_event_gap_s=0.3):
+        if window % 2 == 0 or window <= polyorder:
+            raise ValueError("window must be odd and larger than polyorder")
+        self.fps = fps
+        self.window = window
+        self.polyorder = polyorder
+        self.rally_gap_s = rally_gap_s
+        self.min_rally_s = min_rally_s
+        self.min_hit_speed = min_hit_speed
+        self.hit_window_s = hit_window_s
+        self.min_bounce_accel = min_bounce_accel
+        self.min_event_gap_s = min_event_gap_s
+
+    def analyze(self, ball_detections):
+        """Analyze a TrackStore or list of per-frame ball dicts covering the whole video"""
+        if not isinstance(ball_detections, TrackStore):
+            ball_detections = TrackStore.from_detections(ball_detections)
+        observed, bboxes = best_detection_per_frame(ball_detections)
+        centers = (bboxes[:, :2] + bboxes[:, 2:]) / 2
+
+        frames, positions, velocity, acceleration, segment = self._smooth(observed, centers)
+        hit_frames = self._find_hits(frames, positions, acceleration, segment)
+        bounce_frames = self._find_bounces(frames, acceleration, segment, hit_frames)
+        rallies = self._find_rallies(frames, segment, hit_frames)
+        return BallTrajectory(frames, positions, velocity, acceleration, segment, observed,
+                              hit_frames, bounce_frames, rallies)
+
+    def _smooth(self, observed, centers):
+        half = self.window // 2
+        empty = np.zeros((0, 2))
+        if len(observed) == 0:
+            return np.zeros(0, dtype=np.int64), empty, empty, empty, np.zeros(0, dtype=np.int64)
+
+        max_gap = max(1, int(round(self.rally_gap_s * self.fps)))
+        breaks = np.flatnonzero(np.diff(observed) > max_gap) + 1
+        starts = np.concatenate([[0], breaks])
+        ends = np.concatenate([breaks, [len(observed)]])
+
+        parts = []
+        delta = 1.0 / self.fps
+        for index, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+            seg_frames = np.arange(observed[start], observed[end - 1] + 1)
+            if len(seg_frames) <= half:
+                continue  # too short to smooth, and too short to hold any event
+            seg_centers = np.column_stack([np.interp(seg_frames, observed[start:end], centers[start:end, d])
+                                           for d in range(2)])
+            parts.append((
+                seg_frames,
+                savgol_filter(seg_centers, self.window, self.polyorder),
+                savgol_filter(seg_centers, self.window, self.polyorder, deriv=1, delta=delta),
+                savgol_filter(seg_centers, self.window, self.polyorder, deriv=2, delta=delta),
+                np.full(len(seg_frames), index, dtype=np.int64),
+            ))
+
+        if not parts:
+            return np.zeros(0, dtype=np.int64), empty, empty, empty, np.zeros(0, dtype=np.int64)
+        return tuple(np.concatenate(columns) for columns in zip(*parts))
+
+    def _find_hits(self, frames, positions, acceleration, segment):
+        span = max(1, int(round(self.hit_window_s * self.fps)))
+        if len(frames) <= 2 * span:
+            return np.zeros(0, dtype=np.int64)
+
+        # Net vertical travel over hit_window_s before and after every frame. A hit sends
+        # the ball back the way it came; a bounce reverses vy in the image only briefly,
+        # which averages out over the window.
+        y = positions[:, 1]
+        i = np.arange(span, len(frames) - span)
+        before = y[i] - y[i - span]
+        after = y[i + span] - y[i]
+        min_travel = self.min_hit_speed * span / self.fps
+        reversed_travel = ((np.sign(before) * np.sign(after) < 0)
+                           & (np.abs(before) > min_travel) & (np.abs(after) > min_travel)
+                           & (segment[i - span] == segment[i + span]))
+        candidates = i[reversed_travel]
+        if len(candidates) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        # Every reversal shows up as a run of neighbouring frames; the hit is the frame of
+        # the run with the strongest acceleration (the racket impulse)
+        run_id = np.cumsum(np.diff(candidates, prepend=candidates[0] - 2) > 1)
+        magnitude = np.hypot(acceleration[candidates, 0], acceleration[candidates, 1])
+        order = np.lexsort((-magnitude, run_id))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = run_id[order][1:] != run_id[order][:-1]
+        hits = frames[np.sort(candidates[order[first]])]
+        return _local_suppression(hits, self.min_event_gap_s * self.fps)
+
+    def _find_bounces(self, frames, acceleration, segment, hit_frames):
+        if len(frames) < 3:
+            return np.zeros(0, dtype=np.int64)
+
+        magnitude = np.hypot(acceleration[:, 0], acceleration[:, 1])
+        i = np.arange(1, len(frames) - 1)
+        peak = (magnitude[i] > magnitude[i - 1]) & (magnitude[i] >= magnitude[i + 1])
+        strong = magnitude[i] > self.min_bounce_accel
+        same_segment = (segment[i - 1] == segment[i + 1])
+        candidates = frames[i[peak & strong & same_segment]]
+
+        # A hit also produces an acceleration peak; those are not bounces
+        if len(hit_frames):
+            nearest = np.searchsorted(hit_frames, candidates)
+            before = np.abs(candidates - hit_frames[np.clip(nearest - 1, 0, len(hit_frames) - 1)])
+            after = np.abs(hit_frames[np.clip(nearest, 0, len(hit_frames) - 1)] - candidates)
+            candidates = candidates[np.minimum(before, after) > self.window]
+        return _local_suppression(candidates, self.min_event_gap_s * self.fps)
+
+    def _find_rallies(self, frames, segment, hit_frames):
+        if len(frames) == 0:
+            return []
+
+        boundaries = np.flatnonzero(np.diff(segment)) + 1
+        starts = frames[np.concatenate([[0], boundaries])]
+        ends = frames[np.concatenate([boundaries - 1, [len(frames) - 1]])]
+        hits = np.searchsorted(hit_frames, ends, side='right') - np.searchsorted(hit_frames, starts)
+        long_enough = (ends - starts + 1) >= self.min_rally_s * self.fps
+        keep = long_enough & (hits > 0)
+        return list(zip(starts[keep].tolist(), ends[keep].tolist()))
+
+
+class OnlineHitCounter:
+    """Frame-by-frame version of the hit rule of BallTrajectoryAnalyzer, for live overlays.
+
+    Works on raw detections without smoothing and reports a hit hit_window_s late, once
+    the travel after the reversal has been seen. Final statistics should come from
+    BallTrajectoryAnalyzer on the whole track.
+    """
+
+    def __init__(self, fps=30.0, min_hit_speed=50.0, hit_window_s=0.3, min_event_gap_s=0.3):
+        self.span = max(1, int(round(hit_window_s * fps)))
+        self.min_travel = min_hit_speed * self.span / fps
+        # A reversal stays visible for up to two windows, count it once
+        self.min_gap = max(min_event_gap_s * fps, 2 * self.span)
+        self.hits = 0
+        self._frames = deque(maxlen=2 * self.span + 1)
+        self._ys = deque(maxlen=2 * self.span + 1)
+        self._last_hit = None
+
+    def push(self, frame_idx, ball):
+        """Add one frame's ball dict; returns True when a hit was confirmed"""
+        if not ball:
+            return False
+        best = max(ball.values(), key=lambda data: data['confidence'])
+        if self._frames and frame_idx - self._frames[-1] > 2 * self.span:
+            # Too long without the ball, start over
+            self._frames.clear()
+            self._ys.clear()
+        self._frames.append(frame_idx)
+        self._ys.append((best['bbox'][1] + best['bbox'][3]) / 2)
+        if len(self._ys) < self._ys.maxlen:
+            return False
+
+        middle = self.span
+        before = self._ys[middle] - self._ys[0]
+        after = self._ys[-1] - self._ys[middle]
+        hit_frame = self._frames[middle]
+        if (before * after < 0 and abs(before) > self.min_travel and abs(after) > self.min_travel
+                and (self._last_hit is None or hit_frame - self._last_hit >= self.min_gap)):
+            self._last_hit = hit_frame
+            self.hits += 1
+            return True
+        return False
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+from .detection_cache import file_hash
+
+
+class RunCheckpoint:
+    """On-disk progress of one analysis run, so an interrupted run can pick up where it stopped.
+
+    Steps save their state under a name and read it back when the run is resumed. Files
+    are replaced atomically, so a crash while saving leaves the previous checkpoint in
+    place. interval is the number of frames between saves. scope() gives a view whose
+    names get a prefix, e.g. one per in-play segment.
+    """
+
+    def __init__(self, directory, interval=900, prefix=''):
+        self.directory = directory
+        self.interval = interval
+        self.prefix = prefix
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def for_run(cls, root, video_path, params, interval=900):
+        """Checkpoint under root for analyzing video_path with params (any JSON-serializable settings).
+
+        The directory is keyed by the video's content and params, so only an identical
+        run resumes from it.
+        """
+        payload = json.dumps({'video': file_hash(video_path), 'params': params}, sort_keys=True)
+        return cls(os.path.join(root, hashlib.sha256(payload.encode()).hexdigest()[:16]), interval)
+
+    def scope(self, name):
+        return RunCheckpoint(self.directory, self.interval, f"{self.prefix}{name}-")
+
+    def path(self, name):
+        return os.path.join(self.directory, self.prefix + name)
+
+    def exists(self):
+        return any(entry.endswith('.pkl') for entry in os.listdir(self.directory))
+
+    def load(self, name):
+        """State saved under name, or None"""
+        try:
+            with open(self.path(name) + '.pkl', 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def save(self, name, state):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.path(name) + '.pkl')
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def remove(self):
+        """Delete the whole checkpoint, e.g. once the run has finished"""
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def clear(self):
+        self.remove()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def detect(self, tracker, frames, name, builder, batch_size=None):
+        """TrackStore of tracker's detections over frames (a VideoReader), saved as they go.
+
+        Every interval frames, rounded up to whole batches so batches match an uninterrupted
+        run, the new frames' detections are saved as a chunk together with the tracker
+        state (tracks, ROI and keyframe history). A later call continues after the last
+        chunk with that state restored; for a finished pass it restores the final state and
+        returns the saved detections.
+        """
+        saved = self.load(name) or {'chunks': 0, 'frames': 0, 'tracker': None}
+        if 'store' in saved:
+            # The tracker ends up as after an uninterrupted pass, track ID counter included
+            tracker.set_state(saved['tracker'])
+            return saved['store']
+        for k in range(saved['chunks']):
+            for detection in self.load(f"{name}-{k:05d}"):
+                builder.append(detection)
+        if saved['tracker'] is not None:
+            tracker.set_state(saved['tracker'])
+            frames = frames.subrange(frames.start_frame + saved['frames'], frames.end_frame)
+
+        batch_size = batch_size or tracker.batch_size
+        interval = -(-self.interval // batch_size) * batch_size
+        chunks = saved['chunks']
+        chunk = []
+        for detection in tracker.iter_detections(frames, batch_size):
+            builder.append(detection)
+            chunk.append(detection)
+            if len(chunk) >= interval:
+                # The chunk goes first, so the state never points past saved detections
+                self.save(f"{name}-{chunks:05d}", chunk)
+                chunks += 1
+                self.save(name, {'chunks': chunks, 'frames': builder.n_frames, 'tracker': tracker.get_state()})
+                chunk = []
+
+        store = builder.build()
+        self.save(name, {'store': store, 'tracker': tracker.get_state()})
+        for k in range(chunks):
+            os.remove(self.path(f"{name}-{k:05d}") + '.pkl')
+        return store
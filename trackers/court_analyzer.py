@@ -1,11 +1,90 @@
 import cv2
+from collections import namedtuple
 import numpy as np
+from .ball_trajectory import BallTrajectoryAnalyzer
+from .player_analytics import PlayerAnalytics
+
+# Court analysis of one camera shot, reused for every frame until the shot changes
+CourtGeometry = namedtuple('CourtGeometry', ['lines', 'area', 'zones', 'shot_index', 'start_frame'])
+
+
+class ShotChangeDetector:
+    """Cheap camera-cut detector working on small grayscale thumbnails.
+
+    A cut is reported when the gray-level histogram of a frame stops correlating with
+    the previous frame's, or when the frame has drifted too far (mean absolute
+    difference) from the first frame of the current shot, e.g. after a slow pan.
+    """
+
+    def __init__(self, thumbnail_size=(64, 36), hist_threshold=0.7, diff_threshold=30.0):
+        self.thumbnail_size = thumbnail_size
+        self.hist_threshold = hist_threshold
+        self.diff_threshold = diff_threshold
+        self.reset()
+
+    def reset(self):
+        self._previous_hist = None
+        self._shot_thumbnail = None
+
+    def _thumbnail(self, frame):
+        # Subsample with a stride first; area-averaging the full frame costs more than the rest
+        step = max(1, frame.shape[1] // (4 * self.thumbnail_size[0]))
+        small = cv2.resize(frame[::step, ::step], self.thumbnail_size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    def is_shot_change(self, frame):
+        """True for the first frame and for every frame that starts a new shot"""
+        thumbnail = self._thumbnail(frame)
+        hist = cv2.calcHist([thumbnail], [0], None, [32], [0, 256])
+        cv2.normalize(hist, hist)
+
+        changed = self._previous_hist is None
+        if not changed:
+            correlation = cv2.compareHist(self._previous_hist, hist, cv2.HISTCMP_CORREL)
+            drift = float(np.mean(cv2.absdiff(thumbnail, self._shot_thumbnail)))
+            changed = correlation < self.hist_threshold or drift > self.diff_threshold
+
+        self._previous_hist = hist
+        if changed:
+            self._shot_thumbnail = thumbnail
+        return changed
+
 
 class CourtDetector:
-    def __init__(self):
+    def __init__(self, shot_detector=None):
         self.court_lines = []
         self.court_corners = []
         self.court_template = None
+        self.shot_detector = shot_detector or ShotChangeDetector()
+        self.reset()
+    
+    def reset(self):
+        """Drop the cached court geometry, e.g. when switching to a new video"""
+        self.geometry = None
+        self._geometry_shape = None
+        self.geometry_stats = {'frames': 0, 'recomputed': 0}
+        self._frame_counter = 0
+        self.shot_detector.reset()
+    
+    def analyze_frame(self, frame):
+        """Court lines, area and zones for frame, recomputed only when the camera shot changes.
+
+        Returns a CourtGeometry; every frame of the same shot gets the same cached object.
+        """
+        frame_idx = self._frame_counter
+        self._frame_counter += 1
+        self.geometry_stats['frames'] += 1
+        
+        shot_changed = self.shot_detector.is_shot_change(frame)
+        if shot_changed or self.geometry is None or frame.shape != self._geometry_shape:
+            shot_index = 0 if self.geometry is None else self.geometry.shot_index + 1
+            self.court_lines = self.detect_court_lines(frame)
+            self.geometry = CourtGeometry(self.court_lines, self.detect_court_area(frame),
+                                          self.get_court_zones(frame.shape), shot_index, frame_idx)
+            self._geometry_shape = frame.shape
+            self.geometry_stats['recomputed'] += 1
+        
+        return self.geometry
     
     def detect_court_lines(self, frame):
         """Detect tennis court lines using edge detection and line detection"""
@@ -23,8 +102,8 @@ class CourtDetector:
         
         court_lines = []
         if lines is not None:
-            for line in lines:
-                x1, y1, x2, y2 = line[0]
+            # (N, 1, 4) in OpenCV 4, (N, 4) in newer releases
+            for x1, y1, x2, y2 in lines.reshape(-1, 4).tolist():
                 
                 length = np.sqrt((x2-x1)**2 + (y2-y1)**2)
                 if length > 50:  # Minimum line length
@@ -109,54 +188,57 @@ class MatchAnalyzer:
     def __init__(self):
         self.court_detector = CourtDetector()
         self.rally_count = 0
-        self.player_zones = {'Player 1': [], 'Player 2': []}
-        self.ball_trajectory = []
+        self.tracked_players = ('Player 1', 'Player 2')
+        # Created on the first analyze_player_positions call, once the frame size is known
+        self.player_analytics = None
+        self.ball_trajectory = None
+    
+    @property
+    def court_geometry(self):
+        """Cached CourtGeometry of the current camera shot, None before any frame was analyzed"""
+        return self.court_detector.geometry
+    
+    def update_court(self, frame):
+        """Feed one video frame to the court cache; cheap unless the camera shot changed"""
+        return self.court_detector.analyze_frame(frame)
     
     def analyze_player_positions(self, player_detections, frame_shape):
-        """Analyze player positions relative to court zones"""
-        zones = self.court_detector.get_court_zones(frame_shape)
-        
-        for detection in player_detections:
-            for track_id, player_data in detection.items():
-                player_label = player_data.get('player_label', f'Person {track_id}')
-                bbox = player_data['bbox']
-                center_x = (bbox[0] + bbox[2]) / 2
-                center_y = (bbox[1] + bbox[3]) / 2
-                
-                # Determine which zone the player is in
-                current_zone = None
-                for zone_name, (x1, y1, x2, y2) in zones.items():
-                    if x1 <= center_x <= x2 and y1 <= center_y <= y2:
-                        current_zone = zone_name
-                        break
-                
-                if current_zone and player_label in self.player_zones:
-                    self.player_zones[player_label].append(current_zone)
+        """Analyze player positions relative to court zones.
+
+        Repeated calls continue where the previous batch of frames ended.
+        """
+        if self.player_analytics is None:
+            if self.court_geometry is not None:
+                zones = self.court_geometry.zones
+            else:
+                zones = self.court_detector.get_court_zones(frame_shape)
+            self.player_analytics = PlayerAnalytics(zones=zones, frame_shape=frame_shape)
+        
+        self.player_analytics.analyze(player_detections)
     
-    def analyze_ball_trajectory(self, ball_detections):
-        """Analyze ball movement patterns"""
-        for detection in ball_detections:
-            if detection:
-                for ball_id, ball_data in detection.items():
-                    bbox = ball_data['bbox']
-                    center_x = (bbox[0] + bbox[2]) / 2
-                    center_y = (bbox[1] + bbox[3]) / 2
-                    self.ball_trajectory.append((center_x, center_y))
+    def analyze_ball_trajectory(self, ball_detections, fps=30.0):
+        """Analyze ball movement patterns over the ball detections of the whole video"""
+        self.ball_trajectory = BallTrajectoryAnalyzer(fps=fps).analyze(ball_detections)
+        self.rally_count = self.ball_trajectory.rally_count
     
     def get_advanced_stats(self):
         """Get advanced match statistics"""
         stats = {
             'rally_count': self.rally_count,
-            'ball_trajectory_length': len(self.ball_trajectory),
+            'ball_trajectory_length': len(self.ball_trajectory) if self.ball_trajectory is not None else 0,
+            'ball_hits': len(self.ball_trajectory.hit_frames) if self.ball_trajectory is not None else 0,
+            'ball_bounces': len(self.ball_trajectory.bounce_frames) if self.ball_trajectory is not None else 0,
+            'camera_shots': self.court_geometry.shot_index + 1 if self.court_geometry is not None else 0,
             'player_zone_distribution': {}
         }
         
-        # Calculate player zone distribution
-        for player, zones in self.player_zones.items():
-            if zones:
-                zone_counts = {}
-                for zone in zones:
-                    zone_counts[zone] = zone_counts.get(zone, 0) + 1
-                stats['player_zone_distribution'][player] = zone_counts
+        # Player zone distribution and position heatmaps
+        if self.player_analytics is not None:
+            stats['player_heatmaps'] = {}
+            for player in self.tracked_players:
+                zone_counts = self.player_analytics.zone_histogram(player)
+                if zone_counts:
+                    stats['player_zone_distribution'][player] = zone_counts
+                    stats['player_heatmaps'][player] = self.player_analytics.heatmap(player)
         
         return stats
\ No newline at end of file
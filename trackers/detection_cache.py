@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+# Content hashes are memoized per process, keyed by (path, size, mtime)
+_file_hashes = {}
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """SHA-256 of a file's content"""
+    stat = os.stat(path)
+    memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _file_hashes:
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                sha.update(chunk)
+        _file_hashes[memo_key] = sha.hexdigest()
+    return _file_hashes[memo_key]
+
+
+class DetectionCache:
+    """On-disk cache of per-frame detections with a size cap and LRU eviction.
+
+    Entries are keyed by a content hash of the video, a hash of the model weights and
+    the detection parameters, so any change to one of them is a cache miss.
+    """
+
+    def __init__(self, cache_dir='.detection_cache', max_size_mb=2048):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, video_path, model_path, params):
+        """Cache key for running model_path with params over video_path"""
+        # Weights that ultralytics downloads on demand may not exist locally yet
+        model_id = file_hash(model_path) if os.path.isfile(model_path) else str(model_path)
+        payload = json.dumps({
+            'video': file_hash(video_path),
+            'model': model_id,
+            'params': params,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, key):
+        """Return the cached detections for key, or None on a miss"""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                detections = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+
+        # Touch the entry so eviction sees it as recently used
+        os.utime(path)
+        self.hits += 1
+        return detections
+
+    def put(self, key, detections):
+        """Store detections under key, then evict old entries over the size cap"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(detections, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._entry_path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_size_mb"""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.pkl'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+
+    def clear(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.pkl'):
+                os.remove(os.path.join(self.cache_dir, name))
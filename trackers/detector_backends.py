@@ -0,0 +1,309 @@
+import ast
+import importlib.util
+import os
+import shutil
+import threading
+import cv2
+import numpy as np
+from .detection_cache import file_hash
+from .model_registry import LazyModel, load_model
+from .tracking import box_iou, result_to_arrays
+
+# Backends in the order 'auto' tries them; 'pytorch' always works
+BACKENDS = ('openvino', 'onnx', 'pytorch')
+EXPORT_DIR = '.model_exports'
+# ultralytics' predict() defaults, so every backend post-processes the same way
+DEFAULT_IMGSZ = 640
+NMS_IOU = 0.7
+MAX_DET = 300
+# Per-class box offset that keeps classes apart in a single NMS pass
+_CLASS_OFFSET = 7680
+
+
+class BackendBoxes:
+    """xyxy, conf and cls arrays of one image, the parts of ultralytics' Boxes the trackers read"""
+
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = xyxy
+        self.conf = conf
+        self.cls = cls
+
+    def __len__(self):
+        return len(self.conf)
+
+
+class BackendResult:
+    def __init__(self, boxes, names):
+        self.boxes = boxes
+        self.names = names
+
+
+def letterbox(image, imgsz, stride=32):
+    """Resize keeping the aspect ratio and pad to a multiple of stride, like ultralytics' LetterBox.
+
+    Returns the padded image and the (gain_x, gain_y, pad_x, pad_y) needed to map boxes back.
+    """
+    h, w = image.shape[:2]
+    gain = min(imgsz / h, imgsz / w)
+    new_w, new_h = round(w * gain), round(h * gain)
+    pad_w = ((imgsz - new_w) % stride) / 2
+    pad_h = ((imgsz - new_h) % stride) / 2
+    if (new_w, new_h) != (w, h):
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+    top, bottom = round(pad_h - 0.1), round(pad_h + 0.1)
+    left, right = round(pad_w - 0.1), round(pad_w + 0.1)
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    return image, (new_w / w, new_h / h, left, top)
+
+
+def non_max_suppression(xyxy, scores, iou_threshold=NMS_IOU, class_ids=None, max_det=MAX_DET):
+    """Greedy NMS; returns indices of the kept boxes, highest score first.
+
+    With class_ids, boxes only suppress boxes of their own class.
+    """
+    if len(scores) == 0:
+        return np.zeros(0, dtype=np.int64)
+    boxes = xyxy
+    if class_ids is not None:
+        boxes = xyxy + (class_ids * _CLASS_OFFSET)[:, None].astype(xyxy.dtype)
+
+    order = np.argsort(-scores, kind='stable')
+    keep = []
+    while len(order) and len(keep) < max_det:
+        best = order[0]
+        keep.append(best)
+        if len(order) == 1:
+            break
+        overlap = box_iou(boxes[best], boxes[order[1:]])[0]
+        order = order[1:][overlap <= iou_threshold]
+    return np.asarray(keep, dtype=np.int64)
+
+
+def decode_predictions(output, conf, transforms, shapes, iou_threshold=NMS_IOU, max_det=MAX_DET):
+    """Boxes of every image from raw YOLOv8 output (batch, 4 + classes, anchors).
+
+    Boxes come as center/size in letterboxed pixels and are mapped back onto the
+    original image of each shape with its letterbox transform.
+    """
+    results = []
+    for prediction, (gain_x, gain_y, pad_x, pad_y), (h, w) in zip(output, transforms, shapes):
+        prediction = prediction.T
+        class_scores = prediction[:, 4:]
+        cls = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(cls)), cls]
+        candidates = scores > conf
+        centers, sizes = prediction[candidates, :2], prediction[candidates, 2:4]
+        xyxy = np.concatenate([centers - sizes / 2, centers + sizes / 2], axis=1)
+        scores, cls = scores[candidates], cls[candidates]
+
+        keep = non_max_suppression(xyxy, scores, iou_threshold, cls, max_det)
+        xyxy = xyxy[keep]
+        xyxy[:, [0, 2]] = ((xyxy[:, [0, 2]] - pad_x) / gain_x).clip(0, w)
+        xyxy[:, [1, 3]] = ((xyxy[:, [1, 3]] - pad_y) / gain_y).clip(0, h)
+        results.append((xyxy.astype(np.float32), scores[keep].astype(np.float32), cls[keep].astype(np.float32)))
+    return results
+
+
+class ExportedBackend:
+    """Shared pre/post-processing for networks exported from YOLO weights.
+
+    Subclasses only run the network (_infer) on a preprocessed NCHW float batch.
+    predict() follows YOLO.predict(): one image or a list of BGR images in, one result
+    with boxes and names per image out.
+    """
+
+    backend = None
+
+    def __init__(self, names, imgsz=DEFAULT_IMGSZ, stride=32, iou_threshold=NMS_IOU, max_det=MAX_DET):
+        self.names = names
+        self.imgsz = imgsz
+        self.stride = stride
+        self.iou_threshold = iou_threshold
+        self.max_det = max_det
+
+    def _infer(self, batch):
+        raise NotImplementedError
+
+    def predict(self, source, conf=0.25, imgsz=None, **kwargs):
+        images = source if isinstance(source, (list, tuple)) else [source]
+        letterboxed = [letterbox(image, imgsz or self.imgsz, self.stride) for image in images]
+        # Images of a batch share one input shape; frames of a video always do
+        batch = np.stack([padded for padded, _ in letterboxed])
+        batch = np.ascontiguousarray(batch[..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+        output = self._infer(batch)
+        decoded = decode_predictions(output, conf, [transform for _, transform in letterboxed],
+                                     [image.shape[:2] for image in images], self.iou_threshold, self.max_det)
+        return [BackendResult(BackendBoxes(xyxy, scores, cls), self.names) for xyxy, scores, cls in decoded]
+
+
+def _onnx_metadata(session):
+    metadata = session.get_modelmeta().custom_metadata_map
+    names = ast.literal_eval(metadata['names']) if 'names' in metadata else {}
+    stride = int(ast.literal_eval(metadata['stride'])) if 'stride' in metadata else 32
+    return names, stride
+
+
+class OnnxBackend(ExportedBackend):
+    """YOLO network exported to ONNX, run by ONNX Runtime on the CPU"""
+
+    backend = 'onnx'
+
+    def __init__(self, onnx_path, imgsz=DEFAULT_IMGSZ, threads=None, **kwargs):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.path = onnx_path
+        names, stride = _onnx_metadata(self.session)
+        super().__init__(names, imgsz, stride, **kwargs)
+
+    def _infer(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+
+class OpenVINOBackend(ExportedBackend):
+    """YOLO network exported to OpenVINO IR, compiled for the CPU"""
+
+    backend = 'openvino'
+
+    def __init__(self, model_dir, imgsz=DEFAULT_IMGSZ, threads=None, **kwargs):
+        import openvino as ov
+        import yaml
+
+        xml_path = next(os.path.join(model_dir, name) for name in os.listdir(model_dir) if name.endswith('.xml'))
+        core = ov.Core()
+        config = {'PERFORMANCE_HINT': 'LATENCY'}
+        if threads:
+            config['INFERENCE_NUM_THREADS'] = threads
+        self.model = core.compile_model(core.read_model(xml_path), 'CPU', config)
+        self.path = model_dir
+        with open(os.path.join(model_dir, 'metadata.yaml')) as f:
+            metadata = yaml.safe_load(f)
+        super().__init__(metadata.get('names', {}), imgsz, int(metadata.get('stride', 32)), **kwargs)
+
+    def _infer(self, batch):
+        return self.model(batch)[0]
+
+
+def backend_available(backend):
+    """Whether the runtime of a backend is installed"""
+    module = {'onnx': 'onnxruntime', 'openvino': 'openvino'}.get(backend)
+    return module is None or importlib.util.find_spec(module) is not None
+
+
+def export_path(weights, backend, imgsz=DEFAULT_IMGSZ, export_dir=EXPORT_DIR):
+    """Where the export of weights for a backend is cached, keyed by the weights' content hash"""
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    name = f"{stem}-{file_hash(weights)[:16]}-{imgsz}"
+    return os.path.join(export_dir, name + ('.onnx' if backend == 'onnx' else '_openvino_model'))
+
+
+_export_lock = threading.Lock()
+
+
+def export_model(weights, backend='onnx', imgsz=DEFAULT_IMGSZ, export_dir=EXPORT_DIR):
+    """Export weights for an ONNX Runtime or OpenVINO backend, reusing a cached export.
+
+    Exports use dynamic input shapes, so batches and ROI crops of any size run on the
+    same file. Returns the path of the exported model.
+    """
+    if backend not in ('onnx', 'openvino'):
+        raise ValueError(f"Cannot export for backend {backend!r}")
+    target = export_path(weights, backend, imgsz, export_dir)
+    with _export_lock:
+        if os.path.exists(target):
+            return target
+        os.makedirs(export_dir, exist_ok=True)
+        exported = load_model(weights).export(format=backend, imgsz=imgsz, dynamic=True, simplify=False,
+                                              half=False, verbose=False)
+        shutil.move(str(exported), target)
+    return target
+
+
+def create_detector(weights, backend='pytorch', imgsz=DEFAULT_IMGSZ, export=False, export_dir=EXPORT_DIR,
+                    quantization=None, threads=None):
+    """A detector with YOLO's predict() interface for weights, on the requested backend.
+
+    backend is 'pytorch', 'onnx', 'openvino', 'auto' (the fastest one available) or
+    'int8' (quantized ONNX, only used if it passes its recall gate; quantization holds
+    the gate's settings, see quantization.quantized_detector).
+    Exported models are taken from export_dir; with export=True missing exports are
+    created first. Whenever a backend's runtime or export is missing, the PyTorch model
+    is used instead, so a detector is always returned; its .backend says which one.
+    threads caps the inference threads of the exported backends (PyTorch's are set
+    process-wide with torch.set_num_threads).
+    """
+    if backend not in BACKENDS + ('auto', 'int8'):
+        raise ValueError(f"Unknown detector backend {backend!r}, expected one of {BACKENDS + ('auto', 'int8')}")
+    if backend == 'int8':
+        from .quantization import quantized_detector
+
+        detector = quantized_detector(weights, imgsz, export, export_dir, threads=threads, **(quantization or {}))
+        if detector is not None:
+            return detector
+        # Not quantized or refused by the gate: float ONNX is the next cheapest
+        backend = 'onnx'
+    candidates = BACKENDS if backend == 'auto' else (backend,)
+    for candidate in candidates:
+        if candidate == 'pytorch':
+            break
+        if not backend_available(candidate) or not os.path.isfile(weights):
+            continue
+        path = export_path(weights, candidate, imgsz, export_dir)
+        if not os.path.exists(path):
+            if not export:
+                continue
+            try:
+                path = export_model(weights, candidate, imgsz, export_dir)
+            except Exception as e:
+                print(f"⚠️ Could not export {weights} for {candidate}: {e}")
+                continue
+        if candidate == 'onnx':
+            return OnnxBackend(path, imgsz, threads=threads)
+        return OpenVINOBackend(path, imgsz, threads=threads)
+
+    if backend not in ('pytorch', 'auto'):
+        print(f"⚠️ No {backend} export of {weights} available, using PyTorch")
+    return LazyModel(weights)
+
+
+def compare_detections(reference, candidate, min_iou=0.9, max_conf_diff=0.05, conf_threshold=0.0):
+    """Match one image's detections from two backends and measure how far they differ.
+
+    Both arguments are results with boxes (as from predict() with conf_threshold).
+    Detections are matched greedily by IoU within the same class. A box without a match
+    only fails the check if it is clearly above the threshold, since a small confidence
+    difference can move a box across it. Returns a dict with the number of matched and
+    unmatched boxes, the worst IoU and confidence difference among matches, and whether
+    the image passes the given tolerances.
+    """
+    ref_xyxy, ref_conf, ref_cls = result_to_arrays(reference)
+    cand_xyxy, cand_conf, cand_cls = result_to_arrays(candidate)
+    iou = box_iou(ref_xyxy, cand_xyxy)
+    iou[ref_cls[:, None] != cand_cls[None, :]] = 0
+
+    matched_iou, conf_diff = [], []
+    ref_matched = np.zeros(len(ref_conf), dtype=bool)
+    cand_matched = np.zeros(len(cand_conf), dtype=bool)
+    while iou.size and iou.max() >= min_iou:
+        i, j = np.unravel_index(iou.argmax(), iou.shape)
+        matched_iou.append(float(iou[i, j]))
+        conf_diff.append(abs(float(ref_conf[i]) - float(cand_conf[j])))
+        ref_matched[i] = cand_matched[j] = True
+        iou[i, :] = 0
+        iou[:, j] = 0
+
+    borderline = conf_threshold + max_conf_diff
+    missing = int((ref_conf[~ref_matched] > borderline).sum() + (cand_conf[~cand_matched] > borderline).sum())
+    worst_conf_diff = max(conf_diff, default=0.0)
+    return {
+        'matched': len(matched_iou),
+        'unmatched_reference': int((~ref_matched).sum()),
+        'unmatched_candidate': int((~cand_matched).sum()),
+        'min_iou': min(matched_iou, default=1.0),
+        'max_conf_diff': worst_conf_diff,
+        'passed': missing == 0 and worst_conf_diff <= max_conf_diff,
+    }
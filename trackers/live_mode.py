@@ -0,0 +1,77 @@
+import numpy as np
+
+# Ways to shed work when live processing falls behind, cheapest loss of information first
+SKIP_BALL = 'skip_ball'
+REDUCE_PLAYER_RATE = 'reduce_player_rate'
+DROP_OVERLAY = 'drop_overlay'
+DEGRADE_STEPS = (SKIP_BALL, REDUCE_PLAYER_RATE, DROP_OVERLAY)
+
+
+class DegradeController:
+    """Picks how much work to shed per frame so live latency stays within a budget.
+
+    Latency (frame arrival to output) is smoothed with an exponential moving average.
+    When it exceeds latency_budget_s the next step of steps is switched on; once it has
+    stayed below recover_ratio * latency_budget_s for recover_frames frames, the last
+    step is switched off again. escalate_frames frames must pass after every change
+    before escalating further, so a step gets time to take effect.
+    """
+
+    def __init__(self, latency_budget_s, steps=DEGRADE_STEPS, smoothing=0.2, recover_ratio=0.7,
+                 escalate_frames=5, recover_frames=30):
+        unknown = set(steps) - set(DEGRADE_STEPS)
+        if unknown:
+            raise ValueError(f"Unknown degrade steps: {sorted(unknown)}")
+        self.latency_budget_s = latency_budget_s
+        self.steps = tuple(steps)
+        self.smoothing = smoothing
+        self.recover_ratio = recover_ratio
+        self.escalate_frames = escalate_frames
+        self.recover_frames = recover_frames
+        self.level = 0
+        self.average_latency = None
+        self._frames_since_change = 0
+        self._frames_under = 0
+
+    @property
+    def active(self):
+        """Degrade steps currently switched on"""
+        return frozenset(self.steps[:self.level])
+
+    def update(self, latency_s):
+        """Record the latency of one frame; returns the (possibly new) level"""
+        if self.average_latency is None:
+            self.average_latency = latency_s
+        else:
+            self.average_latency += self.smoothing * (latency_s - self.average_latency)
+        self._frames_since_change += 1
+
+        if self.average_latency > self.latency_budget_s:
+            self._frames_under = 0
+            if self.level < len(self.steps) and self._frames_since_change >= self.escalate_frames:
+                self._change_level(1)
+        elif self.average_latency < self.recover_ratio * self.latency_budget_s:
+            self._frames_under += 1
+            if self.level > 0 and self._frames_under >= self.recover_frames:
+                self._change_level(-1)
+        else:
+            self._frames_under = 0
+        return self.level
+
+    def _change_level(self, step):
+        self.level += step
+        self._frames_since_change = 0
+        self._frames_under = 0
+
+
+def latency_summary(latencies):
+    """Mean, p50, p95 and max of per-frame latencies, in milliseconds"""
+    if not latencies:
+        return {'mean_ms': None, 'p50_ms': None, 'p95_ms': None, 'max_ms': None}
+    latencies = 1000 * np.asarray(latencies)
+    return {
+        'mean_ms': float(latencies.mean()),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'max_ms': float(latencies.max()),
+    }
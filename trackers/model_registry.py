@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+from .detection_cache import file_hash
+
+# Loaded models per weights file; each file is deserialized at most once per process
+_models = {}
+_models_lock = threading.Lock()
+
+METADATA_SUFFIX = '.meta.json'
+
+
+def _model_key(path):
+    # Names like 'yolov8n.pt' may not exist yet; ultralytics downloads them on load
+    return os.path.abspath(path) if os.path.exists(path) else path
+
+
+def load_model(path):
+    """The YOLO model for a weights file, shared by everything in this process.
+
+    ultralytics (and torch) are only imported here, the first time a model is needed.
+    """
+    key = _model_key(path)
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            from ultralytics import YOLO
+            model = YOLO(path)
+            _models[key] = model
+            _write_metadata(path, model)
+    return model
+
+
+def loaded_models():
+    """Weights files loaded in this process so far"""
+    with _models_lock:
+        return list(_models)
+
+
+def _metadata_path(path):
+    return path + METADATA_SUFFIX
+
+
+def _read_metadata(path):
+    try:
+        with open(_metadata_path(path)) as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        return None
+    metadata['names'] = {int(cls_id): name for cls_id, name in metadata['names'].items()}
+    return metadata
+
+
+def _save_metadata(path, metadata):
+    stored = dict(metadata, names={str(cls_id): name for cls_id, name in metadata['names'].items()})
+    try:
+        with open(_metadata_path(path), 'w') as f:
+            json.dump(stored, f, indent=2)
+    except OSError:
+        pass  # read-only model directory: metadata just isn't cached
+
+
+def _write_metadata(path, model):
+    """Store class names and task next to the weights, keyed by their content hash"""
+    if not os.path.isfile(path):
+        return None
+    stat = os.stat(path)
+    metadata = {
+        'sha256': file_hash(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'task': getattr(model, 'task', None),
+        'names': dict(model.names),
+    }
+    _save_metadata(path, metadata)
+    return metadata
+
+
+def model_metadata(path):
+    """Class names and task of a weights file, without loading the network if possible.
+
+    Metadata comes from the sidecar file <weights>.meta.json. It is trusted when the
+    weights' size and mtime are unchanged, or else when their SHA-256 still matches;
+    otherwise the model is loaded once and the sidecar rewritten.
+    """
+    metadata = _read_metadata(path) if os.path.isfile(path) else None
+    if metadata is not None:
+        stat = os.stat(path)
+        if (metadata.get('size'), metadata.get('mtime_ns')) == (stat.st_size, stat.st_mtime_ns):
+            return metadata
+        if metadata.get('sha256') == file_hash(path):
+            # Same weights with a new mtime (e.g. copied): refresh, so the next check is a stat
+            metadata.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            _save_metadata(path, metadata)
+            return metadata
+    model = load_model(path)
+    return _write_metadata(path, model) or {'task': getattr(model, 'task', None), 'names': dict(model.names)}
+
+
+class LazyModel:
+    """Stand-in for a YOLO model that loads the weights on the first predict().
+
+    names is answered from the cached metadata, so trackers can be built, and cached
+    detections replayed, without ever deserializing the network.
+    """
+
+    backend = 'pytorch'
+
+    def __init__(self, path):
+        self.path = path
+        self._model = None
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    @property
+    def model(self):
+        return self.load()
+
+    def load(self):
+        """Load the weights now (a no-op once loaded)"""
+        if self._model is None:
+            self._model = load_model(self.path)
+        return self._model
+
+    @property
+    def names(self):
+        if self._model is not None:
+            return self._model.names
+        return model_metadata(self.path)['names']
+
+    def predict(self, *args, **kwargs):
+        return self.model.predict(*args, **kwargs)
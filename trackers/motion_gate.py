@@ -0,0 +1,78 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Ball candidates from motion against a running background of downscaled frames.
+
+    propose() returns the centers (in frame pixels) of small moving blobs, or [] when
+    nothing small moves and the detector can skip the frame. It returns None when the
+    frame needs a full search instead: while the background is still being learned,
+    when the camera moves (the whole image shifts, or a large share of it changes at
+    once) and when there are too many candidates for crops to pay off. Players are
+    moving blobs too large to be the ball; a ball at rest blends into the background
+    and is left to interpolation.
+    """
+
+    def __init__(self, width=480, learning_rate=0.05, threshold=20, min_area=1, max_area=80,
+                 max_candidates=8, camera_motion=0.2, max_camera_shift=1.0, warmup_frames=5):
+        self.width = width
+        self.learning_rate = learning_rate
+        self.threshold = threshold  # gray-level difference from the background that counts as motion
+        self.min_area = min_area  # blob area bounds, in downscaled pixels
+        self.max_area = max_area
+        self.max_candidates = max_candidates
+        self.camera_motion = camera_motion  # share of changed pixels that means the camera moved
+        self.max_camera_shift = max_camera_shift  # global shift (downscaled pixels) that means a pan
+        self.warmup_frames = warmup_frames
+        self.reset()
+
+    def settings(self):
+        """Everything that changes the proposals, e.g. for detection cache keys"""
+        return [self.width, self.learning_rate, self.threshold, self.min_area, self.max_area,
+                self.max_candidates, self.camera_motion, self.max_camera_shift, self.warmup_frames]
+
+    def reset(self):
+        self._background = None
+        self._previous = None
+        self._learned_frames = 0
+
+    def _downscale(self, frame):
+        scale = min(1.0, self.width / frame.shape[1])
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        if scale < 1.0:
+            gray = cv2.resize(gray, (round(frame.shape[1] * scale), round(frame.shape[0] * scale)),
+                              interpolation=cv2.INTER_AREA)
+        return gray.astype(np.float32), scale
+
+    def _relearn(self, small):
+        self._background = small.copy()
+        self._learned_frames = 0
+
+    def propose(self, frame):
+        small, scale = self._downscale(frame)
+        previous, self._previous = self._previous, small
+        if self._background is None or self._background.shape != small.shape:
+            self._relearn(small)
+            return None
+
+        # A pan or zoom shifts every pixel; relearn the background from the new view
+        (shift_x, shift_y), _ = cv2.phaseCorrelate(previous, small)
+        mask = cv2.absdiff(small, self._background) > self.threshold
+        if np.hypot(shift_x, shift_y) > self.max_camera_shift or mask.mean() > self.camera_motion:
+            self._relearn(small)
+            return None
+
+        cv2.accumulateWeighted(small, self._background, self.learning_rate)
+        self._learned_frames += 1
+        if self._learned_frames < self.warmup_frames:
+            return None
+
+        # Join the fragments along a moving player's edges into one blob too large to be the ball
+        mask = cv2.dilate(mask.astype(np.uint8), np.ones((3, 3), np.uint8))
+        count, _, stats, centroids = cv2.connectedComponentsWithStats(mask, connectivity=8)
+        areas = stats[1:count, cv2.CC_STAT_AREA]
+        centers = centroids[1:count][(areas >= self.min_area) & (areas <= self.max_area)]
+        if len(centers) > self.max_candidates:
+            return None
+        return [(x / scale, y / scale) for x, y in centers.tolist()]
@@ -0,0 +1,133 @@
+import cv2
+import numpy as np
+
+# Stats panel and legend geometry, in frame pixels
+PANEL_RECT = (10, 10, 500, 200)
+LEGEND_WIDTH = 300
+LEGEND_HEIGHT = 80
+# Pixels inside the panel keep this share of the video underneath
+PANEL_VIDEO_WEIGHT = 0.2
+
+
+class TrailBuffer:
+    """Fixed-size ring buffer of trail points, oldest first"""
+
+    def __init__(self, maxlen):
+        self.maxlen = maxlen
+        self._points = np.zeros((maxlen, 2), dtype=np.int32)
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, point):
+        self._points[self._next] = point
+        self._next = (self._next + 1) % self.maxlen
+        self._count = min(self._count + 1, self.maxlen)
+
+    def points(self):
+        """(N, 2) int32 array of the stored points, oldest first"""
+        if self._count < self.maxlen:
+            return self._points[:self._count]
+        return np.concatenate([self._points[self._next:], self._points[:self._next]])
+
+
+def draw_trail(frame, points, color, max_thickness, gradient=None):
+    """Draw a trail that thickens towards its newest point.
+
+    Segment i of n gets thickness max(1, int(max_thickness * i / n)), like drawing every
+    segment with its own cv2.line, but consecutive segments of the same thickness are
+    drawn as one polyline. gradient, if given, maps alpha (0..1, newest = 1) to a color;
+    each thickness band is drawn in the color of its middle segment.
+    """
+    points = np.asarray(points, dtype=np.int32).reshape(-1, 2)
+    n = len(points)
+    if n < 2:
+        return frame
+
+    segments = np.arange(1, n)
+    thickness = np.maximum(1, (max_thickness * segments / n).astype(int))
+    # Thickness never decreases along the trail, so every band is one contiguous run
+    band_starts = np.flatnonzero(np.diff(thickness, prepend=-1))
+    band_ends = np.append(band_starts[1:], len(segments))
+    for start, end in zip(band_starts.tolist(), band_ends.tolist()):
+        band_color = color
+        if gradient is not None:
+            band_color = gradient(segments[(start + end - 1) // 2] / n)
+        cv2.polylines(frame, [points[start:end + 1]], False, band_color, int(thickness[start]))
+    return frame
+
+
+class OverlayRenderer:
+    """Draws the match stats panel and color legend onto frames in place.
+
+    The panel title, the fixed icons and the whole legend never change between frames,
+    so they are rendered once per frame size and pasted in. Only the panel area is
+    darkened, instead of blending a full copy of every frame.
+    """
+
+    def __init__(self):
+        self._frame_shape = None
+
+    def _build_static_layers(self, frame_shape):
+        height, width = frame_shape[:2]
+        layer = np.zeros((height, width, 3), dtype=np.uint8)
+        mask = np.zeros((height, width), dtype=np.uint8)
+
+        def draw(func, *args):
+            func(layer, *args)
+            func(mask, *args[:-2], 255, *args[-1:])
+
+        # Panel title with decorative border
+        draw(cv2.rectangle, (10, 10), (500, 45), (0, 255, 255), 2)
+        draw(cv2.putText, "🎾 TENNIS MATCH ANALYSIS", (20, 35), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+        # Icons of the rows whose color never changes
+        for row, icon in ((0, "⏱️"), (3, "📊"), (4, "📊"), (5, "📊"), (6, "📊")):
+            draw(cv2.putText, icon, (15, 65 + row * 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+        # Sparse pixel lists: touching a few thousand pixels beats a masked copy of the panel.
+        # Fully covered pixels are copied; anti-aliased edge pixels were drawn on black, so
+        # the layer holds their color premultiplied by the coverage kept in the mask.
+        self._opaque_index = np.nonzero(mask == 255)
+        self._opaque_pixels = layer[self._opaque_index]
+        self._edge_index = np.nonzero((mask > 0) & (mask < 255))
+        self._edge_pixels = layer[self._edge_index].astype(np.float32)
+        self._edge_keep = 1.0 - mask[self._edge_index].astype(np.float32)[:, None] / 255.0
+
+        x1, y1, x2, y2 = PANEL_RECT
+        self._panel_slice = (slice(y1, y2 + 1), slice(x1, x2 + 1))
+
+        # The legend box is opaque, so the whole box is pasted as is
+        legend_y = height - LEGEND_HEIGHT
+        cv2.rectangle(layer, (10, legend_y - 10), (LEGEND_WIDTH, height - 10), (0, 0, 0), -1)
+        cv2.rectangle(layer, (10, legend_y - 10), (LEGEND_WIDTH, height - 10), (255, 255, 255), 1)
+        cv2.putText(layer, "LEGEND:", (15, legend_y + 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+        cv2.putText(layer, "🔵 Player 1", (15, legend_y + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 100, 0), 1)
+        cv2.putText(layer, "🟢 Player 2", (100, legend_y + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 100), 1)
+        cv2.putText(layer, "🔴 Ball", (185, legend_y + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 255), 1)
+        cv2.putText(layer, "🟡 Ball (Est)", (15, legend_y + 45), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 255), 1)
+        cv2.putText(layer, "--- Trails", (130, legend_y + 45), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+        self._legend_slice = (slice(max(0, legend_y - 10), height - 9), slice(10, LEGEND_WIDTH + 1))
+        self._legend_pixels = layer[self._legend_slice].copy()
+
+        self._frame_shape = frame_shape
+
+    def _ensure_layers(self, frame):
+        if frame.shape != self._frame_shape:
+            self._build_static_layers(frame.shape)
+
+    def draw_panel(self, frame):
+        """Darken the stats panel area and paste the static title and icons"""
+        self._ensure_layers(frame)
+        frame[self._panel_slice] = cv2.convertScaleAbs(frame[self._panel_slice], alpha=PANEL_VIDEO_WEIGHT)
+        frame[self._opaque_index] = self._opaque_pixels
+        background = frame[self._edge_index].astype(np.float32)
+        frame[self._edge_index] = np.rint(background * self._edge_keep + self._edge_pixels).astype(np.uint8)
+        return frame
+
+    def draw_legend(self, frame):
+        """Paste the pre-rendered color legend into the bottom-left corner"""
+        self._ensure_layers(frame)
+        frame[self._legend_slice] = self._legend_pixels
+        return frame
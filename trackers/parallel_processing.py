@@ -0,0 +1,178 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from utils import VideoReader
+from .track_store import TrackStore
+from .tracking import box_iou
+
+# Trackers owned by each worker process, created once by _init_worker
+_worker_trackers = None
+
+
+def plan_chunks(frame_count, chunk_frames, overlap_frames):
+    """Split [0, frame_count) into (start, end) chunks that overlap by overlap_frames.
+
+    The last chunk is open-ended (end=None) so frames beyond a wrong container frame
+    count are still processed.
+    """
+    if overlap_frames >= chunk_frames:
+        raise ValueError("overlap_frames must be smaller than chunk_frames")
+    chunks = []
+    start = 0
+    while True:
+        end = start + chunk_frames
+        if end >= frame_count:
+            chunks.append((start, None))
+            return chunks
+        chunks.append((start, end))
+        start = end - overlap_frames
+
+
+def _init_worker(player_model_path, ball_model_path, tracker_kwargs, player_options, ball_options, threads):
+    global _worker_trackers
+    import cv2
+    import torch
+    from .player_tracker import PlayerTracker
+    from .ball_tracker import BallTracker
+
+    # Each worker gets its share of the cores; all-core thread pools in every worker
+    # would oversubscribe the CPU
+    torch.set_num_threads(threads)
+    cv2.setNumThreads(threads)
+    _worker_trackers = (
+        PlayerTracker(player_model_path, **tracker_kwargs, **dict(player_options or {}, threads=threads)),
+        BallTracker(ball_model_path, **tracker_kwargs, **dict(ball_options or {}, threads=threads)),
+    )
+
+
+def _process_chunk(task):
+    """Detect players and ball in one chunk; frame indices in the stores are chunk-local"""
+    video_path, start, end = task
+    player_tracker, ball_tracker = _worker_trackers
+    player_tracker.reset()
+    ball_tracker.reset()
+
+    chunk = VideoReader(video_path, start_frame=start, end_frame=end)
+    player_store = player_tracker.detect_frames(chunk, as_store=True)
+    ball_store = ball_tracker.detect_frames(chunk, as_store=True)
+    return player_store, ball_store
+
+
+def _match_track_ids(prev_store, next_store, frames, min_iou=0.3):
+    """Map next_store track IDs to prev_store IDs using box overlap on shared frames.
+
+    Both stores must use the same (global) frame numbering for frames.
+    """
+    scores = {}
+    for frame_idx in frames:
+        prev_rows = prev_store.frame_slice(frame_idx)
+        next_rows = next_store.frame_slice(frame_idx)
+        prev_ids = prev_store.track_id[prev_rows]
+        next_ids = next_store.track_id[next_rows]
+        if len(prev_ids) == 0 or len(next_ids) == 0:
+            continue
+        ious = box_iou(prev_store.bbox[prev_rows], next_store.bbox[next_rows])
+        for i, j in zip(*np.nonzero(ious >= min_iou)):
+            key = (int(next_ids[j]), int(prev_ids[i]))
+            scores[key] = scores.get(key, 0.0) + float(ious[i, j])
+
+    # Greedy one-to-one assignment, strongest overlap first
+    mapping = {}
+    used_prev = set()
+    for (next_id, prev_id), _ in sorted(scores.items(), key=lambda kv: -kv[1]):
+        if next_id not in mapping and prev_id not in used_prev:
+            mapping[next_id] = prev_id
+            used_prev.add(prev_id)
+    return mapping
+
+
+def _to_global(store, start, n_frames):
+    """Copy of a chunk store with frame indices shifted to whole-video numbering"""
+    return TrackStore(store.frame + start, store.track_id, store.bbox, store.confidence,
+                      store.label, store.interpolated, n_frames, store.class_name)
+
+
+def stitch_chunks(chunk_stores, chunk_starts, keep_ids=(0,)):
+    """Join per-chunk stores into one whole-video store.
+
+    Track IDs of each chunk are matched to the previous chunk on the overlapping frames,
+    so a player keeps one ID across chunk boundaries; unmatched tracks get fresh IDs.
+    Overlapping frames are taken from the earlier chunk up to the middle of the overlap
+    and from the later chunk after it. IDs in keep_ids (untracked balls use 0) are
+    never remapped.
+    """
+    n_frames = max(start + len(store) for store, start in zip(chunk_stores, chunk_starts))
+    class_name = chunk_stores[0].class_name
+    parts = []
+    prev_global = None
+    next_free_id = 1
+    keep_from = 0
+
+    for k, (store, start) in enumerate(zip(chunk_stores, chunk_starts)):
+        global_store = _to_global(store, start, n_frames)
+        if prev_global is None:
+            mapping = {}
+        else:
+            overlap = range(start, min(start + len(store), prev_start + len(prev_global_chunk)))
+            mapping = _match_track_ids(prev_global, global_store, overlap)
+
+        # Apply the mapping, handing out fresh IDs to tracks that started in this chunk
+        new_ids = global_store.track_id.copy()
+        for local_id in np.unique(global_store.track_id).tolist():
+            if local_id in keep_ids:
+                continue
+            if local_id not in mapping:
+                mapping[local_id] = next_free_id
+                next_free_id += 1
+            new_ids[global_store.track_id == local_id] = mapping[local_id]
+        global_store.track_id = new_ids
+
+        if k + 1 < len(chunk_stores):
+            next_start = chunk_starts[k + 1]
+            keep_to = next_start + (start + len(store) - next_start) // 2
+        else:
+            keep_to = n_frames
+        rows = (global_store.frame >= keep_from) & (global_store.frame < keep_to)
+        parts.append((global_store, rows))
+
+        prev_global, prev_global_chunk, prev_start = global_store, store, start
+        keep_from = keep_to
+
+    return TrackStore(
+        np.concatenate([s.frame[r] for s, r in parts]),
+        np.concatenate([s.track_id[r] for s, r in parts]),
+        np.concatenate([s.bbox[r] for s, r in parts]),
+        np.concatenate([s.confidence[r] for s, r in parts]),
+        np.concatenate([s.label[r] for s, r in parts]),
+        np.concatenate([s.interpolated[r] for s, r in parts]),
+        n_frames, class_name)
+
+
+def process_video_parallel(video_path, player_model_path, ball_model_path, workers=None,
+                           chunk_frames=1800, overlap_frames=30, tracker_kwargs=None,
+                           player_options=None, ball_options=None):
+    """Detect players and ball in time chunks of the video on a process pool.
+
+    Every worker loads its own models. Chunks overlap by overlap_frames so tracks can be
+    stitched across chunk boundaries. Returns whole-video (player_store, ball_store);
+    labels and interpolation are left to the caller, which sees the stitched tracks.
+    """
+    workers = workers or os.cpu_count() or 1
+    frame_count = VideoReader(video_path).frame_count
+    chunks = plan_chunks(frame_count, chunk_frames, overlap_frames)
+
+    # 'spawn' keeps torch/OpenCV thread pools from being forked into a broken state
+    context = multiprocessing.get_context('spawn')
+    workers = min(workers, len(chunks))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker,
+                             initargs=(player_model_path, ball_model_path, tracker_kwargs or {},
+                                       player_options, ball_options, threads)) as pool:
+        results = list(pool.map(_process_chunk, [(video_path, start, end) for start, end in chunks]))
+
+    starts = [start for start, _ in chunks]
+    player_store = stitch_chunks([players for players, _ in results], starts, keep_ids=())
+    ball_store = stitch_chunks([ball for _, ball in results], starts)
+    return player_store, ball_store
@@ -0,0 +1,128 @@
+import queue
+import threading
+import time
+from utils.instrumentation import get_metrics
+
+# Marker that travels down the queues once a stage has no more items
+_END = object()
+
+
+class PipelineStage(threading.Thread):
+    """One pipeline stage running in its own thread.
+
+    A stage reads items from its input queue (or from a plain iterable for the first
+    stage), passes them through func, which takes an iterator and yields output items,
+    and puts the outputs on its output queue. Time spent waiting on either queue is
+    recorded so the slowest stage can be spotted.
+    """
+
+    def __init__(self, name, func=None, in_queue=None, out_queue=None, source=None, stop_event=None):
+        super().__init__(name=f"pipeline-{name}", daemon=True)
+        self.stage_name = name
+        self.func = func
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.source = source
+        self.stop_event = stop_event or threading.Event()
+        self.error = None
+        self.frames = 0
+        self.blocked_input = 0.0
+        self.blocked_output = 0.0
+        self.total_time = 0.0
+
+    def _iter_input(self):
+        while not self.stop_event.is_set():
+            start = time.perf_counter()
+            try:
+                item = self.in_queue.get(timeout=0.1)
+            except queue.Empty:
+                self.blocked_input += time.perf_counter() - start
+                continue
+            self.blocked_input += time.perf_counter() - start
+            if item is _END:
+                return
+            yield item
+
+    def _put(self, item):
+        start = time.perf_counter()
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    self.out_queue.put(item, timeout=0.1)
+                    # Depth of the queue this stage feeds; a full one means the next stage lags
+                    get_metrics().gauge('queue_depth', self.out_queue.qsize(), queue=self.stage_name)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        finally:
+            self.blocked_output += time.perf_counter() - start
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            items = self.source if self.in_queue is None else self._iter_input()
+            outputs = self.func(items) if self.func is not None else items
+            for item in outputs:
+                self.frames += 1
+                if self.out_queue is not None and not self._put(item):
+                    break
+                if self.stop_event.is_set():
+                    break
+        except BaseException as e:
+            self.error = e
+            self.stop_event.set()
+        finally:
+            if self.out_queue is not None:
+                self._put(_END)
+            self.total_time = time.perf_counter() - start
+
+    def get_stats(self):
+        """Busy vs. blocked time for this stage, in seconds"""
+        blocked = self.blocked_input + self.blocked_output
+        return {
+            'frames': self.frames,
+            'total_s': self.total_time,
+            'busy_s': max(0.0, self.total_time - blocked),
+            'blocked_input_s': self.blocked_input,
+            'blocked_output_s': self.blocked_output,
+        }
+
+
+def run_pipeline(source, stages, queue_size=8):
+    """Run (name, func) stages concurrently, joined by bounded queues.
+
+    The first stage iterates source. Items flow through the stages in order.
+    Returns the per-stage timing stats; the first stage error is re-raised.
+    """
+    stop_event = threading.Event()
+    threads = []
+    in_queue = None
+    for i, (name, func) in enumerate(stages):
+        out_queue = queue.Queue(maxsize=queue_size) if i < len(stages) - 1 else None
+        stage = PipelineStage(name, func, in_queue=in_queue, out_queue=out_queue,
+                              source=source if i == 0 else None, stop_event=stop_event)
+        threads.append(stage)
+        in_queue = out_queue
+
+    for stage in threads:
+        stage.start()
+    for stage in threads:
+        stage.join()
+
+    for stage in threads:
+        if stage.error is not None:
+            raise stage.error
+
+    return {stage.stage_name: stage.get_stats() for stage in threads}
+
+
+def format_pipeline_stats(stats):
+    """Human readable per-stage report, slowest (busiest) stage first"""
+    lines = []
+    for name, s in sorted(stats.items(), key=lambda kv: -kv[1]['busy_s']):
+        lines.append(f"{name:>8}: busy {s['busy_s']:7.2f}s | "
+                     f"waiting for input {s['blocked_input_s']:7.2f}s | "
+                     f"waiting on output {s['blocked_output_s']:7.2f}s | "
+                     f"{s['frames']} items")
+    return "\n".join(lines)
@@ -0,0 +1,145 @@
+from collections import namedtuple
+import cv2
+import numpy as np
+from .court_analyzer import CourtDetector, ShotChangeDetector
+from .track_store import TrackStore
+
+# In-play interval of a video, end_frame exclusive
+PlaySegment = namedtuple('PlaySegment', ['start_frame', 'end_frame'])
+
+
+class PlaySegmenter:
+    """Splits a video into in-play segments with one cheap pass over its frames.
+
+    A frame counts as in play when the main camera shows the court: a large court-colored
+    area (CourtDetector.detect_court_area) crossed by straight court lines, both measured
+    on a frame downscaled to width pixels. The check runs on the first frame of every
+    camera shot and every recheck_frames frames within a shot (zooms), so changeovers,
+    replays, crowd shots and close-ups drop out. Runs shorter than min_play_s are dropped,
+    breaks shorter than min_break_s are bridged and every segment is padded by pad_s.
+    """
+
+    def __init__(self, width=640, min_court_fraction=0.1, min_court_lines=2, recheck_frames=15,
+                 min_play_s=2.0, min_break_s=1.0, pad_s=0.5):
+        self.width = width
+        self.min_court_fraction = min_court_fraction  # share of the frame covered by the court area
+        self.min_court_lines = min_court_lines
+        self.recheck_frames = recheck_frames
+        self.min_play_s = min_play_s
+        self.min_break_s = min_break_s
+        self.pad_s = pad_s
+        self.court_detector = CourtDetector()
+        self.shot_detector = ShotChangeDetector()
+        self.frame_count = 0
+        self.court_found = False
+        self.segment_stats = {'court_checks': 0, 'shots': 0}
+
+    def settings(self):
+        """Everything that changes the segments"""
+        return [self.width, self.min_court_fraction, self.min_court_lines, self.recheck_frames,
+                self.min_play_s, self.min_break_s, self.pad_s]
+
+    def court_visible(self, frame):
+        """True when frame shows the court the way the main broadcast camera does"""
+        scale = min(1.0, self.width / frame.shape[1])
+        if scale < 1.0:
+            frame = cv2.resize(frame, (round(frame.shape[1] * scale), round(frame.shape[0] * scale)),
+                               interpolation=cv2.INTER_AREA)
+        area = self.court_detector.detect_court_area(frame)
+        if area is None or cv2.contourArea(area) < self.min_court_fraction * frame.shape[0] * frame.shape[1]:
+            return False
+        return len(self.court_detector.detect_court_lines(frame)) >= self.min_court_lines
+
+    def segment(self, frames, fps=30.0):
+        """List of PlaySegments for frames (any iterable of frames, e.g. a VideoReader).
+
+        When the court is never found (e.g. a clay court, whose color detect_court_area
+        doesn't know), the whole video is returned as one segment rather than none.
+        """
+        fps = getattr(frames, 'fps', fps)
+        self.shot_detector.reset()
+        self.segment_stats = {'court_checks': 0, 'shots': 0}
+        in_play = []
+        visible = False
+        frames_since_check = 0
+        for frame in frames:
+            if self.shot_detector.is_shot_change(frame):
+                self.segment_stats['shots'] += 1
+                frames_since_check = self.recheck_frames
+            if frames_since_check >= self.recheck_frames:
+                visible = self.court_visible(frame)
+                self.segment_stats['court_checks'] += 1
+                frames_since_check = 0
+            frames_since_check += 1
+            in_play.append(visible)
+
+        self.frame_count = len(in_play)
+        self.court_found = any(in_play)
+        if not self.court_found:
+            return [PlaySegment(0, self.frame_count)] if self.frame_count else []
+        return smooth_segments(np.array(in_play), round(self.min_play_s * fps), round(self.min_break_s * fps),
+                               round(self.pad_s * fps))
+
+
+def _runs(mask):
+    """(start, end) of every run of True in a boolean array"""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return list(zip(np.flatnonzero(edges == 1).tolist(), np.flatnonzero(edges == -1).tolist()))
+
+
+def smooth_segments(in_play, min_play_frames, min_break_frames, pad_frames):
+    """PlaySegments from a per-frame in-play mask.
+
+    Breaks shorter than min_break_frames are bridged first, then runs shorter than
+    min_play_frames are dropped and the rest padded by pad_frames (merging overlaps).
+    """
+    mask = in_play.copy()
+    for start, end in _runs(~mask):
+        if 0 < start and end < len(mask) and end - start < min_break_frames:
+            mask[start:end] = True
+
+    segments = []
+    for start, end in _runs(mask):
+        if end - start < min_play_frames:
+            continue
+        start, end = max(0, start - pad_frames), min(len(mask), end + pad_frames)
+        if segments and start <= segments[-1].end_frame:
+            segments[-1] = PlaySegment(segments[-1].start_frame, end)
+        else:
+            segments.append(PlaySegment(start, end))
+    return segments
+
+
+def describe_segments(segments, fps):
+    """JSON-friendly list of {start_frame, end_frame, start_s, end_s} dicts"""
+    return [{'start_frame': start, 'end_frame': end, 'start_s': round(start / fps, 2), 'end_s': round(end / fps, 2)}
+            for start, end in segments]
+
+
+def join_segments(segment_stores, segments, n_frames, class_name=None, keep_ids=(0,)):
+    """One whole-video store from per-segment stores, with frames outside segments left empty.
+
+    Every segment is tracked from scratch, so its track IDs are offset to stay unique;
+    IDs in keep_ids (untracked balls use 0) are kept as they are.
+    """
+    if not segment_stores:
+        return TrackStore.empty(n_frames, class_name)
+    track_ids = []
+    next_free_id = 1
+    for store in segment_stores:
+        ids = store.track_id.copy()
+        moved = ~np.isin(ids, keep_ids)
+        if moved.any():
+            local_ids, inverse = np.unique(ids[moved], return_inverse=True)
+            ids[moved] = next_free_id + inverse
+            next_free_id += len(local_ids)
+        track_ids.append(ids)
+
+    return TrackStore(
+        np.concatenate([store.frame + segment.start_frame for store, segment in zip(segment_stores, segments)]),
+        np.concatenate(track_ids),
+        np.concatenate([store.bbox for store in segment_stores]),
+        np.concatenate([store.confidence for store in segment_stores]),
+        np.concatenate([store.label for store in segment_stores]),
+        np.concatenate([store.interpolated for store in segment_stores]),
+        n_frames, class_name)
@@ -0,0 +1,196 @@
+import numpy as np
+from .track_store import TrackStore
+
+
+def _detection_arrays(players, frame_idx):
+    """frame, track_id, label and center arrays for one frame's detection dict"""
+    track_ids = list(players.keys())
+    bboxes = np.array([players[t]['bbox'] for t in track_ids], dtype=np.float64).reshape(-1, 4)
+    labels = np.array([players[t].get('player_label', f'Person {t}') for t in track_ids], dtype=object)
+    frames = np.full(len(track_ids), frame_idx, dtype=np.int64)
+    centers = (bboxes[:, :2] + bboxes[:, 2:]) / 2
+    return frames, np.array(track_ids, dtype=np.int64), labels, centers
+
+
+class _SpeedSamples:
+    """Growing (frame, speed) arrays of one label, doubled in place as samples come in"""
+
+    def __init__(self, capacity=256):
+        self.frames = np.zeros(capacity, dtype=np.int64)
+        self.speeds = np.zeros(capacity)
+        self.size = 0
+        self.total = 0.0
+
+    def append(self, frames, speeds):
+        needed = self.size + len(frames)
+        if needed > len(self.frames):
+            capacity = max(needed, 2 * len(self.frames))
+            self.frames = np.resize(self.frames, capacity)
+            self.speeds = np.resize(self.speeds, capacity)
+        self.frames[self.size:needed] = frames
+        self.speeds[self.size:needed] = speeds
+        self.size = needed
+        self.total += float(speeds.sum())
+
+
+class PlayerAnalytics:
+    """Movement and court-position statistics for tracked players.
+
+    Works on whole arrays of detections: per-label distance covered, speed profiles,
+    zone occupancy histograms and position heatmaps. analyze() takes a batch of frames
+    (a TrackStore or a list of per-frame dicts) and update() a single frame; both add to
+    the same running totals, so live stats never rescan history.
+
+    Distance is measured between consecutive sightings of the same track and credited
+    to the label the detection has at that frame. Zones are (x1, y1, x2, y2) boxes with
+    inclusive bounds; a position counts for the first zone that contains it.
+    """
+
+    def __init__(self, zones=None, frame_shape=None, fps=30.0, heatmap_bins=(16, 9)):
+        self.zones = dict(zones or {})
+        self.zone_names = list(self.zones)
+        self._zone_boxes = np.array(list(self.zones.values()), dtype=np.float64).reshape(-1, 4)
+        self.frame_shape = frame_shape
+        self.fps = fps
+        self.heatmap_bins = heatmap_bins  # (columns, rows)
+        self.reset()
+
+    def reset(self):
+        self.distances = {}
+        self._zone_counts = {}
+        self._heatmaps = {}
+        self._speeds = {}
+        # track_id -> (frame, x, y) of the last sighting
+        self._last_positions = {}
+        self._next_frame = 0
+
+    def analyze(self, player_detections, start_frame=None):
+        """Add a batch of frames; start_frame is the index of its first frame"""
+        if not isinstance(player_detections, TrackStore):
+            player_detections = TrackStore.from_detections(player_detections, class_name='person')
+        start_frame = self._next_frame if start_frame is None else start_frame
+
+        store = player_detections
+        self._accumulate(store.frame + start_frame, store.track_id,
+                         np.array(store.label_names(), dtype=object), store.centers().astype(np.float64))
+        self._next_frame = start_frame + len(store)
+        return self
+
+    def update(self, players, frame_idx=None):
+        """Add one frame of detections ({track_id: {'bbox': ..., ...}})"""
+        frame_idx = self._next_frame if frame_idx is None else frame_idx
+        if players:
+            self._accumulate(*_detection_arrays(players, frame_idx))
+        self._next_frame = frame_idx + 1
+        return self
+
+    def _accumulate(self, frames, track_ids, labels, centers):
+        if len(frames) == 0:
+            return
+
+        # Group rows by track, in frame order within each track
+        order = np.lexsort((frames, track_ids))
+        frames, track_ids, labels, centers = frames[order], track_ids[order], labels[order], centers[order]
+
+        previous_frames = np.empty(len(frames), dtype=np.float64)
+        previous_centers = np.empty_like(centers)
+        previous_frames[1:] = frames[:-1]
+        previous_centers[1:] = centers[:-1]
+
+        # First row of every track continues from where the previous batch left off
+        group_starts = np.flatnonzero(np.diff(track_ids, prepend=track_ids[0] - 1))
+        group_ends = np.append(group_starts[1:], len(frames)) - 1
+        for start, end in zip(group_starts.tolist(), group_ends.tolist()):
+            track_id = int(track_ids[start])
+            last = self._last_positions.get(track_id)
+            if last is None:
+                previous_frames[start] = np.nan
+                previous_centers[start] = np.nan
+            else:
+                previous_frames[start] = last[0]
+                previous_centers[start] = last[1:]
+            self._last_positions[track_id] = (int(frames[end]), float(centers[end, 0]), float(centers[end, 1]))
+
+        steps = np.hypot(*(centers - previous_centers).T)
+        moved = ~np.isnan(steps)
+
+        label_names, label_index = np.unique(labels, return_inverse=True)
+        distances = np.bincount(label_index[moved], weights=steps[moved], minlength=len(label_names))
+
+        elapsed = (frames - previous_frames) / self.fps
+        timed = moved & (elapsed > 0)
+        speeds = np.zeros(len(frames))
+        speeds[timed] = steps[timed] / elapsed[timed]
+
+        zone_index = self._zone_index(centers)
+        heatmap_cells = self._heatmap_cells(centers)
+
+        for i, label in enumerate(label_names.tolist()):
+            rows = label_index == i
+            self.distances[label] = self.distances.get(label, 0.0) + float(distances[i])
+
+            label_timed = rows & timed
+            if label not in self._speeds:
+                self._speeds[label] = _SpeedSamples()
+            self._speeds[label].append(frames[label_timed], speeds[label_timed])
+
+            if zone_index is not None:
+                counts = np.bincount(zone_index[rows & (zone_index >= 0)], minlength=len(self.zone_names))
+                self._zone_counts[label] = self._zone_counts.get(label, 0) + counts
+
+            if heatmap_cells is not None:
+                columns, rows_count = self.heatmap_bins
+                cells = np.bincount(heatmap_cells[rows], minlength=columns * rows_count)
+                self._heatmaps[label] = self._heatmaps.get(label, 0) + cells.reshape(rows_count, columns)
+
+    def _zone_index(self, centers):
+        """Index of the first zone containing each center, -1 when none does"""
+        if not self.zone_names:
+            return None
+        x = centers[:, 0:1]
+        y = centers[:, 1:2]
+        boxes = self._zone_boxes
+        inside = (x >= boxes[:, 0]) & (x <= boxes[:, 2]) & (y >= boxes[:, 1]) & (y <= boxes[:, 3])
+        return np.where(inside.any(axis=1), inside.argmax(axis=1), -1)
+
+    def _heatmap_cells(self, centers):
+        """Flat heatmap cell of each center, positions outside the frame go to the edge cells"""
+        if self.frame_shape is None:
+            return None
+        height, width = self.frame_shape[:2]
+        columns, rows = self.heatmap_bins
+        column = np.clip((centers[:, 0] * columns / width).astype(np.int64), 0, columns - 1)
+        row = np.clip((centers[:, 1] * rows / height).astype(np.int64), 0, rows - 1)
+        return row * columns + column
+
+    @property
+    def labels(self):
+        return sorted(self.distances)
+
+    def speed_profile(self, label):
+        """(frames, speeds) arrays for label, speeds in pixels per second"""
+        samples = self._speeds.get(label)
+        if samples is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        frames = samples.frames[:samples.size]
+        speeds = samples.speeds[:samples.size]
+        order = np.argsort(frames, kind='stable')
+        return frames[order], speeds[order]
+
+    def average_speed(self, label):
+        """Mean speed of label in pixels per second"""
+        samples = self._speeds.get(label)
+        return samples.total / samples.size if samples is not None and samples.size else 0.0
+
+    def zone_histogram(self, label):
+        """{zone_name: frames spent there} for zones label was seen in"""
+        counts = self._zone_counts.get(label)
+        if counts is None:
+            return {}
+        return {name: int(count) for name, count in zip(self.zone_names, counts.tolist()) if count}
+
+    def heatmap(self, label):
+        """(rows, columns) grid of position counts for label"""
+        columns, rows = self.heatmap_bins
+        heatmap = self._heatmaps.get(label)
+        return heatmap if heatmap is not None else np.zeros((rows, columns), dtype=np.int64)
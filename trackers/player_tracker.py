@@ -1,111 +1,380 @@
-from ultralytics import YOLO
 import cv2
 import numpy as np
+from utils.instrumentation import get_metrics
+from .detector_backends import create_detector
+from .overlay_renderer import draw_trail
+from .track_store import TrackStore, TrackStoreBuilder
+from .tracking import ByteTrackStep, TRACKER_CONF, box_iou, iter_batches, result_to_arrays
 
 class PlayerTracker:
-    def __init__(self, model_path):
-        self.model = YOLO(model_path)
+    # Per-video state set up by reset(), saved in checkpoints along with the tracks
+    STATE_ATTRS = ('player_positions', 'online_label_stats', 'online_labels', 'current_keyframe_interval',
+                   'keyframe_stats', '_person_cls', '_prev_gray', '_last_players', '_last_keyframe',
+                   '_frames_since_keyframe', '_frame_counter')
+    
+    def __init__(self, model_path, batch_size=1, conf_threshold=0.5, cache=None,
+                 keyframe_interval=None, max_keyframe_motion=0.15, imgsz=None, model=None,
+                 backend='pytorch', export_model=True, quantization=None, threads=None):
+        self.model_path = model_path
+        self.cache = cache
+        # Any already loaded detector with YOLO's predict() interface can be passed as model;
+        # otherwise one is built for backend ('pytorch', 'onnx', 'openvino', 'auto' or 'int8'),
+        # exporting the weights first if needed and falling back to PyTorch
+        self.model = model if model is not None else create_detector(model_path, backend, export=export_model,
+                                                                     quantization=quantization, threads=threads)
+        self.batch_size = batch_size
+        self.conf_threshold = conf_threshold
+        self.tracker = ByteTrackStep()
+        
+        # Keyframe mode: run the detector at most every keyframe_interval frames and
+        # propagate boxes with optical flow in between
+        self.keyframe_interval = keyframe_interval
+        self.max_keyframe_motion = max_keyframe_motion  # fraction of player height between keyframes
+        # Detector input size; players stay detectable well below the model's default 640,
+        # so e.g. 416 or 320 cuts person-model cost on high-resolution footage
+        self.imgsz = imgsz
+        self.reset()
+    
+    def reset(self):
+        """Forget all per-video state (tracks, history, labels) before another video"""
+        self.tracker.reset()
         self.player_positions = {}
+        self.online_label_stats = {}  # track_id -> [sum of center y, frame count]
+        self.online_labels = None
+        self.current_keyframe_interval = self.keyframe_interval or 1
+        self.keyframe_stats = {'keyframes': 0, 'propagated': 0, 'drift_failures': 0}
+        self._person_cls = 0
+        self._prev_gray = None
+        self._last_players = {}
+        self._last_keyframe = None  # (frame_idx, player_dict) of the last detector run
+        self._frames_since_keyframe = 0
+        self._frame_counter = 0
     
-    def detect_frames(self, frames):
-        """Detect players in all frames"""
-        player_detections = []
-        for frame in frames:
-            player_dict = self.detect_frame(frame)
-            player_detections.append(player_dict)
-        return player_detections
+    def get_state(self):
+        """Everything reset() clears, e.g. for a checkpoint (see set_state)"""
+        state = {name: getattr(self, name) for name in self.STATE_ATTRS}
+        state['tracker'] = self.tracker.get_state()
+        return state
+    
+    def set_state(self, state):
+        state = dict(state)
+        self.tracker.set_state(state.pop('tracker'))
+        for name, value in state.items():
+            setattr(self, name, value)
+    
+    def detect_frames(self, frames, batch_size=None, as_store=False, checkpoint=None):
+        """Detect players in all frames (any iterable of frames, e.g. a VideoReader).
+
+        Returns a list of per-frame dicts, or a columnar TrackStore when as_store is set.
+        When a DetectionCache is set and frames come from a file (e.g. a VideoReader),
+        detections are loaded from / saved to the cache instead of re-running inference.
+        With a RunCheckpoint (and a VideoReader), progress is saved as detection goes and
+        an interrupted call continues where it stopped.
+        """
+        cache_key = self._cache_key(frames)
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                for player_dict in cached:
+                    for track_id, player_data in player_dict.items():
+                        self._update_position_history(track_id, player_data['bbox'])
+                return cached if as_store else cached.to_detections()
+
+        if checkpoint is not None:
+            store = checkpoint.detect(self, frames, 'players', TrackStoreBuilder(class_name='person'), batch_size)
+            if cache_key is not None:
+                self.cache.put(cache_key, store)
+            return store if as_store else store.to_detections()
+
+        builder = TrackStoreBuilder(class_name='person')
+        detections = []
+        for detection in self.iter_detections(frames, batch_size):
+            builder.append(detection)
+            if not as_store:
+                detections.append(detection)
+        
+        if cache_key is None and not as_store:
+            return detections
+        store = builder.build()
+        if cache_key is not None:
+            self.cache.put(cache_key, store)
+        return store if as_store else detections
+
+    def _cache_key(self, frames):
+        video_path = getattr(frames, 'path', None)
+        if self.cache is None or video_path is None:
+            return None
+        params = dict(self._cache_params(), frame_range=getattr(frames, 'frame_range', None))
+        return self.cache.make_key(video_path, self.model_path, params)
+
+    def _cache_params(self):
+        """Everything besides video and weights that changes the detections"""
+        return {
+            'tracker': 'player',
+            'conf_threshold': self.conf_threshold,
+            'detector_conf': TRACKER_CONF,
+            'tracker_cfg': self.tracker.tracker_cfg,
+            'format': 'track_store',
+            'keyframes': [self.keyframe_interval, self.max_keyframe_motion] if self.keyframe_interval else None,
+            # Exported backends round slightly differently; PyTorch keeps the existing cache keys
+            **({'backend': self.model.backend} if getattr(self.model, 'backend', 'pytorch') != 'pytorch' else {}),
+            **({'imgsz': self.imgsz} if self.imgsz else {}),
+        }
+
+    def iter_detections(self, frames, batch_size=None):
+        """Yield one player dict per frame, running the detector on batches of frames"""
+        if self.keyframe_interval:
+            # Whether a frame is a keyframe depends on the previous one, so go frame by frame
+            for frame in frames:
+                yield self.detect_frame(frame)
+            return
+        
+        batch_size = batch_size or self.batch_size
+        for batch in iter_batches(frames, batch_size):
+            results = self._predict(batch)
+            # Tracking still runs frame by frame, in order, so IDs match the per-frame path
+            for frame, result in zip(batch, results):
+                yield self._record_frame(self._track_result(frame, result))
 
     def detect_frame(self, frame):
         """Detect players in a single frame"""
-        results = self.model.track(frame, persist=True)
+        if self.keyframe_interval:
+            return self._record_frame(self._detect_frame_keyframe(frame))
+        results = self._predict(frame)
+        return self._record_frame(self._track_result(frame, results[0]))
+
+    def _predict(self, source, **kwargs):
+        """Run the detector without YOLO's per-image console log, timing the call"""
+        metrics = get_metrics()
+        if self.imgsz:
+            kwargs.setdefault('imgsz', self.imgsz)
+        with metrics.timer('stage_seconds', stage='player_inference'):
+            results = self.model.predict(source, conf=TRACKER_CONF, verbose=False, **kwargs)
+        metrics.count('inference_images', len(results), tracker='player')
+        return results
+
+    def _record_frame(self, player_dict):
+        metrics = get_metrics()
+        metrics.count('frames', stage='player')
+        metrics.observe('detections_per_frame', len(player_dict), tracker='player')
+        return player_dict
+
+    def _detect_frame_keyframe(self, frame):
+        """Run the detector on keyframes only, propagating boxes with optical flow in between"""
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        
+        player_dict = None
+        if (self._prev_gray is not None and self._last_players
+                and self._frames_since_keyframe < self.current_keyframe_interval):
+            player_dict = self._propagate_players(self._prev_gray, gray, self._last_players)
+            if player_dict is None:
+                self.keyframe_stats['drift_failures'] += 1
+        
+        if player_dict is None:
+            results = self._predict(frame)
+            player_dict = self._track_result(frame, results[0])
+            self._adapt_keyframe_interval(player_dict)
+            self._last_keyframe = (self._frame_counter, player_dict)
+            self._frames_since_keyframe = 1
+            self.keyframe_stats['keyframes'] += 1
+        else:
+            # Keep ByteTrack's motion model in step so IDs still match at the next keyframe
+            track_ids = list(player_dict.keys())
+            xyxy = np.array([player_dict[t]['bbox'] for t in track_ids], dtype=np.float32)
+            conf = np.array([player_dict[t]['confidence'] for t in track_ids], dtype=np.float32)
+            self.tracker.update(xyxy, conf, np.full(len(track_ids), self._person_cls), frame)
+            for track_id in track_ids:
+                self._update_position_history(track_id, player_dict[track_id]['bbox'])
+            self._frames_since_keyframe += 1
+            self.keyframe_stats['propagated'] += 1
+        
+        self._prev_gray = gray
+        self._last_players = player_dict
+        self._frame_counter += 1
+        return player_dict
+
+    def _propagate_players(self, prev_gray, gray, players, max_fb_error=1.0, min_points=6):
+        """Shift every player box by the median optical flow of the points inside it.
+
+        Returns None when the drift check fails: too few points tracked forward and
+        backward consistently in any of the boxes.
+        """
+        height, width = gray.shape[:2]
+        points = []
+        owners = []
+        for track_id, player_data in players.items():
+            x1, y1, x2, y2 = [int(v) for v in player_data['bbox']]
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(width, x2), min(height, y2)
+            if x2 - x1 < 4 or y2 - y1 < 4:
+                return None
+            corners = cv2.goodFeaturesToTrack(prev_gray[y1:y2, x1:x2], maxCorners=30,
+                                              qualityLevel=0.01, minDistance=3)
+            if corners is None or len(corners) < min_points:
+                return None
+            points.append(corners.reshape(-1, 2) + (x1, y1))
+            owners.append(np.full(len(corners), track_id))
+        
+        points = np.concatenate(points).astype(np.float32).reshape(-1, 1, 2)
+        owners = np.concatenate(owners)
+        
+        # Forward-backward check rejects points that were not tracked reliably
+        forward, status_f, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None)
+        backward, status_b, _ = cv2.calcOpticalFlowPyrLK(gray, prev_gray, forward, None)
+        fb_error = np.linalg.norm((points - backward).reshape(-1, 2), axis=1)
+        good = (status_f.reshape(-1) == 1) & (status_b.reshape(-1) == 1) & (fb_error < max_fb_error)
+        motion = (forward - points).reshape(-1, 2)
+        
+        propagated = {}
+        for track_id, player_data in players.items():
+            mask = good & (owners == track_id)
+            if mask.sum() < min_points:
+                return None
+            dx, dy = np.median(motion[mask], axis=0).tolist()
+            x1, y1, x2, y2 = player_data['bbox']
+            propagated[track_id] = dict(player_data, bbox=[x1 + dx, y1 + dy, x2 + dx, y2 + dy])
+        return propagated
+
+    def _adapt_keyframe_interval(self, player_dict):
+        """Pick the next keyframe interval from how fast players moved since the last keyframe"""
+        if self._last_keyframe is None:
+            return
+        last_idx, last_players = self._last_keyframe
+        elapsed = max(1, self._frame_counter - last_idx)
+        
+        speeds = []
+        for track_id, player_data in player_dict.items():
+            if track_id not in last_players:
+                continue
+            x1, y1, x2, y2 = player_data['bbox']
+            px1, py1, px2, py2 = last_players[track_id]['bbox']
+            moved = np.hypot((x1 + x2 - px1 - px2) / 2, (y1 + y2 - py1 - py2) / 2)
+            speeds.append(moved / max(1.0, y2 - y1) / elapsed)  # player heights per frame
+        if not speeds:
+            return
+        
+        # Allow players to move at most max_keyframe_motion of their height between detections
+        speed = max(speeds)
+        target = self.max_keyframe_motion / speed if speed > 0 else self.keyframe_interval
+        interval = int(np.clip(target, 1, self.keyframe_interval))
+        
+        # Boxes propagated up to this keyframe that drifted off the detections mean the flow can't keep up
+        if self._last_players and player_dict:
+            shared = [t for t in player_dict if t in self._last_players]
+            if shared:
+                ious = box_iou([self._last_players[t]['bbox'] for t in shared],
+                               [player_dict[t]['bbox'] for t in shared]).diagonal()
+                if ious.min() < 0.5:
+                    interval = max(1, interval // 2)
+        self.current_keyframe_interval = interval
+
+    def _track_result(self, frame, result):
+        """Run ByteTrack on one frame of raw detections and build the player dict"""
+        xyxy, conf, cls = result_to_arrays(result)
+        xyxy, conf, cls, track_ids = self.tracker.update(xyxy, conf, cls, frame)
         
         player_dict = {}
-        if results and len(results) > 0:
-            result = results[0]
-            id_name_dict = result.names
-            
-            if result.boxes is not None:
-                for box in result.boxes:
-                    if box.id is not None:  # Check if tracking ID exists
-                        track_id = int(box.id.tolist()[0])
-                        bbox = box.xyxy.tolist()[0]
-                        confidence = float(box.conf.tolist()[0])
-                        object_cls_id = int(box.cls.tolist()[0])
-                        object_cls_name = id_name_dict[object_cls_id]
-                        
-                        if object_cls_name == "person" and confidence > 0.5:
-                            player_dict[track_id] = {
-                                'bbox': bbox,
-                                'confidence': confidence,
-                                'class': object_cls_name
-                            }
-                            
-                            # Store position history for analysis
-                            if track_id not in self.player_positions:
-                                self.player_positions[track_id] = []
-                            
-                            center_x = (bbox[0] + bbox[2]) / 2
-                            center_y = (bbox[1] + bbox[3]) / 2
-                            self.player_positions[track_id].append((center_x, center_y))
-                            
-                            # Keep only last 50 positions
-                            if len(self.player_positions[track_id]) > 50:
-                                self.player_positions[track_id].pop(0)
+        if track_ids is None:  # Only tracked boxes count as players
+            return player_dict
+        
+        person_ids = [cls_id for cls_id, name in result.names.items() if name == "person"]
+        if person_ids:
+            self._person_cls = person_ids[0]
+        keep = np.isin(cls, person_ids) & (conf > self.conf_threshold)
+        
+        for track_id, bbox, confidence in zip(track_ids[keep].tolist(), xyxy[keep].tolist(), conf[keep].tolist()):
+            player_dict[track_id] = {
+                'bbox': bbox,
+                'confidence': confidence,
+                'class': "person"
+            }
+            self._update_position_history(track_id, bbox)
 
         return player_dict
+
+    def _update_position_history(self, track_id, bbox):
+        """Store position history for analysis"""
+        if track_id not in self.player_positions:
+            self.player_positions[track_id] = []
+        
+        center_x = (bbox[0] + bbox[2]) / 2
+        center_y = (bbox[1] + bbox[3]) / 2
+        self.player_positions[track_id].append((center_x, center_y))
+        
+        # Keep only last 50 positions
+        if len(self.player_positions[track_id]) > 50:
+            self.player_positions[track_id].pop(0)
     
     def classify_players(self, player_detections):
-        """Classify players as Player 1 and Player 2 based on court position"""
+        """Classify players as Player 1 and Player 2 based on court position.
+
+        Works on a TrackStore (labels set in place) or a list of per-frame dicts.
+        """
         if not player_detections:
             return player_detections
         
+        if isinstance(player_detections, TrackStore):
+            store = player_detections
+        else:
+            store = TrackStore.from_detections(player_detections)
+        
         # Get all unique track IDs
-        all_track_ids = set()
-        for detection in player_detections:
-            all_track_ids.update(detection.keys())
+        track_ids, inverse = np.unique(store.track_id, return_inverse=True)
         
         # If we have exactly 2 players, classify them
-        if len(all_track_ids) == 2:
-            track_ids = list(all_track_ids)
-            
+        if len(track_ids) == 2:
             # Calculate average positions for classification
-            avg_positions = {}
-            for track_id in track_ids:
-                positions = []
-                for detection in player_detections:
-                    if track_id in detection:
-                        bbox = detection[track_id]['bbox']
-                        center_x = (bbox[0] + bbox[2]) / 2
-                        center_y = (bbox[1] + bbox[3]) / 2
-                        positions.append((center_x, center_y))
-                
-                if positions:
-                    avg_x = sum(pos[0] for pos in positions) / len(positions)
-                    avg_y = sum(pos[1] for pos in positions) / len(positions)
-                    avg_positions[track_id] = (avg_x, avg_y)
+            counts = np.bincount(inverse, minlength=2)
+            avg_y = np.bincount(inverse, weights=store.centers()[:, 1], minlength=2) / counts
             
-            # Classify based on court position (top/bottom or left/right)
-            if len(avg_positions) == 2:
-                sorted_by_y = sorted(avg_positions.items(), key=lambda x: x[1][1])
-                player1_id = sorted_by_y[0][0]  # Top player
-                player2_id = sorted_by_y[1][0]  # Bottom player
-                
-                # Update detections with player labels
+            # Classify based on court position (top/bottom)
+            order = np.argsort(avg_y, kind='stable')
+            player1_id = int(track_ids[order[0]])  # Top player
+            player2_id = int(track_ids[order[1]])  # Bottom player
+            labels = {player1_id: 'Player 1', player2_id: 'Player 2'}
+            
+            # Update detections with player labels
+            if store is player_detections:
+                store.set_labels(labels)
+            else:
                 for detection in player_detections:
-                    for track_id in list(detection.keys()):
-                        if track_id == player1_id:
-                            detection[track_id]['player_label'] = 'Player 1'
-                        elif track_id == player2_id:
-                            detection[track_id]['player_label'] = 'Player 2'
+                    for track_id in detection:
+                        if track_id in labels:
+                            detection[track_id]['player_label'] = labels[track_id]
         
         return player_detections
 
-    def draw_player_tracking(self, video_frames, player_detections):
-        """Draw player tracking with enhanced visualizations"""
-        output_video_frames = []
+    def label_players_online(self, player_dict, min_frames=10):
+        """Label players incrementally for streaming runs.
+
+        The two most frequently seen tracks are locked in as Player 1 (top) and Player 2
+        (bottom) once both have been seen in min_frames frames.
+        """
+        for track_id, player_data in player_dict.items():
+            bbox = player_data['bbox']
+            stats = self.online_label_stats.setdefault(track_id, [0.0, 0])
+            stats[0] += (bbox[1] + bbox[3]) / 2
+            stats[1] += 1
+        
+        if self.online_labels is None:
+            candidates = [(track_id, stats) for track_id, stats in self.online_label_stats.items()
+                          if stats[1] >= min_frames]
+            if len(candidates) >= 2:
+                top_two = sorted(candidates, key=lambda x: -x[1][1])[:2]
+                sorted_by_y = sorted(top_two, key=lambda x: x[1][0] / x[1][1])
+                self.online_labels = {sorted_by_y[0][0]: 'Player 1', sorted_by_y[1][0]: 'Player 2'}
+        
+        if self.online_labels:
+            for track_id, player_data in player_dict.items():
+                if track_id in self.online_labels:
+                    player_data['player_label'] = self.online_labels[track_id]
         
+        return player_dict
+
+    def draw_player_tracking(self, video_frames, player_detections, in_place=True):
+        """Draw player tracking with enhanced visualizations (yields frames lazily, annotated in place by default)"""
         for frame, detection in zip(video_frames, player_detections):
-            frame_copy = frame.copy()
+            frame_copy = frame if in_place else frame.copy()
             
             for track_id, player_data in detection.items():
                 bbox = player_data['bbox']
@@ -141,13 +410,6 @@ class PlayerTracker:
                 # Draw movement trail if available
                 if track_id in self.player_positions and len(self.player_positions[track_id]) > 1:
                     positions = self.player_positions[track_id][-10:]  # Last 10 positions
-                    for i in range(1, len(positions)):
-                        pt1 = (int(positions[i-1][0]), int(positions[i-1][1]))
-                        pt2 = (int(positions[i][0]), int(positions[i][1]))
-                        alpha = i / len(positions)
-                        thickness = max(1, int(3 * alpha))
-                        cv2.line(frame_copy, pt1, pt2, color, thickness)
+                    draw_trail(frame_copy, np.asarray(positions).astype(np.int32), color, 3)
             
-            output_video_frames.append(frame_copy)
-        
-        return output_video_frames
\ No newline at end of file
+            yield frame_copy
\ No newline at end of file
@@ -0,0 +1,270 @@
+import glob
+import json
+import os
+import shutil
+import tempfile
+import threading
+import cv2
+import numpy as np
+from .detector_backends import (DEFAULT_IMGSZ, EXPORT_DIR, OnnxBackend, backend_available, export_model,
+                                 export_path, letterbox)
+from .tracking import box_iou, result_to_arrays
+
+# Roboflow export the ball model was trained on: train/ calibrates, valid/ gates
+DATASET = os.path.join('training', 'tennis-ball-detection-1', 'data.yaml')
+CALIBRATION_IMAGES = 64
+# Quantization is refused when recall on the validation images drops by more than this
+MAX_RECALL_DROP = 0.02
+GATE_CONF = 0.5  # the trackers' default conf_threshold
+GATE_IOU = 0.5
+GATE_SUFFIX = '.gate.json'
+
+_quantize_lock = threading.Lock()
+
+
+class QuantizedOnnxBackend(OnnxBackend):
+    """INT8 (QDQ) quantized ONNX export, run by ONNX Runtime on the CPU"""
+
+    backend = 'int8'
+
+
+def dataset_split(data_yaml, split):
+    """(image paths, label directory, class names) of a split ('train' or 'val') of a YOLO dataset"""
+    import yaml
+
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f)
+    images_dir = os.path.join(os.path.dirname(os.path.abspath(data_yaml)), data[split])
+    labels_dir = os.path.join(os.path.dirname(images_dir), 'labels')
+    images = sorted(path for path in glob.glob(os.path.join(images_dir, '*'))
+                    if os.path.splitext(path)[1].lower() in ('.jpg', '.jpeg', '.png', '.bmp'))
+    names = data['names']
+    if isinstance(names, list):
+        names = dict(enumerate(names))
+    return images, labels_dir, names
+
+
+def read_labels(labels_dir, image_path, width, height):
+    """Boxes of one image's YOLO label file as (xyxy, cls) in pixels"""
+    label_path = os.path.join(labels_dir, os.path.splitext(os.path.basename(image_path))[0] + '.txt')
+    rows = np.loadtxt(label_path, ndmin=2) if os.path.isfile(label_path) else np.zeros((0, 5))
+    rows = rows.reshape(-1, 5)
+    cx, cy, w, h = rows[:, 1] * width, rows[:, 2] * height, rows[:, 3] * width, rows[:, 4] * height
+    xyxy = np.stack([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2], axis=1).astype(np.float32)
+    return xyxy, rows[:, 0].astype(np.float32)
+
+
+class CalibrationReader:
+    """Feeds letterboxed training images to ONNX Runtime's static quantization calibrator"""
+
+    def __init__(self, image_paths, input_name, imgsz=DEFAULT_IMGSZ, stride=32):
+        self.image_paths = image_paths
+        self.input_name = input_name
+        self.imgsz = imgsz
+        self.stride = stride
+        self._iterator = iter(image_paths)
+
+    def get_next(self):
+        path = next(self._iterator, None)
+        if path is None:
+            return None
+        image, _ = letterbox(cv2.imread(path), self.imgsz, self.stride)
+        batch = np.ascontiguousarray(image[None, ..., ::-1].transpose(0, 3, 1, 2), dtype=np.float32) / 255.0
+        return {self.input_name: batch}
+
+    def rewind(self):
+        self._iterator = iter(self.image_paths)
+
+
+def quantized_path(weights, imgsz=DEFAULT_IMGSZ, export_dir=EXPORT_DIR):
+    return export_path(weights, 'onnx', imgsz, export_dir)[:-len('.onnx')] + '-int8.onnx'
+
+
+def _float_nodes(model):
+    """Nodes of the detection head (the last /model.N/ block) that stay in float.
+
+    The head's 3x3 convolutions are a large share of the compute and quantize well; the
+    final 1x1 convolution of every branch and the box/class decoding after them produce
+    the output tensor directly, where 8-bit rounding would move boxes and scores.
+    """
+    head_nodes = []
+    for node in model.graph.node:
+        parts = node.name.split('/')
+        if len(parts) > 2 and parts[1].startswith('model.') and parts[1].split('.')[1].isdigit():
+            head_nodes.append((int(parts[1].split('.')[1]), parts))
+    if not head_nodes:
+        return []
+    head = max(index for index, _ in head_nodes)
+    head_nodes = [parts for index, parts in head_nodes if index == head]
+    # Branches are /model.N/cv2.0/cv2.0.<layer>/...; their last layer is the output conv
+    last_layer = {}
+    for parts in head_nodes:
+        if parts[2].startswith('cv') and len(parts) > 3:
+            last_layer[parts[2]] = max(last_layer.get(parts[2], ''), parts[3])
+    return ['/'.join(parts) for parts in head_nodes
+            if not (parts[2].startswith('cv') and len(parts) > 3) or parts[3] == last_layer[parts[2]]]
+
+
+def quantize_model(weights, data_yaml=DATASET, imgsz=DEFAULT_IMGSZ, export_dir=EXPORT_DIR,
+                   calibration_images=CALIBRATION_IMAGES):
+    """Quantize the ONNX export of weights to INT8, calibrated on the dataset's train images.
+
+    Weights are quantized per channel, activations per tensor from the value ranges seen
+    on up to calibration_images evenly spaced training images. Returns the path of the
+    quantized model, reusing an earlier one for the same weights.
+    """
+    import onnx
+    from onnxruntime import InferenceSession
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    target = quantized_path(weights, imgsz, export_dir)
+    with _quantize_lock:
+        if os.path.exists(target):
+            return target
+        source = export_model(weights, 'onnx', imgsz, export_dir)
+        images, _, _ = dataset_split(data_yaml, 'train')
+        if not images:
+            raise FileNotFoundError(f"No calibration images in {data_yaml}")
+        step = max(1, len(images) // calibration_images)
+        images = images[::step][:calibration_images]
+
+        session = InferenceSession(source, providers=['CPUExecutionProvider'])
+        reader = CalibrationReader(images, session.get_inputs()[0].name, imgsz)
+        metadata = session.get_modelmeta().custom_metadata_map
+        with tempfile.TemporaryDirectory(dir=export_dir) as work_dir:
+            prepared = os.path.join(work_dir, 'prepared.onnx')
+            quant_pre_process(source, prepared, skip_symbolic_shape=True)
+            quantized = os.path.join(work_dir, 'quantized.onnx')
+            quantize_static(prepared, quantized, reader, quant_format=QuantFormat.QDQ, per_channel=True,
+                            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                            nodes_to_exclude=_float_nodes(onnx.load(prepared)))
+            # Class names and stride travel in the model's metadata, like in the float export
+            model = onnx.load(quantized)
+            onnx.helper.set_model_props(model, metadata)
+            onnx.save(model, quantized)
+            shutil.move(quantized, target)
+    return target
+
+
+def _match_targets(result, target_xyxy, target_cls, iou_threshold):
+    """Number of target boxes found by a detection of the same class"""
+    xyxy, _, cls = result_to_arrays(result)
+    if not len(target_cls) or not len(cls):
+        return 0
+    iou = box_iou(target_xyxy, xyxy)
+    iou[target_cls[:, None] != cls[None, :]] = 0
+    found = 0
+    while iou.max() >= iou_threshold:
+        i, j = np.unravel_index(iou.argmax(), iou.shape)
+        found += 1
+        iou[i, :] = 0
+        iou[:, j] = 0
+    return found
+
+
+def evaluate_recall(detector, data_yaml=DATASET, split='val', conf=GATE_CONF, iou_threshold=GATE_IOU,
+                    reference=None, imgsz=DEFAULT_IMGSZ):
+    """Share of target boxes in a dataset split that detector finds.
+
+    Targets are the split's labels, or, for models trained on other classes (e.g. the
+    COCO player model), the detections of a full-precision reference detector.
+    """
+    images, labels_dir, _ = dataset_split(data_yaml, split)
+    targets = found = 0
+    for path in images:
+        image = cv2.imread(path)
+        if reference is None:
+            target_xyxy, target_cls = read_labels(labels_dir, path, image.shape[1], image.shape[0])
+        else:
+            target_xyxy, _, target_cls = result_to_arrays(reference.predict(image, conf=conf, imgsz=imgsz)[0])
+        result = detector.predict(image, conf=conf, imgsz=imgsz)[0]
+        targets += len(target_cls)
+        found += _match_targets(result, target_xyxy, target_cls, iou_threshold)
+    return {'images': len(images), 'targets': targets, 'found': found,
+            'recall': found / targets if targets else 1.0}
+
+
+def recall_gate(weights, quantized, data_yaml=DATASET, max_recall_drop=MAX_RECALL_DROP, conf=GATE_CONF,
+                iou_threshold=GATE_IOU, imgsz=DEFAULT_IMGSZ, export_dir=EXPORT_DIR):
+    """Compare the quantized model's recall on the validation split with full precision.
+
+    The report is stored next to the quantized model and reused while the settings
+    are unchanged. 'passed' is False when recall drops by more than max_recall_drop.
+    """
+    settings = {'data': os.path.abspath(data_yaml), 'conf': conf, 'iou': iou_threshold, 'imgsz': imgsz}
+    report_path = quantized + GATE_SUFFIX
+    try:
+        with open(report_path) as f:
+            report = json.load(f)
+        if report.get('settings') == settings:
+            report['passed'] = report['recall_drop'] <= max_recall_drop
+            return report
+    except (OSError, ValueError):
+        pass
+
+    # The float ONNX export gives PyTorch's boxes (see check_parity) without loading torch
+    reference = OnnxBackend(export_model(weights, 'onnx', imgsz, export_dir), imgsz)
+    _, _, names = dataset_split(data_yaml, 'val')
+    if dict(reference.names) == names:
+        targets = 'labels'
+        reference_recall = evaluate_recall(reference, data_yaml, 'val', conf, iou_threshold, imgsz=imgsz)['recall']
+        evaluation = evaluate_recall(QuantizedOnnxBackend(quantized, imgsz), data_yaml, 'val', conf,
+                                     iou_threshold, imgsz=imgsz)
+    else:
+        targets = 'reference'
+        reference_recall = 1.0
+        evaluation = evaluate_recall(QuantizedOnnxBackend(quantized, imgsz), data_yaml, 'val', conf,
+                                     iou_threshold, reference=reference, imgsz=imgsz)
+
+    report = {
+        'settings': settings,
+        'targets': targets,
+        'images': evaluation['images'],
+        'boxes': evaluation['targets'],
+        'reference_recall': round(reference_recall, 4),
+        'quantized_recall': round(evaluation['recall'], 4),
+        'recall_drop': round(reference_recall - evaluation['recall'], 4),
+    }
+    try:
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+    except OSError:
+        pass
+    report['passed'] = report['recall_drop'] <= max_recall_drop
+    return report
+
+
+def quantized_detector(weights, imgsz=DEFAULT_IMGSZ, export=True, export_dir=EXPORT_DIR, data=DATASET,
+                       max_recall_drop=MAX_RECALL_DROP, conf=GATE_CONF, iou_threshold=GATE_IOU,
+                       calibration_images=CALIBRATION_IMAGES, threads=None):
+    """The INT8 detector for weights if it passes the recall gate, else None.
+
+    With export=True the model is quantized (and gated) first when needed. threads caps
+    ONNX Runtime's intra-op threads.
+    """
+    if not backend_available('onnx') or not os.path.isfile(weights):
+        return None
+    path = quantized_path(weights, imgsz, export_dir)
+    if not os.path.exists(path):
+        if not export:
+            return None
+        if not os.path.isfile(data):
+            print(f"⚠️ Calibration dataset {data} not found, not quantizing {weights}")
+            return None
+        try:
+            path = quantize_model(weights, data, imgsz, export_dir, calibration_images)
+        except Exception as e:
+            print(f"⚠️ Could not quantize {weights}: {e}")
+            return None
+
+    try:
+        report = recall_gate(weights, path, data, max_recall_drop, conf, iou_threshold, imgsz, export_dir)
+    except Exception as e:
+        print(f"⚠️ Could not check the recall of INT8 {weights}: {e}")
+        return None
+    if not report['passed']:
+        print(f"❌ INT8 {weights} loses recall ({report['reference_recall']:.3f} -> "
+              f"{report['quantized_recall']:.3f}), keeping full precision")
+        return None
+    return QuantizedOnnxBackend(path, imgsz, threads=threads)
@@ -1,200 +1,567 @@
-from ultralytics import YOLO
+import itertools
+import os
+import shutil
+import time
 import cv2
 import numpy as np
+from utils import VideoFrame, VideoReader, concat_videos, open_video_writer, save_video, get_metrics
 from .player_tracker import PlayerTracker
-from .ball_tracker import BallTracker
+from .ball_tracker import BallTracker, StreamingBallInterpolator
+from .ball_trajectory import BallTrajectoryAnalyzer, OnlineHitCounter
+from .parallel_processing import process_video_parallel
+from .overlay_renderer import OverlayRenderer, TrailBuffer, draw_trail
+from .model_registry import LazyModel
+from .live_mode import (DEGRADE_STEPS, DROP_OVERLAY, REDUCE_PLAYER_RATE, SKIP_BALL, DegradeController,
+                        latency_summary)
+from .pipeline import run_pipeline
+from .player_analytics import PlayerAnalytics
+from .play_segmenter import PlaySegmenter, describe_segments, join_segments
+from .track_store import TrackStoreBuilder
 
 class TennisTracker:
-    def __init__(self, player_model_path="yolov8n.pt", ball_model_path="models/best.pt"):
-        self.player_tracker = PlayerTracker(player_model_path)
-        self.ball_tracker = BallTracker(ball_model_path)
+    def __init__(self, player_model_path="yolov8n.pt", ball_model_path="models/best.pt", batch_size=1, cache=None,
+                 max_interpolation_gap=None, interpolation_method='linear', player_options=None, ball_options=None,
+                 play_segmentation=False, segment_options=None):
+        # Extra tracker settings, e.g. {'keyframe_interval': 5} or {'roi_mode': True, 'roi_size': 320}
+        self.player_tracker = PlayerTracker(player_model_path, batch_size=batch_size, cache=cache,
+                                            **(player_options or {}))
+        self.ball_tracker = BallTracker(ball_model_path, batch_size=batch_size, cache=cache, **(ball_options or {}))
         self.match_stats = {
             'ball_hits': 0,
+            'bounces': 0,
+            'rallies': 0,
             'rally_length': 0,
             'player_distances': {'Player 1': 0, 'Player 2': 0}
         }
+        self.max_interpolation_gap = max_interpolation_gap
+        self.interpolation_method = interpolation_method
+        # Kept so worker processes can build identical trackers
+        self.player_model_path = player_model_path
+        self.ball_model_path = ball_model_path
+        self.batch_size = batch_size
+        self.cache = cache
+        self.player_options = player_options
+        self.ball_options = ball_options
+        self.pipeline_stats = {}
+        self.live_stats = {}
+        # Detectors only run on in-play segments found by a cheap first pass, e.g. {'min_play_s': 3.0}
+        self.play_segmenter = PlaySegmenter(**(segment_options or {})) if play_segmentation else None
+        self.play_segments = None
+        # Source frame rate for the overlay clock and per-second stats, taken from the video when known
+        self.fps = 30.0
+        self.overlay_renderer = OverlayRenderer()
+        self.player_analytics = PlayerAnalytics(fps=self.fps)
+        self.ball_trajectory = None
+        self._hit_counter = OnlineHitCounter(fps=self.fps)
+        self._ball_frame_idx = 0
     
-    def track_tennis_match(self, video_frames):
-        """Complete tennis match tracking with players and ball"""
+    def load_models(self):
+        """Load both detectors now rather than on first use, e.g. to warm up a worker"""
+        for tracker in (self.player_tracker, self.ball_tracker):
+            if isinstance(tracker.model, LazyModel):
+                tracker.model.load()
+    
+    def reset(self):
+        """Forget everything about the previous video, keeping the loaded models"""
+        self.player_tracker.reset()
+        self.ball_tracker.reset()
+        self.fps = 30.0
+        self.pipeline_stats = {}
+        self.live_stats = {}
+        self.play_segments = None
+        self._reset_match_state()
+    
+    def track_tennis_match(self, video_frames, checkpoint=None):
+        """Complete tennis match tracking with players and ball.
+
+        Detections are returned as columnar TrackStores, which still index like lists of
+        per-frame dicts. With play segmentation on and a VideoReader as input, only the
+        in-play segments are detected and analyzed; other frames have no detections.
+        With a RunCheckpoint, detection progress is saved as it goes and a resumed call
+        skips what was already detected. Statistics are recomputed from the detections.
+        """
+        self.fps = getattr(video_frames, 'fps', self.fps)
+        if self.play_segmenter is not None and hasattr(video_frames, 'subrange'):
+            return self._track_play_segments(video_frames, checkpoint)
+        
         print("Tracking players...")
-        player_detections = self.player_tracker.detect_frames(video_frames)
+        player_detections = self.player_tracker.detect_frames(video_frames, as_store=True, checkpoint=checkpoint)
         player_detections = self.player_tracker.classify_players(player_detections)
         
         print("Tracking tennis ball...")
-        ball_detections = self.ball_tracker.detect_frames(video_frames)
-        ball_detections = self.ball_tracker.interpolate_ball_positions(ball_detections)
+        ball_detections = self.ball_tracker.detect_frames(video_frames, as_store=True, checkpoint=checkpoint)
+        ball_detections = self.ball_tracker.interpolate_ball_positions(
+            ball_detections, max_gap=self.max_interpolation_gap, method=self.interpolation_method)
         
         print("Analyzing match...")
         self.analyze_match(player_detections, ball_detections)
         
         return player_detections, ball_detections
     
-    def analyze_match(self, player_detections, ball_detections):
-        """Analyze tennis match for statistics"""
-        previous_ball_pos = None
-        previous_player_positions = {}
-        
-        for frame_idx, (players, ball) in enumerate(zip(player_detections, ball_detections)):
-            # Analyze ball movement for hit detection
-            if ball:
-                for ball_id, ball_data in ball.items():
-                    bbox = ball_data['bbox']
-                    current_ball_pos = ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
-                    
-                    if previous_ball_pos:
-                        # Detect sudden direction changes (potential hits)
-                        velocity = (current_ball_pos[0] - previous_ball_pos[0], 
-                                  current_ball_pos[1] - previous_ball_pos[1])
-                        speed = np.sqrt(velocity[0]**2 + velocity[1]**2)
-                        
-                        if speed > 50:  # Threshold for ball hit detection
-                            self.match_stats['ball_hits'] += 1
-                    
-                    previous_ball_pos = current_ball_pos
+    def _track_play_segments(self, video_frames, checkpoint=None):
+        """track_tennis_match over the in-play segments of a VideoReader"""
+        saved = checkpoint.load('segments') if checkpoint is not None else None
+        if saved is not None:
+            segments, n_frames, court_found, self.play_segmenter.segment_stats = saved
+        else:
+            print("Finding in-play segments...")
+            segments = self.play_segmenter.segment(video_frames, self.fps)
+            n_frames, court_found = self.play_segmenter.frame_count, self.play_segmenter.court_found
+            if checkpoint is not None:
+                checkpoint.save('segments', (segments, n_frames, court_found, self.play_segmenter.segment_stats))
+        if not court_found:
+            print("   Court not found in any frame, analyzing the whole video")
+        self.play_segments = describe_segments(segments, self.fps)
+        in_play = sum(end - start for start, end in segments)
+        print(f"   {len(segments)} segments, {in_play}/{n_frames} frames in play "
+              f"({self.play_segmenter.segment_stats['shots']} camera shots)")
+        
+        player_stores, ball_stores = [], []
+        for k, (start, end) in enumerate(segments):
+            print(f"Tracking players and ball in segment {k + 1}/{len(segments)} (frames {start}-{end})...")
+            # Tracks don't carry over dead time; players are labeled per segment since they change ends
+            self._reset_tracks()
+            segment_frames = video_frames.subrange(start, end)
+            segment_checkpoint = checkpoint.scope(f"segment{k:04d}") if checkpoint is not None else None
+            players = self.player_tracker.detect_frames(segment_frames, as_store=True, checkpoint=segment_checkpoint)
+            player_stores.append(self.player_tracker.classify_players(players))
+            ball = self.ball_tracker.detect_frames(segment_frames, as_store=True, checkpoint=segment_checkpoint)
+            ball_stores.append(self.ball_tracker.interpolate_ball_positions(
+                ball, max_gap=self.max_interpolation_gap, method=self.interpolation_method))
+        
+        player_detections = join_segments(player_stores, segments, n_frames, class_name='person', keep_ids=())
+        ball_detections = join_segments(ball_stores, segments, n_frames)
+        
+        print("Analyzing match...")
+        self.analyze_match(player_detections, ball_detections)
+        
+        return player_detections, ball_detections
+    
+    def _reset_tracks(self):
+        """Start new tracks in both trackers, keeping their run statistics"""
+        stats = [(tracker, name, getattr(tracker, name))
+                 for tracker, names in ((self.player_tracker, ('keyframe_stats',)),
+                                        (self.ball_tracker, ('roi_stats', 'tile_stats', 'motion_stats')))
+                 for name in names]
+        self.player_tracker.reset()
+        self.ball_tracker.reset()
+        for tracker, name, value in stats:
+            setattr(tracker, name, value)
+    
+    def track_tennis_match_parallel(self, video_path, workers=None, chunk_frames=1800, overlap_frames=30):
+        """Like track_tennis_match, but detection runs on overlapping time chunks in a process pool.
+
+        Tracks are stitched across chunk boundaries before players are classified, so IDs
+        and Player 1/Player 2 labels are consistent over the whole video.
+        """
+        self.fps = VideoReader(video_path).fps
+        print(f"Tracking players and ball in {chunk_frames}-frame chunks on {workers or os.cpu_count()} processes...")
+        player_detections, ball_detections = process_video_parallel(
+            video_path, self.player_model_path, self.ball_model_path, workers=workers,
+            chunk_frames=chunk_frames, overlap_frames=overlap_frames,
+            tracker_kwargs={'batch_size': self.batch_size, 'cache': self.cache},
+            player_options=self.player_options, ball_options=self.ball_options)
+        
+        player_detections = self.player_tracker.classify_players(player_detections)
+        ball_detections = self.ball_tracker.interpolate_ball_positions(
+            ball_detections, max_gap=self.max_interpolation_gap, method=self.interpolation_method)
+        
+        print("Analyzing match...")
+        self.analyze_match(player_detections, ball_detections)
+        
+        return player_detections, ball_detections
+    
+    def run_pipelined(self, video_source, output_path, fps=None, queue_size=8, max_interpolation_gap=None,
+                      codec=None, encode_workers=1):
+        """Run decode, player/ball inference, rendering and encoding as concurrent stages.
+
+        Stages are joined by bounded queues and frames flow through them in order. Player
+        labels, ball interpolation and match statistics are computed online, so the overlay
+        shows running totals. Per-stage busy/blocked timings end up in self.pipeline_stats.
+        encode_workers > 1 encodes the output in segments on that many processes.
+        """
+        fps = fps or getattr(video_source, 'fps', self.fps)
+        self.fps = fps
+        # Streaming interpolation needs a bounded lookahead
+        max_interpolation_gap = max_interpolation_gap or self.max_interpolation_gap or 30
+        player_builder = TrackStoreBuilder(class_name='person')
+        ball_builder = TrackStoreBuilder()
+        self._reset_match_state()
+        
+        if hasattr(video_source, 'iter_frames'):
+            video_frames = video_source.iter_frames()
+        else:
+            video_frames = (VideoFrame(i, i / fps, frame) for i, frame in enumerate(video_source))
+        
+        def decode_stage(items):
+            for video_frame in items:
+                yield {'frame': video_frame}
+        
+        def player_stage(items):
+            items, frame_items = itertools.tee(items)
+            detections = self.player_tracker.iter_detections(item['frame'].image for item in frame_items)
+            for item, players in zip(items, detections):
+                item['players'] = players
+                yield item
+        
+        def ball_stage(items):
+            items, frame_items = itertools.tee(items)
+            detections = self.ball_tracker.iter_detections(item['frame'].image for item in frame_items)
+            for item, ball in zip(items, detections):
+                item['ball'] = ball
+                yield item
+        
+        def render_stage(items):
+            metrics = get_metrics()
+            interpolator = StreamingBallInterpolator(max_gap=max_interpolation_gap, method=self.interpolation_method)
+            ball_trail = TrailBuffer(40)
+            player_trails = {}
             
-            # Track player movement distances
-            for track_id, player_data in players.items():
-                player_label = player_data.get('player_label', f'Person {track_id}')
-                bbox = player_data['bbox']
-                current_pos = ((bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2)
+            def render(item, ball):
+                video_frame = item['frame']
+                players = item['players']
+                self.update_match_stats(players, ball)
+                player_builder.append(players)
+                ball_builder.append(ball)
+                # Decoded frames are not reused, so draw on them directly
+                with metrics.timer('stage_seconds', stage='render'):
+                    frame = self.draw_frame_analysis(video_frame.image, video_frame.index, players, ball,
+                                                     ball_trail, player_trails)
+                metrics.count('frames', stage='render')
+                return frame
+            
+            for item in items:
+                self.player_tracker.label_players_online(item['players'])
+                for ready_item, ball in interpolator.push(item['frame'].index, item['ball'], item):
+                    yield render(ready_item, ball)
+            for ready_item, ball in interpolator.flush():
+                yield render(ready_item, ball)
+        
+        def encode_stage(frames):
+            with open_video_writer(output_path, fps, codec, encode_workers) as writer:
+                for frame in frames:
+                    writer.write(frame)
+                    yield frame
+        
+        self.pipeline_stats = run_pipeline(video_frames, [
+            ('decode', decode_stage),
+            ('player', player_stage),
+            ('ball', ball_stage),
+            ('render', render_stage),
+            ('encode', encode_stage),
+        ], queue_size=queue_size)
+        
+        player_store, ball_store = player_builder.build(), ball_builder.build()
+        # The overlay showed running estimates; the final numbers use the whole ball track
+        self._analyze_ball_trajectory(ball_store)
+        return player_store, ball_store
+    
+    def run_live(self, source, output_path=None, latency_budget_s=None, degrade_steps=DEGRADE_STEPS,
+                 player_stride=3, codec=None, on_frame=None, max_frames=None):
+        """Analyze a live feed frame by frame, shedding work when it falls behind.
+
+        source is a LiveSource/ReplaySource (or any iterable of VideoFrames). Every frame
+        goes through player and ball detection, the running statistics and the overlay, and
+        the result is written to output_path and/or passed to on_frame(frame_idx, image).
+        When the smoothed latency from frame arrival to output exceeds latency_budget_s
+        (one frame interval by default), the steps of degrade_steps are switched on in order:
+        - skip_ball: no ball detection
+        - reduce_player_rate: players are detected on every player_stride-th frame only
+        - drop_overlay: frames are passed on without annotation
+        and switched off again once latency has recovered. Frames dropped by the source leave
+        empty rows in the returned stores (and repeated frames in the output video), so both
+        stay aligned with the source. Latency and degrade numbers end up in self.live_stats.
+        """
+        fps = getattr(source, 'fps', None) or self.fps
+        self.fps = fps
+        controller = DegradeController(latency_budget_s or 1.0 / fps, degrade_steps)
+        metrics = get_metrics()
+        self._reset_match_state()
+        player_builder = TrackStoreBuilder(class_name='person')
+        ball_builder = TrackStoreBuilder()
+        ball_trail = TrailBuffer(40)
+        player_trails = {}
+        players = {}
+        frames_since_players = player_stride
+        latencies = []
+        level_frames = [0] * (len(controller.steps) + 1)
+        writer = open_video_writer(output_path, fps, codec) if output_path else None
+        last_image = None
+        
+        try:
+            for video_frame in source:
+                captured_at = getattr(video_frame, 'captured_at', None) or time.perf_counter()
+                # Fill in frames the source dropped, so everything stays aligned with it
+                while player_builder.n_frames < video_frame.index:
+                    player_builder.append({})
+                    ball_builder.append({})
+                    if writer is not None and last_image is not None:
+                        writer.write(last_image)
                 
-                if track_id in previous_player_positions:
-                    prev_pos = previous_player_positions[track_id]
-                    distance = np.sqrt((current_pos[0] - prev_pos[0])**2 + 
-                                     (current_pos[1] - prev_pos[1])**2)
-                    
-                    if player_label in self.match_stats['player_distances']:
-                        self.match_stats['player_distances'][player_label] += distance
+                active = controller.active
+                if REDUCE_PLAYER_RATE not in active or frames_since_players >= player_stride:
+                    players = self.player_tracker.detect_frame(video_frame.image)
+                    self.player_tracker.label_players_online(players)
+                    frames_since_players = 0
+                frames_since_players += 1
+                ball = {} if SKIP_BALL in active else self.ball_tracker.detect_frame(video_frame.image)
                 
-                previous_player_positions[track_id] = current_pos
+                self.update_match_stats(players, ball, frame_idx=video_frame.index)
+                player_builder.append(players)
+                ball_builder.append(ball)
+                
+                image = video_frame.image
+                if DROP_OVERLAY not in active:
+                    image = self.draw_frame_analysis(image, video_frame.index, players, ball,
+                                                     ball_trail, player_trails)
+                if writer is not None:
+                    writer.write(image)
+                if on_frame is not None:
+                    on_frame(video_frame.index, image)
+                last_image = image
+                
+                latency = time.perf_counter() - captured_at
+                latencies.append(latency)
+                level_frames[controller.level] += 1
+                controller.update(latency)
+                metrics.count('frames', stage='live')
+                metrics.observe('live_latency_seconds', latency)
+                metrics.gauge('degrade_level', controller.level)
+                if max_frames is not None and len(latencies) >= max_frames:
+                    break
+        finally:
+            if writer is not None:
+                writer.release()
+        
+        level_names = ('full',) + controller.steps
+        self.live_stats = {
+            'frames_processed': len(latencies),
+            'frames_dropped': getattr(source, 'frames_dropped', player_builder.n_frames - len(latencies)),
+            'latency_budget_ms': 1000 * controller.latency_budget_s,
+            'over_budget_frames': sum(1 for latency in latencies if latency > controller.latency_budget_s),
+            'frames_per_level': dict(zip(level_names, level_frames)),
+            'final_level': level_names[controller.level],
+        }
+        self.live_stats.update(latency_summary(latencies))
+        
+        player_store, ball_store = player_builder.build(), ball_builder.build()
+        self._analyze_ball_trajectory(ball_store)
+        return player_store, ball_store
+    
+    def _reset_match_state(self):
+        """Start per-video statistics from scratch"""
+        for key in ('ball_hits', 'bounces', 'rallies', 'rally_length'):
+            self.match_stats[key] = 0
+        self.player_analytics = PlayerAnalytics(fps=self.fps)
+        self.ball_trajectory = None
+        self._hit_counter = OnlineHitCounter(fps=self.fps)
+        self._ball_frame_idx = 0
+        self._sync_player_distances()
+    
+    def _sync_player_distances(self):
+        for player_label in self.match_stats['player_distances']:
+            self.match_stats['player_distances'][player_label] = self.player_analytics.distances.get(player_label, 0)
+    
+    def _analyze_ball_trajectory(self, ball_detections):
+        """Hits, bounces and rallies from the smoothed whole-video ball track"""
+        self.ball_trajectory = BallTrajectoryAnalyzer(fps=self.fps).analyze(ball_detections)
+        self.match_stats['ball_hits'] = len(self.ball_trajectory.hit_frames)
+        self.match_stats['bounces'] = len(self.ball_trajectory.bounce_frames)
+        self.match_stats['rallies'] = self.ball_trajectory.rally_count
+        # Rally length counts frames with the ball visible
+        self.match_stats['rally_length'] = len(self.ball_trajectory)
+    
+    def analyze_match(self, player_detections, ball_detections):
+        """Analyze tennis match for statistics"""
+        self._reset_match_state()
         
-        # Calculate rally length (frames with ball visible)
-        self.match_stats['rally_length'] = sum(1 for detection in ball_detections if detection)
+        # Ball and player statistics are computed over whole track arrays at once
+        with get_metrics().timer('stage_seconds', stage='analysis'):
+            self._analyze_ball_trajectory(ball_detections)
+            self.player_analytics.analyze(player_detections)
+        self._sync_player_distances()
     
-    def draw_complete_analysis(self, video_frames, player_detections, ball_detections):
-        """Draw complete tennis analysis with players and ball tracking in one video"""
-        output_frames = []
-        ball_trail = []  # Store ball positions for trail effect
-        player_trails = {}  # Store player positions for trails
+    def update_match_stats(self, players, ball, frame_idx=None):
+        """Update match statistics with a single frame of detections.
+
+        frame_idx defaults to the frame after the previous call; pass it when frames are skipped.
+        """
+        if frame_idx is not None:
+            self._ball_frame_idx = frame_idx
+        # Hits are confirmed a few frames late, once the ball has clearly turned around
+        if self._hit_counter.push(self._ball_frame_idx, ball):
+            self.match_stats['ball_hits'] += 1
+        if ball:
+            self.match_stats['rally_length'] += 1
+        
+        # Track player movement distances
+        self.player_analytics.update(players, self._ball_frame_idx)
+        self._ball_frame_idx += 1
+        self._sync_player_distances()
+    
+    def draw_complete_analysis(self, video_frames, player_detections, ball_detections, in_place=True):
+        """Draw complete tennis analysis with players and ball tracking in one video.
+
+        Frames are yielded one at a time so the output can be streamed straight into save_video.
+        Decoded frames are annotated in place; pass in_place=False to keep the inputs untouched.
+        """
+        ball_trail = TrailBuffer(40)  # Last 40 ball positions for a longer trail
+        player_trails = {}  # Last 20 positions per player
+        metrics = get_metrics()
         
         for frame_idx, (frame, players, ball) in enumerate(zip(video_frames, player_detections, ball_detections)):
-            frame_copy = frame.copy()
+            if not in_place:
+                frame = frame.copy()
+            with metrics.timer('stage_seconds', stage='render'):
+                frame = self.draw_frame_analysis(frame, frame_idx, players, ball, ball_trail, player_trails)
+            metrics.count('frames', stage='render')
+            yield frame
+    
+    def save_analysis_video(self, video_frames, player_detections, ball_detections, output_path, checkpoint,
+                            codec=None, workers=1):
+        """Render and encode the analysis video in checkpointed segments of checkpoint.interval frames.
+
+        Each finished segment is recorded in the checkpoint together with the trails drawn
+        so far, so a resumed call re-renders only from the end of the last one. Segments are
+        encoded like save_video (workers > 1 encodes in parallel) and joined into output_path
+        with ffmpeg's stream copy. Without ffmpeg, joining would re-encode every frame, so the
+        video is rendered in one go instead and a resumed call renders it again.
+        """
+        if not shutil.which('ffmpeg'):
+            save_video(self.draw_complete_analysis(video_frames, player_detections, ball_detections), output_path,
+                       fps=video_frames.fps, codec=codec, workers=workers)
+            return
+        
+        saved = checkpoint.load('render') or {'frames': 0, 'segments': 0, 'trails': (TrailBuffer(40), {})}
+        start, segments = saved['frames'], saved['segments']
+        ball_trail, player_trails = saved['trails']
+        if start:
+            video_frames = video_frames.subrange(video_frames.start_frame + start, video_frames.end_frame)
+        extension = os.path.splitext(output_path)[1]
+        metrics = get_metrics()
+        writer = None
+        
+        for frame_idx, frame in zip(range(start, len(player_detections)), video_frames):
+            if writer is None:
+                writer = open_video_writer(checkpoint.path(f"render{segments:05d}{extension}"), video_frames.fps,
+                                           codec, workers)
+            with metrics.timer('stage_seconds', stage='render'):
+                frame = self.draw_frame_analysis(frame, frame_idx, player_detections[frame_idx],
+                                                 ball_detections[frame_idx], ball_trail, player_trails)
+            metrics.count('frames', stage='render')
+            writer.write(frame)
+            if (frame_idx + 1) % checkpoint.interval == 0:
+                writer.release()
+                writer = None
+                segments += 1
+                checkpoint.save('render', {'frames': frame_idx + 1, 'segments': segments,
+                                           'trails': (ball_trail, player_trails)})
+        if writer is not None:
+            writer.release()
+            segments += 1
+        
+        concat_videos([checkpoint.path(f"render{k:05d}{extension}") for k in range(segments)], output_path,
+                      video_frames.fps, codec)
+    
+    def run_settings(self):
+        """Everything besides the video that changes the results, e.g. to match a checkpoint to its run"""
+        return {
+            'player': [self.player_model_path, self.player_tracker._cache_params()],
+            'ball': [self.ball_model_path, self.ball_tracker._cache_params()],
+            'batch_size': self.batch_size,
+            'interpolation': [self.max_interpolation_gap, self.interpolation_method],
+            'play_segmentation': self.play_segmenter.settings() if self.play_segmenter is not None else None,
+        }
+    
+    def draw_frame_analysis(self, frame, frame_idx, players, ball, ball_trail, player_trails):
+        """Draw players, ball, trails and the stats overlay onto one frame"""
+        # Draw player tracking with enhanced visuals
+        for track_id, player_data in players.items():
+            bbox = player_data['bbox']
+            confidence = player_data['confidence']
+            player_label = player_data.get('player_label', f'Person {track_id}')
+            
+            x1, y1, x2, y2 = map(int, bbox)
+            center_x = int((x1 + x2) / 2)
+            center_y = int((y1 + y2) / 2)
+            
+            # Player colors - more vibrant
+            if 'Player 1' in player_label:
+                color = (255, 100, 0)  # Bright Blue
+            elif 'Player 2' in player_label:
+                color = (0, 255, 100)  # Bright Green
+            else:
+                color = (0, 255, 255)  # Yellow
+            
+            # Store and draw player trail
+            if track_id not in player_trails:
+                player_trails[track_id] = TrailBuffer(20)
+            player_trails[track_id].append((center_x, center_y))
+            draw_trail(frame, player_trails[track_id].points(), color, 4)
+            
+            # Draw player bounding box with rounded corners effect
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 3)
             
-            # Draw player tracking with enhanced visuals
-            for track_id, player_data in players.items():
-                bbox = player_data['bbox']
-                confidence = player_data['confidence']
-                player_label = player_data.get('player_label', f'Person {track_id}')
+            # Draw player center point
+            cv2.circle(frame, (center_x, center_y), 6, color, -1)
+            cv2.circle(frame, (center_x, center_y), 8, (255, 255, 255), 2)
+            
+            # Enhanced player label with background
+            label = f'{player_label}: {confidence:.2f}'
+            label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)[0]
+            # Background rectangle
+            cv2.rectangle(frame, (x1, y1 - label_size[1] - 15), 
+                         (x1 + label_size[0] + 10, y1), color, -1)
+            # Text
+            cv2.putText(frame, label, (x1 + 5, y1 - 5), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        
+        # Draw ball tracking with enhanced trail
+        if ball:
+            for ball_id, ball_data in ball.items():
+                bbox = ball_data['bbox']
+                confidence = ball_data['confidence']
+                is_interpolated = ball_data.get('interpolated', False)
                 
                 x1, y1, x2, y2 = map(int, bbox)
                 center_x = int((x1 + x2) / 2)
                 center_y = int((y1 + y2) / 2)
                 
-                # Player colors - more vibrant
-                if 'Player 1' in player_label:
-                    color = (255, 100, 0)  # Bright Blue
-                elif 'Player 2' in player_label:
-                    color = (0, 255, 100)  # Bright Green
-                else:
-                    color = (0, 255, 255)  # Yellow
+                # Add to ball trail
+                ball_trail.append((center_x, center_y))
                 
-                # Store player trail
-                if track_id not in player_trails:
-                    player_trails[track_id] = []
-                player_trails[track_id].append((center_x, center_y))
-                if len(player_trails[track_id]) > 20:  # Keep last 20 positions
-                    player_trails[track_id].pop(0)
-                
-                # Draw player trail
-                if len(player_trails[track_id]) > 1:
-                    for i in range(1, len(player_trails[track_id])):
-                        alpha = i / len(player_trails[track_id])
-                        thickness = max(1, int(4 * alpha))
-                        pt1 = player_trails[track_id][i-1]
-                        pt2 = player_trails[track_id][i]
-                        cv2.line(frame_copy, pt1, pt2, color, thickness)
-                
-                # Draw player bounding box with rounded corners effect
-                cv2.rectangle(frame_copy, (x1, y1), (x2, y2), color, 3)
-                
-                # Draw player center point
-                cv2.circle(frame_copy, (center_x, center_y), 6, color, -1)
-                cv2.circle(frame_copy, (center_x, center_y), 8, (255, 255, 255), 2)
+                # Ball colors and styles
+                if is_interpolated:
+                    ball_color = (0, 255, 255)  # Yellow for interpolated
+                    cv2.circle(frame, (center_x, center_y), 12, ball_color, 2)
+                    cv2.circle(frame, (center_x, center_y), 6, ball_color, -1)
+                    label_text = f'Ball (Est): {confidence:.2f}'
+                else:
+                    ball_color = (0, 0, 255)  # Red for detected ball
+                    cv2.circle(frame, (center_x, center_y), 15, ball_color, -1)
+                    cv2.circle(frame, (center_x, center_y), 18, (255, 255, 255), 2)
+                    label_text = f'Ball: {confidence:.2f}'
                 
-                # Enhanced player label with background
-                label = f'{player_label}: {confidence:.2f}'
-                label_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)[0]
-                # Background rectangle
-                cv2.rectangle(frame_copy, (x1, y1 - label_size[1] - 15), 
-                             (x1 + label_size[0] + 10, y1), color, -1)
-                # Text
-                cv2.putText(frame_copy, label, (x1 + 5, y1 - 5), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
-            
-            # Draw ball tracking with enhanced trail
-            if ball:
-                for ball_id, ball_data in ball.items():
-                    bbox = ball_data['bbox']
-                    confidence = ball_data['confidence']
-                    is_interpolated = ball_data.get('interpolated', False)
-                    
-                    x1, y1, x2, y2 = map(int, bbox)
-                    center_x = int((x1 + x2) / 2)
-                    center_y = int((y1 + y2) / 2)
-                    
-                    # Add to ball trail
-                    ball_trail.append((center_x, center_y))
-                    if len(ball_trail) > 40:  # Keep last 40 positions for longer trail
-                        ball_trail.pop(0)
-                    
-                    # Ball colors and styles
-                    if is_interpolated:
-                        ball_color = (0, 255, 255)  # Yellow for interpolated
-                        cv2.circle(frame_copy, (center_x, center_y), 12, ball_color, 2)
-                        cv2.circle(frame_copy, (center_x, center_y), 6, ball_color, -1)
-                        label_text = f'Ball (Est): {confidence:.2f}'
-                    else:
-                        ball_color = (0, 0, 255)  # Red for detected ball
-                        cv2.circle(frame_copy, (center_x, center_y), 15, ball_color, -1)
-                        cv2.circle(frame_copy, (center_x, center_y), 18, (255, 255, 255), 2)
-                        label_text = f'Ball: {confidence:.2f}'
-                    
-                    # Ball label
-                    cv2.putText(frame_copy, label_text, (x1, y1 - 25), 
-                              cv2.FONT_HERSHEY_SIMPLEX, 0.6, ball_color, 2)
-            
-            # Draw enhanced ball trail
-            if len(ball_trail) > 1:
-                for i in range(1, len(ball_trail)):
-                    alpha = i / len(ball_trail)
-                    thickness = max(1, int(5 * alpha))
-                    # Gradient color effect
-                    trail_color = (int(255 * alpha), int(150 * alpha), 255)
-                    cv2.line(frame_copy, ball_trail[i-1], ball_trail[i], trail_color, thickness)
-            
-            # Draw enhanced match statistics overlay
-            self.draw_enhanced_stats_overlay(frame_copy, frame_idx, len(players), bool(ball))
-            
-            output_frames.append(frame_copy)
+                # Ball label
+                cv2.putText(frame, label_text, (x1, y1 - 25), 
+                          cv2.FONT_HERSHEY_SIMPLEX, 0.6, ball_color, 2)
+        
+        # Draw enhanced ball trail with a gradient color effect
+        draw_trail(frame, ball_trail.points(), None, 5,
+                   gradient=lambda alpha: (int(255 * alpha), int(150 * alpha), 255))
+        
+        # Draw enhanced match statistics overlay
+        self.draw_enhanced_stats_overlay(frame, frame_idx, len(players), bool(ball))
         
-        return output_frames
+        return frame
     
     def draw_enhanced_stats_overlay(self, frame, frame_idx, player_count, ball_detected):
         """Draw enhanced match statistics overlay on frame"""
-        # Create semi-transparent overlay
-        overlay = frame.copy()
-        
-        # Main stats panel background - larger and more prominent
-        cv2.rectangle(overlay, (10, 10), (500, 200), (0, 0, 0), -1)
-        cv2.addWeighted(overlay, 0.8, frame, 0.2, 0, frame)
-        
-        # Title with decorative border
-        cv2.rectangle(frame, (10, 10), (500, 45), (0, 255, 255), 2)
-        cv2.putText(frame, "🎾 TENNIS MATCH ANALYSIS", (20, 35), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 255), 2)
+        # Darkened panel with its static title; only the panel area is blended
+        self.overlay_renderer.draw_panel(frame)
         
         # Current frame info
-        frame_time = frame_idx / 30.0  # Assuming 30fps
+        frame_time = frame_idx / self.fps
         minutes = int(frame_time // 60)
         seconds = int(frame_time % 60)
         
@@ -211,9 +578,8 @@ class TennisTracker:
         
         for i, text in enumerate(stats_text):
             y_pos = 65 + i * 20
-            # Add icons and colors
+            # Add icons and colors (white icons are part of the static panel layer)
             if i == 0:  # Time
-                cv2.putText(frame, "⏱️", (15, y_pos), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
                 cv2.putText(frame, text, (40, y_pos), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
             elif i == 1:  # Players
                 color = (0, 255, 0) if player_count == 2 else (0, 255, 255)
@@ -224,26 +590,26 @@ class TennisTracker:
                 cv2.putText(frame, "🎾", (15, y_pos), cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
                 cv2.putText(frame, text, (40, y_pos), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 1)
             else:
-                cv2.putText(frame, "📊", (15, y_pos), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
                 cv2.putText(frame, text, (40, y_pos), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
         
         # Add legend for colors
-        legend_y = frame.shape[0] - 80
-        cv2.rectangle(frame, (10, legend_y - 10), (300, frame.shape[0] - 10), (0, 0, 0), -1)
-        cv2.rectangle(frame, (10, legend_y - 10), (300, frame.shape[0] - 10), (255, 255, 255), 1)
-        
-        cv2.putText(frame, "LEGEND:", (15, legend_y + 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-        cv2.putText(frame, "🔵 Player 1", (15, legend_y + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 100, 0), 1)
-        cv2.putText(frame, "🟢 Player 2", (100, legend_y + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 100), 1)
-        cv2.putText(frame, "🔴 Ball", (185, legend_y + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 0, 255), 1)
-        cv2.putText(frame, "🟡 Ball (Est)", (15, legend_y + 45), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (0, 255, 255), 1)
-        cv2.putText(frame, "--- Trails", (130, legend_y + 45), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+        self.overlay_renderer.draw_legend(frame)
     
     def get_match_summary(self):
         """Get complete match analysis summary"""
-        return {
+        summary = {
             'total_ball_hits': self.match_stats['ball_hits'],
             'rally_duration_frames': self.match_stats['rally_length'],
             'player_movement_distances': self.match_stats['player_distances'],
-            'average_hits_per_rally': self.match_stats['ball_hits'] / max(1, self.match_stats['rally_length'] / 30)  # Assuming 30fps
-        }
\ No newline at end of file
+            'player_average_speeds_px_per_s': {
+                player_label: round(self.player_analytics.average_speed(player_label), 1)
+                for player_label in self.match_stats['player_distances']
+            },
+            'total_bounces': self.match_stats['bounces'],
+            'rally_count': self.match_stats['rallies'],
+            'average_hits_per_rally': self.match_stats['ball_hits'] / max(1, self.match_stats['rallies'])
+        }
+        if self.play_segments is not None:
+            summary['play_segments'] = len(self.play_segments)
+            summary['in_play_seconds'] = round(sum(s['end_s'] - s['start_s'] for s in self.play_segments), 1)
+        return summary
\ No newline at end of file
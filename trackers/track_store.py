@@ -0,0 +1,154 @@
+from array import array
+import numpy as np
+
+# Player labels are stored as small integer codes
+LABEL_CODES = {'Player 1': 1, 'Player 2': 2}
+LABEL_NAMES = {code: name for name, code in LABEL_CODES.items()}
+
+
+class TrackStore:
+    """Columnar store for per-frame detections.
+
+    One row per detection, kept in frame order in flat NumPy arrays: frame, track_id,
+    bbox (x1, y1, x2, y2), confidence, label code and interpolated flag. Rows of frame i
+    are rows frame_offsets[i]:frame_offsets[i + 1].
+
+    Indexing or iterating the store yields the old per-frame dicts
+    ({track_id: {'bbox': [...], 'confidence': ..., ...}}), so code written against
+    lists of dicts keeps working while analytics can use the arrays directly.
+    """
+
+    def __init__(self, frame, track_id, bbox, confidence, label, interpolated, n_frames, class_name=None):
+        self.frame = np.asarray(frame, dtype=np.int64)
+        self.track_id = np.asarray(track_id, dtype=np.int64)
+        self.bbox = np.asarray(bbox, dtype=np.float32).reshape(-1, 4)
+        self.confidence = np.asarray(confidence, dtype=np.float32)
+        self.label = np.asarray(label, dtype=np.int8)
+        self.interpolated = np.asarray(interpolated, dtype=bool)
+        self.n_frames = int(n_frames)
+        self.class_name = class_name
+        self.frame_offsets = np.searchsorted(self.frame, np.arange(self.n_frames + 1))
+
+    @classmethod
+    def from_detections(cls, detections, class_name=None):
+        """Build a store from a list of per-frame detection dicts"""
+        builder = TrackStoreBuilder(class_name)
+        for detection in detections:
+            builder.append(detection)
+        return builder.build()
+
+    @classmethod
+    def empty(cls, n_frames=0, class_name=None):
+        return cls([], [], np.zeros((0, 4)), [], [], [], n_frames, class_name)
+
+    def __len__(self):
+        return self.n_frames
+
+    def __iter__(self):
+        for i in range(self.n_frames):
+            yield self[i]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self.n_frames))]
+        if index < 0:
+            index += self.n_frames
+        if not 0 <= index < self.n_frames:
+            raise IndexError("frame index out of range")
+        return self._frame_dict(self.frame_slice(index))
+
+    def _frame_dict(self, rows):
+        detection = {}
+        bboxes = self.bbox[rows].tolist()
+        confidences = self.confidence[rows].tolist()
+        labels = self.label[rows].tolist()
+        interpolated = self.interpolated[rows].tolist()
+        for i, track_id in enumerate(self.track_id[rows].tolist()):
+            entry = {'bbox': bboxes[i], 'confidence': confidences[i]}
+            if self.class_name is not None:
+                entry['class'] = self.class_name
+            if labels[i]:
+                entry['player_label'] = LABEL_NAMES[labels[i]]
+            if interpolated[i]:
+                entry['interpolated'] = True
+            detection[track_id] = entry
+        return detection
+
+    def frame_slice(self, frame_idx):
+        """Row slice holding the detections of one frame"""
+        return slice(self.frame_offsets[frame_idx], self.frame_offsets[frame_idx + 1])
+
+    def counts(self):
+        """Number of detections in every frame"""
+        return np.diff(self.frame_offsets)
+
+    def centers(self):
+        """(N, 2) array of bbox centers"""
+        return (self.bbox[:, :2] + self.bbox[:, 2:]) / 2
+
+    def label_names(self):
+        """Per-row label strings, 'Person <id>' for unlabeled tracks"""
+        return [LABEL_NAMES[code] if code else f'Person {track_id}'
+                for code, track_id in zip(self.label.tolist(), self.track_id.tolist())]
+
+    def set_labels(self, labels_by_track):
+        """Apply {track_id: 'Player 1' | 'Player 2'} to every row of those tracks"""
+        for track_id, label in labels_by_track.items():
+            self.label[self.track_id == track_id] = LABEL_CODES[label]
+
+    def with_rows(self, frame, track_id, bbox, confidence, label, interpolated):
+        """New store with extra rows merged in frame order"""
+        order_frame = np.concatenate([self.frame, np.asarray(frame, dtype=np.int64)])
+        order = np.argsort(order_frame, kind='stable')
+        return TrackStore(
+            order_frame[order],
+            np.concatenate([self.track_id, np.asarray(track_id, dtype=np.int64)])[order],
+            np.concatenate([self.bbox, np.asarray(bbox, dtype=np.float32).reshape(-1, 4)])[order],
+            np.concatenate([self.confidence, np.asarray(confidence, dtype=np.float32)])[order],
+            np.concatenate([self.label, np.asarray(label, dtype=np.int8)])[order],
+            np.concatenate([self.interpolated, np.asarray(interpolated, dtype=bool)])[order],
+            self.n_frames, self.class_name)
+
+    def to_detections(self):
+        """Materialize the old list of per-frame dicts"""
+        return list(self)
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.frame, self.track_id, self.bbox, self.confidence,
+                                      self.label, self.interpolated, self.frame_offsets))
+
+
+class TrackStoreBuilder:
+    """Appends per-frame detection dicts into compact typed buffers"""
+
+    def __init__(self, class_name=None):
+        self.class_name = class_name
+        self.n_frames = 0
+        self._frame = array('q')
+        self._track_id = array('q')
+        self._bbox = array('f')
+        self._confidence = array('f')
+        self._label = array('b')
+        self._interpolated = array('b')
+
+    def append(self, detection):
+        """Add the detections of the next frame"""
+        for track_id, data in detection.items():
+            self._frame.append(self.n_frames)
+            self._track_id.append(int(track_id))
+            self._bbox.extend(data['bbox'])
+            self._confidence.append(data['confidence'])
+            self._label.append(LABEL_CODES.get(data.get('player_label'), 0))
+            self._interpolated.append(bool(data.get('interpolated', False)))
+        self.n_frames += 1
+
+    def build(self):
+        return TrackStore(
+            np.array(self._frame, dtype=np.int64),
+            np.array(self._track_id, dtype=np.int64),
+            np.array(self._bbox, dtype=np.float32).reshape(-1, 4),
+            np.array(self._confidence, dtype=np.float32),
+            np.array(self._label, dtype=np.int8),
+            np.array(self._interpolated, dtype=bool),
+            self.n_frames, self.class_name)
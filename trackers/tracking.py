@@ -0,0 +1,149 @@
+import numpy as np
+
+# model.track() lowers the detector threshold to this so ByteTrack sees low-confidence boxes too
+TRACKER_CONF = 0.1
+
+
+def to_numpy(values):
+    """Convert a torch tensor (or anything array-like) to a NumPy array"""
+    if hasattr(values, 'cpu'):
+        values = values.cpu().numpy()
+    return np.asarray(values)
+
+
+def result_to_arrays(result):
+    """Pull all boxes out of a YOLO result as whole arrays: xyxy (N, 4), conf (N,), cls (N,)"""
+    boxes = result.boxes
+    if boxes is None or len(boxes) == 0:
+        return np.zeros((0, 4), np.float32), np.zeros(0, np.float32), np.zeros(0, np.int64)
+
+    xyxy = to_numpy(boxes.xyxy).astype(np.float32).reshape(-1, 4)
+    conf = to_numpy(boxes.conf).astype(np.float32).reshape(-1)
+    cls = to_numpy(boxes.cls).astype(np.int64).reshape(-1)
+    return xyxy, conf, cls
+
+
+def box_iou(boxes_a, boxes_b):
+    """Pairwise IoU between (N, 4) and (M, 4) xyxy boxes, as an (N, M) matrix"""
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    return intersection / np.maximum(area_a[:, None] + area_b[None, :] - intersection, 1e-9)
+
+
+def crop_around(frame, center, size):
+    """Square crop of up to size x size pixels centered on center, clamped to the frame.
+
+    Returns (crop, x0, y0) where (x0, y0) is the crop's top-left corner in the frame.
+    """
+    height, width = frame.shape[:2]
+    crop_w, crop_h = min(size, width), min(size, height)
+    x0 = int(np.clip(round(center[0] - crop_w / 2), 0, width - crop_w))
+    y0 = int(np.clip(round(center[1] - crop_h / 2), 0, height - crop_h))
+    return frame[y0:y0 + crop_h, x0:x0 + crop_w], x0, y0
+
+
+def tile_grid(width, height, tile_size, overlap=0.2):
+    """Top-left corners of the overlapping tile_size tiles that cover a width x height frame.
+
+    Neighboring tiles share about overlap of a tile; the last row and column end on the
+    frame border. A frame dimension smaller than a tile gets a single tile.
+    """
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        step = max(1, int(tile_size * (1 - overlap)))
+        return list(range(0, length - tile_size, step)) + [length - tile_size]
+
+    return [(x, y) for y in starts(height) for x in starts(width)]
+
+
+def iter_batches(frames, batch_size):
+    """Group any iterable of frames into lists of at most batch_size frames"""
+    batch = []
+    for frame in frames:
+        batch.append(frame)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _load_tracker_config(tracker_cfg):
+    from ultralytics.utils import IterableSimpleNamespace
+    from ultralytics.utils.checks import check_yaml
+
+    try:
+        from ultralytics.utils import YAML
+        cfg = YAML.load(check_yaml(tracker_cfg))
+    except ImportError:  # older ultralytics releases
+        from ultralytics.utils import yaml_load
+        cfg = yaml_load(check_yaml(tracker_cfg))
+    return IterableSimpleNamespace(**cfg)
+
+
+class ByteTrackStep:
+    """ByteTrack association run as a separate step after detection.
+
+    This mirrors what model.track(persist=True) does internally, but keeps the tracker
+    state on our side so detections can come from batched inference, crops or any other
+    detector while frames are still associated one at a time, in order.
+    """
+
+    def __init__(self, frame_rate=30, tracker_cfg='bytetrack.yaml'):
+        self.frame_rate = frame_rate
+        self.tracker_cfg = tracker_cfg
+        self.tracker = None
+
+    def _create_tracker(self):
+        from ultralytics.trackers.byte_tracker import BYTETracker
+
+        cfg = _load_tracker_config(self.tracker_cfg)
+        try:
+            return BYTETracker(args=cfg, frame_rate=self.frame_rate)
+        except TypeError:  # newer releases dropped the frame_rate argument
+            return BYTETracker(args=cfg)
+
+    def reset(self):
+        """Forget all tracks, e.g. when switching to a new video"""
+        self.tracker = None
+
+    def get_state(self):
+        """Tracks and the track ID counter, e.g. for a checkpoint (see set_state)"""
+        from ultralytics.trackers.basetrack import BaseTrack
+
+        # ultralytics hands out track IDs from a class-level counter
+        return {'tracker': self.tracker, 'next_id': BaseTrack._count}
+
+    def set_state(self, state):
+        from ultralytics.trackers.basetrack import BaseTrack
+
+        self.tracker = state['tracker']
+        BaseTrack._count = state['next_id']
+
+    def update(self, xyxy, conf, cls, frame):
+        """Associate one frame of detections with existing tracks.
+
+        Returns (xyxy, conf, cls, track_ids). When the tracker reports no tracks the raw
+        detections are passed through with track_ids=None, like model.track() does.
+        """
+        from ultralytics.engine.results import Boxes
+
+        if self.tracker is None:
+            self.tracker = self._create_tracker()
+
+        data = np.column_stack([xyxy, conf, cls]).astype(np.float32).reshape(-1, 6)
+        tracks = self.tracker.update(Boxes(data, frame.shape[:2]), frame)
+        if len(tracks) == 0:
+            return xyxy, conf, cls, None
+
+        tracks = np.asarray(tracks, dtype=np.float32)
+        return (tracks[:, :4],
+                tracks[:, 5],
+                tracks[:, 6].astype(np.int64),
+                tracks[:, 4].astype(np.int64))
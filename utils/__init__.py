@@ -1,2 +1,5 @@
-from .utils_video import read_video , save_video
-
+from .utils_video import (read_video , save_video, VideoReader, VideoWriter, VideoFrame, ParallelVideoWriter,
+                          ProgressReader, open_video_writer, concat_videos)
+from .instrumentation import (Metrics, NullMetrics, MetricsExporter, get_metrics, set_metrics, enable_metrics,
+                              silence_yolo_logging)
+from .live_video import LiveFrame, LiveSource, ReplaySource
@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class NullMetrics:
+    """Metrics sink that ignores everything; the default, so hooks cost one no-op call"""
+
+    enabled = False
+
+    def count(self, name, value=1, **labels):
+        pass
+
+    def gauge(self, name, value, **labels):
+        pass
+
+    def observe(self, name, value, **labels):
+        pass
+
+    def timer(self, name, **labels):
+        return _NULL_TIMER
+
+
+class _Timer:
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def _series_key(name, labels):
+    return (name, tuple(sorted(labels.items())))
+
+
+class Metrics:
+    """Thread-safe registry of counters, gauges and summaries for one run.
+
+    - count(): monotonically increasing totals, e.g. frames decoded
+    - gauge(): last value and the maximum seen, e.g. queue depth
+    - observe() / timer(): count, sum and max of samples, e.g. stage seconds
+      or detections per frame
+
+    Series are identified by name plus keyword labels (stage='decode').
+    """
+
+    enabled = True
+
+    def __init__(self, prefix='tennis'):
+        self.prefix = prefix
+        self.started = time.time()
+        self._counters = {}
+        self._gauges = {}
+        self._summaries = {}
+        self._lock = threading.Lock()
+
+    def count(self, name, value=1, **labels):
+        key = _series_key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        key = _series_key(name, labels)
+        with self._lock:
+            _, peak = self._gauges.get(key, (value, value))
+            self._gauges[key] = (value, max(peak, value))
+
+    def observe(self, name, value, **labels):
+        key = _series_key(name, labels)
+        with self._lock:
+            count, total, peak = self._summaries.get(key, (0, 0.0, value))
+            self._summaries[key] = (count + 1, total + value, max(peak, value))
+
+    def timer(self, name, **labels):
+        """Context manager that observes the seconds spent inside it"""
+        return _Timer(self, name, labels)
+
+    def snapshot(self):
+        """All series as a JSON-serializable dict"""
+        def series(key):
+            name, labels = key
+            return {'name': name, 'labels': dict(labels)}
+
+        with self._lock:
+            return {
+                'prefix': self.prefix,
+                'started': self.started,
+                'elapsed_s': time.time() - self.started,
+                'counters': [dict(series(k), value=v) for k, v in sorted(self._counters.items())],
+                'gauges': [dict(series(k), value=v, max=m) for k, (v, m) in sorted(self._gauges.items())],
+                'summaries': [dict(series(k), count=c, sum=s, max=m, mean=s / c if c else 0.0)
+                              for k, (c, s, m) in sorted(self._summaries.items())],
+            }
+
+    def to_prometheus(self):
+        """Prometheus text exposition format, one block per metric family"""
+        snapshot = self.snapshot()
+        families = {}
+
+        def add(name, kind, labels, value, suffix=''):
+            full_name = f"{self.prefix}_{name}"
+            label_text = ''
+            if labels:
+                label_text = '{' + ','.join(f'{k}="{v}"' for k, v in sorted(labels.items())) + '}'
+            families.setdefault(full_name, (kind, []))[1].append(f"{full_name}{suffix}{label_text} {value}")
+
+        for c in snapshot['counters']:
+            add(c['name'] + '_total', 'counter', c['labels'], c['value'])
+        for g in snapshot['gauges']:
+            add(g['name'], 'gauge', g['labels'], g['value'])
+            add(g['name'] + '_max', 'gauge', g['labels'], g['max'])
+        for s in snapshot['summaries']:
+            add(s['name'], 'summary', s['labels'], s['count'], '_count')
+            add(s['name'], 'summary', s['labels'], f"{s['sum']:.6f}", '_sum')
+            add(s['name'] + '_max', 'gauge', s['labels'], f"{s['max']:.6f}")
+        add('elapsed_seconds', 'gauge', None, f"{snapshot['elapsed_s']:.3f}")
+
+        lines = []
+        for full_name, (kind, samples) in families.items():
+            lines.append(f"# TYPE {full_name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+    def export(self, json_path=None, prometheus_path=None):
+        """Write the JSON summary and/or Prometheus text file (atomically)"""
+        if json_path:
+            _write_atomic(json_path, json.dumps(self.snapshot(), indent=2))
+        if prometheus_path:
+            _write_atomic(prometheus_path, self.to_prometheus())
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class MetricsExporter(threading.Thread):
+    """Exports metrics every interval_s seconds while a run is going, and once more at stop()"""
+
+    def __init__(self, metrics, json_path=None, prometheus_path=None, interval_s=30.0):
+        super().__init__(name='metrics-exporter', daemon=True)
+        self.metrics = metrics
+        self.json_path = json_path
+        self.prometheus_path = prometheus_path
+        self.interval_s = interval_s
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval_s):
+            self.metrics.export(self.json_path, self.prometheus_path)
+
+    def stop(self):
+        """Stop the periodic export and write the final files"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        self.metrics.export(self.json_path, self.prometheus_path)
+
+
+_metrics = NullMetrics()
+
+
+def get_metrics():
+    """The process-wide metrics sink (a NullMetrics unless instrumentation was enabled)"""
+    return _metrics
+
+
+def set_metrics(metrics):
+    global _metrics
+    _metrics = metrics if metrics is not None else NullMetrics()
+    return _metrics
+
+
+def enable_metrics(prefix='tennis'):
+    """Start recording into a fresh Metrics registry and return it"""
+    return set_metrics(Metrics(prefix))
+
+
+def silence_yolo_logging(level=logging.WARNING):
+    """Keep ultralytics from logging a line for every loaded model and predicted frame.
+
+    Does not import ultralytics: if it is not loaded yet, YOLO_VERBOSE makes it start quiet
+    (also in spawned worker processes, which inherit the environment).
+    """
+    os.environ.setdefault('YOLO_VERBOSE', 'False')
+    logging.getLogger('ultralytics').setLevel(level)
+    if 'ultralytics' in sys.modules:
+        from ultralytics.utils import LOGGER
+        LOGGER.setLevel(level)
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import namedtuple
+import cv2
+from .instrumentation import get_metrics
+
+# A frame of a live feed; captured_at is the time.perf_counter() at which it arrived
+LiveFrame = namedtuple('LiveFrame', ['index', 'timestamp', 'image', 'captured_at'])
+
+
+class LiveSource:
+    """Frame source for a live feed (camera index, RTSP/HTTP URL or device path).
+
+    A background thread reads frames as fast as they arrive and keeps only the newest
+    one. A frame the consumer has not taken by the time the next one arrives is dropped,
+    because a live feed cannot wait for a slow consumer; frames_dropped counts them.
+    Iterating yields LiveFrame tuples.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            raise IOError(f"Could not open video source: {source}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and fps == fps and fps > 0 else 30.0
+        self.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self._latest = None
+        self._finished = False
+        self._condition = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def _wait_until_due(self, frame_idx):
+        """Hook for sources that pace themselves; a live feed is paced by the device"""
+
+    def _read_frames(self, cap):
+        frame_idx = 0
+        try:
+            while not self._stop_event.is_set():
+                ret, image = cap.read()
+                if not ret:
+                    break
+                self._wait_until_due(frame_idx)
+                frame = LiveFrame(frame_idx, frame_idx / self.fps, image, time.perf_counter())
+                with self._condition:
+                    if self._latest is not None:
+                        self.frames_dropped += 1
+                        get_metrics().count('frames_dropped', stage='source')
+                    self._latest = frame
+                    self.frames_read += 1
+                    self._condition.notify()
+                frame_idx += 1
+        finally:
+            cap.release()
+            with self._condition:
+                self._finished = True
+                self._condition.notify()
+
+    def __iter__(self):
+        cap = cv2.VideoCapture(self.source)
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self._latest = None
+        self._finished = False
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._read_frames, args=(cap,), name='live-source', daemon=True)
+        self._thread.start()
+        try:
+            while True:
+                with self._condition:
+                    while self._latest is None and not self._finished:
+                        self._condition.wait()
+                    if self._latest is None:
+                        return
+                    frame, self._latest = self._latest, None
+                yield frame
+        finally:
+            self.stop()
+
+    def stop(self):
+        """Stop reading; the current iteration ends after the frame it is on"""
+        self._stop_event.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+            self._thread = None
+
+
+class ReplaySource(LiveSource):
+    """Replays a video file at wall-clock speed, so it behaves like a live feed.
+
+    Frames are decoded ahead and released at their timestamp (divided by speed); as
+    with a real feed, frames the consumer is too slow for are dropped.
+    """
+
+    def __init__(self, path, speed=1.0):
+        super().__init__(path)
+        self.speed = speed
+        self._start_time = None
+
+    def _wait_until_due(self, frame_idx):
+        if frame_idx == 0:
+            self._start_time = time.perf_counter()
+            return
+        delay = self._start_time + frame_idx / (self.fps * self.speed) - time.perf_counter()
+        if delay > 0:
+            self._stop_event.wait(delay)
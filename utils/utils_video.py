@@ -1,24 +1,313 @@
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 import cv2
+from .instrumentation import get_metrics
+
+# A single decoded frame with its position in the source video
+VideoFrame = namedtuple('VideoFrame', ['index', 'timestamp', 'image'])
+
+# Codec used for each output container when none is given
+DEFAULT_CODECS = {
+    '.avi': 'MJPG',
+    '.mp4': 'mp4v',
+    '.mov': 'mp4v',
+    '.mkv': 'XVID',
+}
+
+
+class VideoReader:
+    """Lazy, re-iterable frame source that decodes one frame at a time.
+
+    start_frame/end_frame restrict iteration to a range of the video; frame indices
+    and timestamps stay relative to the start of the whole video.
+    """
+
+    def __init__(self, path, start_frame=0, end_frame=None):
+        self.path = path
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            raise IOError(f"Could not open video: {path}")
+
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        # Some containers report 0 or NaN, fall back to a sane default
+        self.fps = fps if fps and fps == fps and fps > 0 else 30.0
+        self.frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        cap.release()
+
+    @property
+    def frame_range(self):
+        """(start_frame, end_frame) when reading part of the video, else None"""
+        if self.start_frame == 0 and self.end_frame is None:
+            return None
+        return (self.start_frame, self.end_frame)
+
+    def subrange(self, start_frame, end_frame):
+        """Reader for frames [start_frame, end_frame) of the same video"""
+        return VideoReader(self.path, start_frame, end_frame)
+
+    def __iter__(self):
+        """Iterate over raw frames so the reader can replace a list of frames"""
+        for video_frame in self.iter_frames():
+            yield video_frame.image
+
+    def _open_at_start(self):
+        cap = cv2.VideoCapture(self.path)
+        if self.start_frame > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, self.start_frame)
+            if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) != self.start_frame:
+                # Container can't seek exactly, skip ahead frame by frame instead
+                cap.release()
+                cap = cv2.VideoCapture(self.path)
+                for _ in range(self.start_frame):
+                    if not cap.grab():
+                        break
+        return cap
+
+    def iter_frames(self):
+        """Yield VideoFrame(index, timestamp, image) tuples, decoding lazily"""
+        metrics = get_metrics()
+        cap = self._open_at_start()
+        frame_idx = self.start_frame
+        try:
+            while self.end_frame is None or frame_idx < self.end_frame:
+                with metrics.timer('stage_seconds', stage='decode'):
+                    ret, frame = cap.read()
+                if not ret:
+                    break
+                metrics.count('frames', stage='decode')
+                yield VideoFrame(frame_idx, frame_idx / self.fps, frame)
+                frame_idx += 1
+        finally:
+            cap.release()
+
+
+class ProgressReader(VideoReader):
+    """VideoReader that reports how far it got through an expected number of passes.
+
+    callback(fraction) is called each time another percent of passes * frame_count
+    frames has been decoded. Progress stops at 0.99; the caller reports completion.
+    """
+
+    def __init__(self, path, callback, passes=1, start_frame=0, end_frame=None):
+        super().__init__(path, start_frame, end_frame)
+        self.callback = callback
+        self.passes = passes
+        self.frames_read = 0
+        self._reported = -1
+        self._owner = self  # reader whose passes the frames count towards
+
+    def subrange(self, start_frame, end_frame):
+        """Reader for part of the video whose frames count towards this reader's progress"""
+        reader = ProgressReader(self.path, self.callback, self.passes, start_frame, end_frame)
+        reader._owner = self._owner
+        return reader
+
+    def iter_frames(self):
+        owner = self._owner
+        end_frame = owner.end_frame if owner.end_frame is not None else owner.frame_count
+        total = max(1, (end_frame - owner.start_frame) * owner.passes)
+        for video_frame in super().iter_frames():
+            yield video_frame
+            owner.frames_read += 1
+            percent = min(99, 100 * owner.frames_read // total)
+            if percent > owner._reported:
+                owner._reported = percent
+                owner.callback(percent / 100)
+
 
 def read_video(path):
-    cap = cv2.VideoCapture(path)
-    frames=[]
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frames.append(frame)
-    cap.release()
-    return frames
-
-def save_video(frames, path):
-    if not frames:
+    """Decode the whole video into a list (prefer VideoReader for long videos)"""
+    return list(VideoReader(path))
+
+
+def default_codec(path):
+    """FourCC to use for path, picked from its container extension"""
+    return DEFAULT_CODECS.get(os.path.splitext(path)[1].lower(), 'MJPG')
+
+
+class VideoWriter:
+    """Incremental video writer that opens the output file on the first frame.
+
+    codec is a FourCC string such as 'MJPG', 'mp4v' or 'avc1'; by default it follows
+    the container of path (see DEFAULT_CODECS).
+    """
+
+    def __init__(self, path, fps=24, codec=None):
+        self.path = path
+        self.fps = fps
+        self.codec = codec or default_codec(path)
+        self.frames_written = 0
+        self._out = None
+
+    def write(self, frame):
+        metrics = get_metrics()
+        if self._out is None:
+            # Get dimensions from first frame instead of hardcoding
+            height, width = frame.shape[:2]
+            fourcc = cv2.VideoWriter_fourcc(*self.codec)
+            self._out = cv2.VideoWriter(self.path, fourcc, self.fps, (width, height))
+            if not self._out.isOpened():
+                raise IOError(f"Could not open {self.path} for writing with codec {self.codec}")
+        with metrics.timer('stage_seconds', stage='encode'):
+            self._out.write(frame)
+        self.frames_written += 1
+        metrics.count('frames', stage='encode')
+
+    def release(self):
+        if self._out is not None:
+            self._out.release()
+            self._out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+def _encode_segment(path, fps, codec, frames):
+    """Worker-process entry point: encode one segment of frames to its own file"""
+    with VideoWriter(path, fps, codec) as writer:
+        for frame in frames:
+            writer.write(frame)
+    return path
+
+
+def concat_videos(segment_paths, path, fps=24, codec=None):
+    """Join video files that share codec and frame size into path, in order.
+
+    Uses ffmpeg's concat demuxer without re-encoding when ffmpeg is installed, and
+    re-encodes through OpenCV otherwise.
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg:
+        fd, list_path = tempfile.mkstemp(suffix='.txt', dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                for segment_path in segment_paths:
+                    f.write(f"file '{os.path.abspath(segment_path)}'\n")
+            subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                            '-i', list_path, '-c', 'copy', path], check=True)
+        finally:
+            os.remove(list_path)
         return
-    
-    # Get dimensions from first frame instead of hardcoding
-    height, width = frames[0].shape[:2]
-    fourcc=cv2.VideoWriter_fourcc(*'MJPG')
-    out=cv2.VideoWriter(path, fourcc, 24, (width, height))
-    for frame in frames:
-        out.write(frame)
-    out.release()
+
+    with VideoWriter(path, fps, codec) as writer:
+        for segment_path in segment_paths:
+            for frame in VideoReader(segment_path):
+                writer.write(frame)
+
+
+class ParallelVideoWriter:
+    """Video writer that encodes fixed-size segments on a pool of worker processes.
+
+    Frames are accepted one at a time like VideoWriter. Every segment_frames frames
+    the buffered segment is handed to a worker, and release() joins the encoded
+    segments in order into path. At most max_pending (default: workers) segments are
+    in flight, and segments are shortened from the first frame's size so that frames
+    waiting to be encoded take at most about max_buffer_mb.
+    """
+
+    def __init__(self, path, fps=24, codec=None, workers=None, segment_frames=300, max_pending=None,
+                 max_buffer_mb=1024):
+        self.path = path
+        self.fps = fps
+        self.codec = codec or default_codec(path)
+        self.workers = workers or os.cpu_count() or 1
+        self.segment_frames = segment_frames
+        self.max_pending = max_pending or self.workers
+        self.max_buffer_bytes = int(max_buffer_mb * 1024 * 1024)
+        self.frames_written = 0
+        self._segment = []
+        self._pending = deque()
+        self._segment_paths = []
+        self._pool = None
+        self._tmp_dir = None
+
+    def _submit_segment(self):
+        if self._pool is None:
+            # 'spawn' keeps OpenCV's thread pool from being forked into a broken state
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+            self._tmp_dir = tempfile.mkdtemp(prefix='segments-', dir=os.path.dirname(os.path.abspath(self.path)))
+
+        extension = os.path.splitext(self.path)[1]
+        segment_path = os.path.join(self._tmp_dir, f"{len(self._segment_paths):06d}{extension}")
+        self._segment_paths.append(segment_path)
+        self._pending.append(self._pool.submit(_encode_segment, segment_path, self.fps, self.codec,
+                                               self._segment))
+        self._segment = []
+
+        get_metrics().gauge('queue_depth', len(self._pending), queue='encode_segments')
+        while len(self._pending) > self.max_pending:
+            self._pending.popleft().result()
+
+    def write(self, frame):
+        if self.frames_written == 0:
+            # The segment being filled and each pending one are held raw and, until a worker
+            # picks them up, also pickled in the executor's call queue
+            in_flight = 2 * (self.max_pending + 1)
+            self.segment_frames = max(1, min(self.segment_frames, self.max_buffer_bytes // (in_flight * frame.nbytes)))
+        self._segment.append(frame)
+        self.frames_written += 1
+        get_metrics().count('frames', stage='encode')
+        if len(self._segment) >= self.segment_frames:
+            self._submit_segment()
+
+    def release(self, discard=False):
+        """Encode what is left, wait for all segments and join them into path.
+
+        With discard=True the segments are dropped and no output is written.
+        """
+        if self._segment and not discard:
+            self._submit_segment()
+        try:
+            while self._pending and not discard:
+                self._pending.popleft().result()
+            if self._segment_paths and not discard:
+                concat_videos(self._segment_paths, self.path, self.fps, self.codec)
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+            if self._tmp_dir is not None:
+                shutil.rmtree(self._tmp_dir, ignore_errors=True)
+                self._tmp_dir = None
+            self._segment_paths = []
+            self._segment = []
+            self._pending.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Don't spend time encoding the output of a failed run
+        self.release(discard=exc_type is not None)
+
+
+def open_video_writer(path, fps=24, codec=None, workers=1, segment_frames=300):
+    """VideoWriter, or a ParallelVideoWriter when more than one worker is asked for.
+
+    Without ffmpeg the segments would have to be decoded and encoded again to join
+    them, which costs more than encoding serially, so a single writer is used instead.
+    """
+    if (workers is not None and workers <= 1) or not shutil.which('ffmpeg'):
+        return VideoWriter(path, fps, codec)
+    return ParallelVideoWriter(path, fps, codec, workers=workers, segment_frames=segment_frames)
+
+
+def save_video(frames, path, fps=24, codec=None, workers=1):
+    """Encode frames from any iterable, one frame at a time"""
+    with open_video_writer(path, fps, codec, workers) as writer:
+        for frame in frames:
+            writer.write(frame)